@@ -2,10 +2,18 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 from api.app.db import users_collection
-from api.app.auth_utils import hash_password, verify_password, create_access_token
+from api.app.auth_utils import ahash_password, averify_password, create_access_token
+from rag.worker_pool import PoolBusyError
 
 router = APIRouter()
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 class RegisterRequest(BaseModel):
     email: EmailStr
     password: str
@@ -20,7 +28,10 @@ async def register(req: RegisterRequest):
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed = hash_password(req.password)
+    try:
+        hashed = await ahash_password(req.password)
+    except PoolBusyError:
+        raise _busy()
 
     await users_collection.insert_one({
         "email": req.email,
@@ -37,7 +48,12 @@ async def login(req: LoginRequest):
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    if not verify_password(req.password, user["password"]):
+    try:
+        valid = await averify_password(req.password, user["password"])
+    except PoolBusyError:
+        raise _busy()
+
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     token = create_access_token({"sub": req.email})
@@ -1,8 +1,10 @@
+import os
 from datetime import datetime, timedelta
 from jose import jwt
 from passlib.context import CryptContext
 
 from api.app.env import get_required_env
+from rag.worker_pool import BoundedWorkerPool
 
 SECRET_KEY = get_required_env("JWT_SECRET")
 
@@ -20,6 +22,27 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+# bcrypt costs ~100-300ms of CPU per call. It runs on its own small pool so
+# a burst of logins neither blocks the event loop nor takes every core from
+# retrieval; callers that cannot get a worker in time get PoolBusyError.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5"))
+
+PASSWORD_POOL = BoundedWorkerPool("password", PASSWORD_HASH_WORKERS)
+
+
+async def ahash_password(password: str) -> str:
+    return await PASSWORD_POOL.run(
+        hash_password, password, queue_timeout=PASSWORD_QUEUE_TIMEOUT
+    )
+
+
+async def averify_password(plain: str, hashed: str) -> bool:
+    return await PASSWORD_POOL.run(
+        verify_password, plain, hashed, queue_timeout=PASSWORD_QUEUE_TIMEOUT
+    )
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -10,3 +10,4 @@ db = client["ai-tutor"]
 users_collection = db["users"]
 chats_collection = db["chats"]
 progress_collection = db["progress"]
+progress_rollups_collection = db["progress_rollups"]
@@ -1,3 +1,10 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from time import time
+from typing import Any, Dict, Optional
+
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
@@ -7,6 +14,89 @@ security = HTTPBearer()
 
 SECRET_KEY = get_required_env("JWT_SECRET")
 ALGORITHM = "HS256"
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# Longest a verified token is trusted before it is verified again.
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+
+
+class VerifiedTokenCache:
+    """
+    LRU map from a token's SHA-256 digest to the user it was verified for,
+    so repeat requests skip signature verification. An entry is used until
+    the token's `exp` or `ttl_seconds` after verification, whichever comes
+    first. Raw tokens are never stored.
+    """
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE,
+                 ttl_seconds: float = AUTH_TOKEN_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # digest -> (email, expires_at)
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+
+        key = self._key(token)
+        now = time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now >= entry[1]:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, token: str, email: str, exp: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+
+        expires_at = time() + self.ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (email, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+TOKEN_CACHE = VerifiedTokenCache()
 
 
 async def get_current_user(
@@ -14,6 +104,10 @@ async def get_current_user(
 ):
     token = credentials.credentials
 
+    cached_email = TOKEN_CACHE.get(token)
+    if cached_email is not None:
+        return cached_email
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -21,6 +115,7 @@ async def get_current_user(
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
 
+        TOKEN_CACHE.put(token, email, payload.get("exp"))
         return email
 
     except JWTError:
@@ -74,12 +74,13 @@ def ingest_documents():
             
             # Step 2: Build FAISS index for this subject
             logger.info(f"Building FAISS index for {subject}...")
-            build_subject_index(str(txt_path), subject)
+            changes = build_subject_index(str(txt_path), subject)
             
             results[subject] = {
                 "status": "success",
+                "changes": changes,
                 "index_path": str(EMBEDDINGS_DIR / f"{subject}_index.faiss"),
-                "chunks_path": str(EMBEDDINGS_DIR / f"{subject}_chunks.pkl")
+                "chunks_path": str(EMBEDDINGS_DIR / f"{subject}_chunks.bin")
             }
             logger.info(f"Successfully built {subject} index")
             
@@ -116,15 +117,20 @@ def ingest_status():
     
     EMBEDDINGS_DIR = Path("embeddings")
     
+    from rag.index_factory import discover_subjects
+
     available_subjects = {}
-    for subject in ["physics", "math"]:
+    for subject in sorted(set(["physics", "math"]) | set(discover_subjects(EMBEDDINGS_DIR))):
         index_file = EMBEDDINGS_DIR / f"{subject}_index.faiss"
-        chunks_file = EMBEDDINGS_DIR / f"{subject}_chunks.pkl"
+        chunks_exist = (
+            (EMBEDDINGS_DIR / f"{subject}_chunks.bin").exists()
+            or (EMBEDDINGS_DIR / f"{subject}_chunks.pkl").exists()
+        )
         
         available_subjects[subject] = {
             "index_exists": index_file.exists(),
-            "chunks_exist": chunks_file.exists(),
-            "ready": index_file.exists() and chunks_file.exists()
+            "chunks_exist": chunks_exist,
+            "ready": index_file.exists() and chunks_exist
         }
     
     return {
@@ -1,15 +1,25 @@
+import asyncio
 import multiprocessing
 import os
 import sys
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from api.app.db import db, progress_collection
+from api.app.db import db, progress_collection, progress_rollups_collection
 from api.app.auth_routes import router as auth_router
+from api.app.auth_utils import PASSWORD_POOL
+from api.app.dependencies import TOKEN_CACHE
 from api.app.ingest_routes import router as ingest_router
 from api.app.progress_routes import router as progress_router
+from api.app.services.warmup import WARMUP_ON_STARTUP, readiness, run_warmup
+from api.app.services.write_behind import WRITE_BEHIND, WRITE_BEHIND_ENABLED
 from api.app.tutor_routes import router as tutor_router
+from rag.answer_cache import ANSWER_CACHE
+from rag.inference_host import get_inference_client
+from rag.memory import HISTORY_CACHE, initialize_db
+from rag.worker_pool import RETRIEVAL_POOL
 
 # ----------------------------
 # Windows multiprocessing fix
@@ -52,6 +62,24 @@ app.include_router(tutor_router)
 # ----------------------------
 # Startup Tasks
 # ----------------------------
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_warmup():
+    # Runs in the background: the server accepts traffic (and answers
+    # /health/live) while models load; /health/ready turns green after.
+    if WARMUP_ON_STARTUP:
+        task = asyncio.create_task(run_warmup())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("startup")
+async def start_write_behind():
+    # /ask persists attempts through this queue instead of awaiting the writes.
+    if WRITE_BEHIND_ENABLED:
+        WRITE_BEHIND.start()
+
 @app.on_event("startup")
 async def ensure_progress_collection():
     existing = await db.list_collection_names()
@@ -67,9 +95,73 @@ async def ensure_progress_collection():
         [("user_email", 1), ("created_at", -1)]
     )
 
+    # GET /progress reads a user's rollups (services/progress_rollups.py).
+    await progress_rollups_collection.create_index([("user_email", 1)])
+
+    # Conversation memory reloads recent turns from here on a cache miss.
+    initialize_db(db)
+    await db["conversations"].create_index([("user_id", 1), ("created_at", -1)])
+
+@app.on_event("shutdown")
+async def flush_write_behind():
+    await WRITE_BEHIND.close()
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    RETRIEVAL_POOL.shutdown(wait=False)
+    PASSWORD_POOL.shutdown(wait=False)
+
 # ----------------------------
 # Health Check
 # ----------------------------
 @app.get("/")
 def root():
     return {"status": "running", "stage": "Hybrid RAG + Auth"}
+
+
+@app.get("/health/live")
+def health_live():
+    """The process is up and serving; says nothing about loaded models."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once models and indexes are warm (see services/warmup.py), else 503."""
+    payload = await readiness()
+    return JSONResponse(payload, status_code=200 if payload["ready"] else 503)
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+@app.get("/metrics")
+def metrics():
+    payload = {
+        "retrieval_pool": RETRIEVAL_POOL.stats(),
+        "password_pool": PASSWORD_POOL.stats(),
+        "auth_token_cache": TOKEN_CACHE.stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "history_cache": HISTORY_CACHE.stats(),
+        "write_behind": WRITE_BEHIND.stats(),
+    }
+
+    inference_client = get_inference_client()
+    if inference_client is not None:
+        payload["inference_host"] = inference_client.stats()
+
+    # Only report on models that have already been loaded by a request.
+    retriever_module = sys.modules.get("rag.subject_retriever")
+    if retriever_module is not None:
+        payload["query_encoder"] = retriever_module.QUERY_ENCODER.stats()
+        payload["retrieval_cache"] = retriever_module.RETRIEVAL_CACHE.stats()
+
+    prompt_budget_module = sys.modules.get("rag.prompt_budget")
+    if prompt_budget_module is not None:
+        payload["prompt_budget"] = prompt_budget_module.PROMPT_STATS.stats()
+
+    reranker_module = sys.modules.get("rag.reranker")
+    if reranker_module is not None:
+        payload["reranker"] = reranker_module.RERANK_STATS.snapshot()
+
+    return payload
@@ -1,11 +1,29 @@
+import os
+
 from fastapi import APIRouter, Depends
 
-from api.app.db import progress_collection, users_collection
+from api.app.db import progress_collection, progress_rollups_collection, users_collection
 from api.app.dependencies import get_current_user
+from api.app.services.progress_aggregation import build_progress_payload_aggregated
+from api.app.services.progress_rollups import (
+    build_progress_payload_from_rollups,
+    load_user_rollups,
+)
 from api.app.services.progress_service import _build_progress_payload
 
 router = APIRouter(tags=["Progress"])
 
+# rollup:    incrementally maintained per-subject documents (default)
+# aggregate: MongoDB aggregation over the attempts, projected fields only
+# scan:      load every attempt and compute in Python (reference)
+PROGRESS_MODE = os.getenv("PROGRESS_MODE", "rollup").strip().lower()
+PROGRESS_MODES = ("rollup", "aggregate", "scan")
+
+if PROGRESS_MODE not in PROGRESS_MODES:
+    raise ValueError(
+        f"PROGRESS_MODE must be one of {', '.join(PROGRESS_MODES)}, not '{PROGRESS_MODE}'"
+    )
+
 
 @router.get("/progress")
 async def get_progress(current_user: str = Depends(get_current_user)):
@@ -13,10 +31,28 @@ async def get_progress(current_user: str = Depends(get_current_user)):
         {"email": current_user},
         {"created_at": 1},
     )
-    attempts = await progress_collection.find({"user_email": current_user}).to_list(None)
+    joined_at = user.get("created_at") if user else None
+
+    if PROGRESS_MODE == "aggregate":
+        return await build_progress_payload_aggregated(
+            progress_collection, current_user, joined_at
+        )
+
+    if PROGRESS_MODE == "scan":
+        attempts = await progress_collection.find({"user_email": current_user}).to_list(None)
+        return _build_progress_payload(
+            user_email=current_user,
+            attempts=attempts,
+            joined_at=joined_at,
+        )
+
+    # A few rollup documents instead of every attempt the user has made.
+    rollups = await load_user_rollups(
+        progress_collection, progress_rollups_collection, current_user
+    )
 
-    return _build_progress_payload(
+    return build_progress_payload_from_rollups(
         user_email=current_user,
-        attempts=attempts,
-        joined_at=user.get("created_at") if user else None,
+        rollups=rollups,
+        joined_at=joined_at,
     )
@@ -0,0 +1,212 @@
+# api/app/services/progress_aggregation.py
+# GET /progress computed by MongoDB aggregation pipelines (PROGRESS_MODE=
+# aggregate). Mongo does the grouping, averaging, weekly bucketing and
+# active-day set; only one row per distinct question comes back, with its
+# stored topic tags, never whole attempt documents (or their answers).
+#
+# A $facet result is a single document, capped at 16 MB, so it only holds
+# output that stays small however long the history gets. The per-question
+# rows grow with it and come from a separate pipeline, through a cursor.
+#
+# Produces the same payload as progress_service._build_progress_payload.
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any
+
+from api.app.services.progress_service import _compute_streak, _topic_display_name
+from api.app.services.topic_classifier import attempt_topics
+
+SUBJECTS = ("physics", "math")
+
+_WEAK_THRESHOLD = 0.55
+_STRONG_THRESHOLD = 0.75
+
+
+def _attempt_stages(user_email: str) -> list[dict[str, Any]]:
+    return [
+        {"$match": {"user_email": user_email}},
+        {"$project": {
+            "_id": 0,
+            "subject": {"$toLower": {"$ifNull": ["$subject", ""]}},
+            "chat_id": {"$ifNull": ["$chat_id", ""]},
+            "question": 1,
+            "topics": 1,
+            "created_at": 1,
+            "confidence": {"$ifNull": ["$confidence", 0]},
+            "latency": {"$ifNull": ["$latency_seconds", 0]},
+        }},
+    ]
+
+
+def _progress_pipeline(user_email: str, week_start: datetime) -> list[dict[str, Any]]:
+    in_subjects = {"$match": {"subject": {"$in": list(SUBJECTS)}}}
+
+    return _attempt_stages(user_email) + [
+        {"$facet": {
+            # Per chat first, so sessions are counted without listing chats.
+            "summary": [
+                in_subjects,
+                {"$group": {
+                    "_id": {"subject": "$subject", "chat_id": "$chat_id"},
+                    "questions": {"$sum": 1},
+                    "confidence": {"$sum": "$confidence"},
+                    "latency": {"$sum": "$latency"},
+                    "study_minutes": {"$sum": {"$max": [
+                        2, {"$add": [{"$round": [{"$divide": ["$latency", 20]}, 0]}, 1]},
+                    ]}},
+                }},
+                {"$group": {
+                    "_id": "$_id.subject",
+                    "sessions": {"$sum": {"$cond": [{"$eq": ["$_id.chat_id", ""]}, 0, 1]}},
+                    "questions": {"$sum": "$questions"},
+                    "confidence_sum": {"$sum": "$confidence"},
+                    "latency_sum": {"$sum": "$latency"},
+                    "study_minutes": {"$sum": "$study_minutes"},
+                }},
+            ],
+            "weekly": [
+                in_subjects,
+                {"$match": {"created_at": {"$gte": week_start}}},
+                {"$group": {
+                    "_id": {"subject": "$subject", "day": {"$isoDayOfWeek": "$created_at"}},
+                    "count": {"$sum": 1},
+                }},
+            ],
+            # Every subject counts towards the streak.
+            "days": [
+                {"$match": {"created_at": {"$type": "date"}}},
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}}},
+            ],
+        }},
+    ]
+
+
+def _questions_pipeline(user_email: str) -> list[dict[str, Any]]:
+    """One row per distinct question, carrying its topic tags."""
+    return _attempt_stages(user_email) + [
+        {"$match": {"subject": {"$in": list(SUBJECTS)}}},
+        {"$group": {
+            "_id": {"subject": "$subject", "question": "$question"},
+            "count": {"$sum": 1},
+            "topics": {"$first": "$topics"},
+            "last_at": {"$max": "$created_at"},
+            "weak_at": {"$min": {"$cond": [
+                {"$lt": ["$confidence", _WEAK_THRESHOLD]}, "$created_at", None,
+            ]}},
+            "strong_at": {"$min": {"$cond": [
+                {"$gte": ["$confidence", _STRONG_THRESHOLD]}, "$created_at", None,
+            ]}},
+        }},
+    ]
+
+
+def _first_topics(rows: list[dict[str, Any]], key: str) -> list[str]:
+    """topics[:2] of each question, in order of the `key` timestamp, de-duplicated."""
+    rows = [row for row in rows if isinstance(row.get(key), datetime)]
+    rows.sort(key=lambda row: row[key])
+
+    seen: list[str] = []
+    for row in rows:
+        for topic in row["topics"][:2]:
+            if topic not in seen:
+                seen.append(topic)
+    return seen
+
+
+def _subject_stats(summary, rows, weekly) -> dict[str, Any]:
+    stats = {
+        "sessions": 0,
+        "questions": 0,
+        "studyMinutes": 0,
+        "confidence": 0,
+        "avgLatency": 0,
+        "recentTopics": [],
+        "weakAreas": [],
+        "strongAreas": [],
+        "weeklyActivity": [0] * 7,
+        "topicFrequency": {},
+    }
+
+    if not summary:
+        return stats
+
+    questions = summary["questions"]
+    stats["sessions"] = summary["sessions"] or questions
+    stats["questions"] = questions
+    stats["confidence"] = round(float(summary["confidence_sum"]) / questions, 3)
+    stats["avgLatency"] = round(float(summary["latency_sum"]) / questions, 3)
+    stats["studyMinutes"] = int(summary["study_minutes"])
+
+    topic_counts: dict[str, int] = {}
+    for row in rows:
+        for topic in row["topics"]:
+            topic_counts[topic] = topic_counts.get(topic, 0) + row["count"]
+    stats["topicFrequency"] = dict(sorted(topic_counts.items(), key=lambda x: -x[1])[:8])
+
+    # Newest questions first, until six distinct topics are found.
+    recent: list[str] = []
+    for row in sorted(
+        rows,
+        key=lambda row: row["last_at"] if isinstance(row.get("last_at"), datetime) else datetime.min,
+        reverse=True,
+    ):
+        for topic in row["topics"][:2]:
+            if topic not in recent:
+                recent.append(topic)
+        if len(recent) >= 6:
+            break
+    stats["recentTopics"] = [_topic_display_name(t) for t in recent]
+
+    # First topics asked about with low / high confidence.
+    weak = _first_topics(rows, "weak_at")
+    strong = _first_topics(rows, "strong_at")
+    stats["weakAreas"] = [_topic_display_name(t) for t in weak][:5]
+    stats["strongAreas"] = [_topic_display_name(t) for t in strong][:5]
+
+    for row in weekly:
+        stats["weeklyActivity"][row["_id"]["day"] - 1] += row["count"]
+
+    return stats
+
+
+async def build_progress_payload_aggregated(
+    progress_collection,
+    user_email: str,
+    joined_at: datetime | None,
+) -> dict[str, Any]:
+    today = datetime.utcnow().date()
+    week_start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+
+    facets, questions = await asyncio.gather(
+        progress_collection.aggregate(_progress_pipeline(user_email, week_start)).to_list(1),
+        progress_collection.aggregate(_questions_pipeline(user_email)).to_list(None),
+    )
+    facets = facets[0]
+
+    result: dict[str, Any] = {"userId": user_email}
+
+    total_study_minutes = 0
+    for subject in SUBJECTS:
+        summary = next((row for row in facets["summary"] if row["_id"] == subject), None)
+
+        rows = []
+        for row in questions:
+            if row["_id"]["subject"] != subject:
+                continue
+            row["topics"] = attempt_topics(
+                {"topics": row.get("topics"), "question": row["_id"]["question"] or ""},
+                subject,
+                limit=3,
+            )
+            rows.append(row)
+
+        weekly = [row for row in facets["weekly"] if row["_id"]["subject"] == subject]
+
+        result[subject] = _subject_stats(summary, rows, weekly)
+        total_study_minutes += result[subject]["studyMinutes"]
+
+    result["overallStreak"] = _compute_streak({row["_id"] for row in facets["days"]})
+    result["totalHours"] = round(total_study_minutes / 60.0, 1)
+    result["joinedAt"] = joined_at.isoformat() if isinstance(joined_at, datetime) else ""
+    return result
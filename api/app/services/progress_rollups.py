@@ -0,0 +1,552 @@
+# api/app/services/progress_rollups.py
+# Per-user, per-subject progress rollups, updated incrementally as attempts
+# are saved, so GET /progress reads a handful of small documents instead of
+# the user's whole attempt history.
+#
+# One document per (user, subject), _id "<email>:<subject>", holding counts,
+# sums, topic frequencies and the last week's daily counts; plus one
+# "<email>:_all" document with the day-streak state and the `complete` flag.
+# Sessions are counted, not listed: a "<email>:<subject>:chat:<chat_id>"
+# marker (no user_email field, so rollup reads skip it) is inserted the
+# first time a chat is seen, and only that first attempt adds a session.
+#
+# A user's rollups are complete once they were rebuilt from the full history
+# (the backfill below, or lazily by the first /progress read); until then
+# /progress rebuilds them first. Writers use optimistic concurrency on a
+# `version` field, so concurrent /ask requests for one user never lose an
+# update. Each rollup also keeps the _ids of the last attempts folded into
+# it, so an attempt a rebuild already read from the history is not applied
+# a second time when record_attempts reaches it afterwards.
+#
+# record_attempts takes a whole write-behind flush at once: one read of the
+# affected rollups, one insert of session markers and one bulk write,
+# however many attempts the flush held.
+#
+# Backfill existing users:
+#   python -m api.app.services.progress_rollups backfill [--user EMAIL]
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from api.app.services.progress_service import _topic_display_name
+from api.app.services.topic_classifier import attempt_topics
+
+logger = logging.getLogger(__name__)
+
+OVERALL = "_all"
+ROLLUP_MAX_RETRIES = int(os.getenv("ROLLUP_MAX_RETRIES", "5"))
+# Far more than the attempts a user can save while one is in flight.
+ROLLUP_APPLIED_IDS = int(os.getenv("ROLLUP_APPLIED_IDS", "50"))
+# Rollups stored under another schema are rebuilt on the next read.
+ROLLUP_SCHEMA = 2
+
+_RECENT_TOPICS = 6
+_AREA_TOPICS = 5
+_TOP_TOPICS = 8
+_WEEK_DAYS = 7
+
+_DUPLICATE_KEY = 11000
+
+
+def _rollup_id(user_email: str, subject: str) -> str:
+    return f"{user_email}:{subject}"
+
+
+def _session_id(user_email: str, subject: str, chat_id: str) -> str:
+    return f"{_rollup_id(user_email, subject)}:chat:{chat_id}"
+
+
+def _study_minutes(latency_seconds: float) -> int:
+    return max(2, round(latency_seconds / 20) + 1)
+
+
+def _new_rollup(user_email: str, subject: str) -> dict[str, Any]:
+    rollup = {
+        "_id": _rollup_id(user_email, subject),
+        "user_email": user_email,
+        "subject": subject,
+        "version": 0,
+        "questions": 0,
+        "applied_ids": [],
+        "updated_at": None,
+    }
+
+    if subject == OVERALL:
+        rollup.update({
+            "schema": ROLLUP_SCHEMA,
+            "complete": False,
+            "last_active_date": None,
+            "streak": 0,
+        })
+    else:
+        rollup.update({
+            "sessions": 0,
+            "confidence_sum": 0.0,
+            "latency_sum": 0.0,
+            "study_minutes": 0,
+            "topic_counts": {},
+            "recent_topics": [],
+            "weak_areas": [],
+            "strong_areas": [],
+            "daily_counts": {},
+        })
+
+    return rollup
+
+
+def _attempt_day(attempt: dict[str, Any]) -> date | None:
+    created_at = attempt.get("created_at")
+    return created_at.date() if isinstance(created_at, datetime) else None
+
+
+def _apply_to_overall(rollup: dict[str, Any], attempt: dict[str, Any]) -> None:
+    rollup["questions"] += 1
+
+    day = _attempt_day(attempt)
+    if day is None:
+        return
+
+    last = rollup["last_active_date"]
+    last = date.fromisoformat(last) if last else None
+
+    if last is None or day > last + timedelta(days=1):
+        rollup["streak"] = 1
+    elif day == last + timedelta(days=1):
+        rollup["streak"] += 1
+    elif day < last:
+        # Older than the streak we are tracking; cannot extend it.
+        return
+
+    rollup["last_active_date"] = day.isoformat()
+
+
+def _apply_to_subject(rollup: dict[str, Any], attempt: dict[str, Any], new_session: bool) -> None:
+    subject = rollup["subject"]
+    confidence = float(attempt.get("confidence", 0) or 0)
+    latency = float(attempt.get("latency_seconds", 0) or 0)
+
+    rollup["questions"] += 1
+    rollup["confidence_sum"] += confidence
+    rollup["latency_sum"] += latency
+    rollup["study_minutes"] += _study_minutes(latency)
+    if new_session:
+        rollup["sessions"] = rollup.get("sessions", 0) + 1
+
+    topics = attempt_topics(attempt, subject, limit=3)
+
+    counts = rollup["topic_counts"]
+    for topic in topics:
+        counts[topic] = counts.get(topic, 0) + 1
+
+    # Newest attempt's topics first, then the previous ones.
+    headline = topics[:2]
+    recent = headline + [t for t in rollup["recent_topics"] if t not in headline]
+    rollup["recent_topics"] = recent[:_RECENT_TOPICS]
+
+    # First topics seen with low / high confidence, as the full scan reports.
+    for topic in headline:
+        display = _topic_display_name(topic)
+        if confidence < 0.55:
+            if display not in rollup["weak_areas"] and len(rollup["weak_areas"]) < _AREA_TOPICS:
+                rollup["weak_areas"].append(display)
+        elif confidence >= 0.75:
+            if display not in rollup["strong_areas"] and len(rollup["strong_areas"]) < _AREA_TOPICS:
+                rollup["strong_areas"].append(display)
+
+    day = _attempt_day(attempt)
+    if day is not None:
+        daily = rollup["daily_counts"]
+        daily[day.isoformat()] = daily.get(day.isoformat(), 0) + 1
+        _prune_daily_counts(rollup)
+
+
+def _prune_daily_counts(rollup: dict[str, Any], today: date | None = None) -> None:
+    cutoff = ((today or datetime.utcnow().date()) - timedelta(days=_WEEK_DAYS - 1)).isoformat()
+    rollup["daily_counts"] = {
+        day: count for day, count in rollup["daily_counts"].items() if day >= cutoff
+    }
+
+
+def apply_attempt(rollup: dict[str, Any], attempt: dict[str, Any], new_session: bool = False) -> None:
+    """
+    Fold one attempt into a rollup document, in place. `new_session` is
+    True for the first attempt seen in its chat.
+    """
+    if rollup["subject"] == OVERALL:
+        _apply_to_overall(rollup, attempt)
+    else:
+        _apply_to_subject(rollup, attempt, new_session)
+
+    if attempt.get("_id") is not None:
+        applied = rollup.get("applied_ids", []) + [attempt["_id"]]
+        rollup["applied_ids"] = applied[-ROLLUP_APPLIED_IDS:]
+    rollup["updated_at"] = datetime.utcnow()
+
+
+# ----------------------------
+# Write path
+# ----------------------------
+async def _claim_sessions(collection, claims: list[tuple[str, str, str]]) -> set[tuple[str, str, str]]:
+    """The (user_email, subject, chat_id) claims whose chat was not seen before."""
+    if not claims:
+        return set()
+
+    new = set(range(len(claims)))
+    try:
+        await collection.insert_many(
+            [
+                {"_id": _session_id(*claim), "session_of": _rollup_id(*claim[:2])}
+                for claim in claims
+            ],
+            ordered=False,
+        )
+    except BulkWriteError as error:
+        for write_error in error.details.get("writeErrors", []):
+            if write_error.get("code") != _DUPLICATE_KEY:
+                raise
+            new.discard(write_error["index"])
+
+    return {claims[i] for i in new}
+
+
+async def _update_rollup(
+    collection,
+    user_email: str,
+    subject: str,
+    attempt: dict[str, Any],
+    new_session: bool = False,
+) -> bool:
+    key = _rollup_id(user_email, subject)
+
+    for _ in range(ROLLUP_MAX_RETRIES):
+        rollup = await collection.find_one({"_id": key})
+
+        if rollup is None:
+            rollup = _new_rollup(user_email, subject)
+            apply_attempt(rollup, attempt, new_session)
+            try:
+                await collection.insert_one(rollup)
+                return True
+            except DuplicateKeyError:
+                continue
+
+        if attempt.get("_id") in rollup.get("applied_ids", []):
+            # A rebuild read this attempt from the history already.
+            return True
+
+        version = rollup["version"]
+        apply_attempt(rollup, attempt, new_session)
+        rollup["version"] = version + 1
+
+        result = await collection.replace_one({"_id": key, "version": version}, rollup)
+        if result.matched_count:
+            return True
+
+    return False
+
+
+async def _mark_incomplete(collection, user_email: str) -> None:
+    """Make the next /progress read rebuild the user's rollups."""
+    try:
+        await collection.update_one(
+            {"_id": _rollup_id(user_email, OVERALL)},
+            {"$set": {"complete": False}, "$inc": {"version": 1}},
+        )
+    except Exception:
+        pass
+
+
+async def record_attempts(collection, attempts: list[dict[str, Any]]) -> None:
+    """
+    Fold just-saved attempts (with their _ids) into their users' rollups.
+
+    Rollups that changed underneath the bulk write are retried one attempt
+    at a time. On failure the user is marked incomplete, so the next
+    /progress read rebuilds them.
+    """
+    attempts = sorted(
+        (attempt for attempt in attempts if attempt.get("user_email")),
+        key=lambda attempt: attempt.get("created_at") or datetime.min,
+    )
+    if not attempts:
+        return
+
+    # Attempts per (user, subject) rollup, each with its new-session flag.
+    groups: dict[tuple[str, str], list[tuple[dict[str, Any], bool]]] = {}
+    claims: list[tuple[str, str, str]] = []
+    for attempt in attempts:
+        user_email = attempt["user_email"]
+        subject = (attempt.get("subject") or "").lower()
+        if subject:
+            groups.setdefault((user_email, subject), [])
+            if attempt.get("chat_id"):
+                claim = (user_email, subject, attempt["chat_id"])
+                if claim not in claims:
+                    claims.append(claim)
+        groups.setdefault((user_email, OVERALL), [])
+
+    users = {user_email for user_email, _ in groups}
+
+    try:
+        new_sessions = await _claim_sessions(collection, claims)
+
+        for attempt in attempts:
+            user_email = attempt["user_email"]
+            subject = (attempt.get("subject") or "").lower()
+            if subject:
+                claim = (user_email, subject, attempt.get("chat_id"))
+                groups[(user_email, subject)].append((attempt, claim in new_sessions))
+                new_sessions.discard(claim)
+            groups[(user_email, OVERALL)].append((attempt, False))
+
+        keys = {_rollup_id(*group): group for group in groups}
+        existing = {
+            doc["_id"]: doc
+            for doc in await collection.find({"_id": {"$in": list(keys)}}).to_list(None)
+        }
+
+        operations = []
+        for key, (user_email, subject) in keys.items():
+            rollup = existing.get(key)
+            version = rollup["version"] if rollup is not None else None
+            if rollup is None:
+                rollup = _new_rollup(user_email, subject)
+
+            applied = rollup.get("applied_ids", [])
+            pending = [
+                (attempt, new_session)
+                for attempt, new_session in groups[(user_email, subject)]
+                if attempt.get("_id") not in applied
+            ]
+            if not pending:
+                continue
+
+            for attempt, new_session in pending:
+                apply_attempt(rollup, attempt, new_session)
+
+            if version is None:
+                operations.append(InsertOne(rollup))
+            else:
+                rollup["version"] = version + 1
+                operations.append(ReplaceOne({"_id": key, "version": version}, rollup))
+
+        if not operations:
+            return
+
+        try:
+            result = (await collection.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as error:
+            result = error.details
+        if result.get("nInserted", 0) + result.get("nMatched", 0) == len(operations):
+            return
+
+        # Someone else wrote some of these rollups first: redo those.
+        stored = {
+            doc["_id"]: doc.get("applied_ids", [])
+            for doc in await collection.find(
+                {"_id": {"$in": list(keys)}}, {"applied_ids": 1}
+            ).to_list(None)
+        }
+        for key, (user_email, subject) in keys.items():
+            group = groups[(user_email, subject)]
+            if group[-1][0].get("_id") in stored.get(key, []):
+                continue
+            for attempt, new_session in group:
+                if not await _update_rollup(collection, user_email, subject, attempt, new_session):
+                    logger.error(f"Progress rollup {key} kept changing underneath us")
+                    await _mark_incomplete(collection, user_email)
+                    break
+    except Exception as error:
+        logger.error(f"Progress rollup update failed for {len(users)} users: {error}")
+        for user_email in users:
+            await _mark_incomplete(collection, user_email)
+
+
+async def rebuild_user_rollups(progress_collection, collection, user_email: str) -> list[dict[str, Any]]:
+    """
+    Recompute a user's rollups from their full attempt history and store
+    them, marked complete. Retries if an /ask updates them meanwhile.
+    """
+    for _ in range(ROLLUP_MAX_RETRIES):
+        existing = {
+            doc["_id"]: doc["version"]
+            for doc in await collection.find(
+                {"user_email": user_email}, {"version": 1}
+            ).to_list(None)
+        }
+
+        rollups = {OVERALL: _new_rollup(user_email, OVERALL)}
+        sessions: set[tuple[str, str]] = set()
+        cursor = progress_collection.find(
+            {"user_email": user_email},
+            {"subject": 1, "chat_id": 1, "question": 1, "topics": 1, "confidence": 1,
+             "latency_seconds": 1, "created_at": 1, "user_email": 1},
+        ).sort("created_at", 1)
+
+        async for attempt in cursor:
+            subject = (attempt.get("subject") or "").lower()
+            if subject and subject not in rollups:
+                rollups[subject] = _new_rollup(user_email, subject)
+            if subject:
+                chat_id = attempt.get("chat_id")
+                new_session = bool(chat_id) and (subject, chat_id) not in sessions
+                if new_session:
+                    sessions.add((subject, chat_id))
+                apply_attempt(rollups[subject], attempt, new_session)
+            apply_attempt(rollups[OVERALL], attempt)
+
+        # Later attempts in these chats must not count them again.
+        if sessions:
+            await collection.bulk_write([
+                UpdateOne(
+                    {"_id": _session_id(user_email, subject, chat_id)},
+                    {"$setOnInsert": {"session_of": _rollup_id(user_email, subject)}},
+                    upsert=True,
+                )
+                for subject, chat_id in sessions
+            ], ordered=False)
+
+        rollups[OVERALL]["complete"] = True
+
+        # The overall document goes last: it marks the set as complete.
+        ordered = [r for name, r in rollups.items() if name != OVERALL] + [rollups[OVERALL]]
+        stored = True
+        for rollup in ordered:
+            version = existing.get(rollup["_id"])
+
+            if version is None:
+                try:
+                    await collection.insert_one(rollup)
+                except DuplicateKeyError:
+                    stored = False
+                    break
+            else:
+                rollup["version"] = version + 1
+                result = await collection.replace_one(
+                    {"_id": rollup["_id"], "version": version}, rollup
+                )
+                if not result.matched_count:
+                    stored = False
+                    break
+
+        if stored:
+            return list(rollups.values())
+
+    logger.warning(f"Progress rollups for {user_email} kept changing during rebuild")
+    return list(rollups.values())
+
+
+# ----------------------------
+# Read path
+# ----------------------------
+def _subject_stats(rollup: dict[str, Any] | None, today: date) -> dict[str, Any]:
+    stats = {
+        "sessions": 0,
+        "questions": 0,
+        "studyMinutes": 0,
+        "confidence": 0,
+        "avgLatency": 0,
+        "recentTopics": [],
+        "weakAreas": [],
+        "strongAreas": [],
+        "weeklyActivity": [0] * 7,
+        "topicFrequency": {},
+    }
+
+    if not rollup or not rollup.get("questions"):
+        return stats
+
+    questions = rollup["questions"]
+    stats["sessions"] = rollup["sessions"] or questions
+    stats["questions"] = questions
+    stats["confidence"] = round(rollup["confidence_sum"] / questions, 3)
+    stats["avgLatency"] = round(rollup["latency_sum"] / questions, 3)
+    stats["studyMinutes"] = rollup["study_minutes"]
+    stats["topicFrequency"] = dict(
+        sorted(rollup["topic_counts"].items(), key=lambda x: -x[1])[:_TOP_TOPICS]
+    )
+    stats["recentTopics"] = [_topic_display_name(t) for t in rollup["recent_topics"]]
+    stats["weakAreas"] = list(rollup["weak_areas"])
+    stats["strongAreas"] = list(rollup["strong_areas"])
+
+    cutoff = today - timedelta(days=_WEEK_DAYS - 1)
+    for day, count in rollup["daily_counts"].items():
+        day = date.fromisoformat(day)
+        if cutoff <= day <= today:
+            stats["weeklyActivity"][day.weekday()] += count
+
+    return stats
+
+
+def build_progress_payload_from_rollups(
+    user_email: str,
+    rollups: list[dict[str, Any]],
+    joined_at: datetime | None,
+) -> dict[str, Any]:
+    """Same shape as progress_service._build_progress_payload."""
+    today = datetime.utcnow().date()
+    by_subject = {rollup["subject"]: rollup for rollup in rollups}
+
+    result = {
+        "userId": user_email,
+        "physics": _subject_stats(by_subject.get("physics"), today),
+        "math": _subject_stats(by_subject.get("math"), today),
+        "overallStreak": 0,
+        "totalHours": 0,
+        "joinedAt": joined_at.isoformat() if isinstance(joined_at, datetime) else "",
+    }
+
+    overall = by_subject.get(OVERALL)
+    if overall and overall.get("last_active_date") == today.isoformat():
+        result["overallStreak"] = overall["streak"]
+
+    total_minutes = result["physics"]["studyMinutes"] + result["math"]["studyMinutes"]
+    result["totalHours"] = round(total_minutes / 60.0, 1)
+
+    return result
+
+
+async def load_user_rollups(progress_collection, collection, user_email: str) -> list[dict[str, Any]]:
+    """The user's rollups, rebuilding them first if they are not complete."""
+    rollups = await collection.find({"user_email": user_email}).to_list(None)
+
+    overall = next((r for r in rollups if r.get("subject") == OVERALL), None)
+    if overall is None or not overall.get("complete") or overall.get("schema") != ROLLUP_SCHEMA:
+        rollups = await rebuild_user_rollups(progress_collection, collection, user_email)
+
+    return rollups
+
+
+# ----------------------------
+# Backfill
+# ----------------------------
+async def backfill(progress_collection, collection, user_email: str | None = None) -> int:
+    users = [user_email] if user_email else await progress_collection.distinct("user_email")
+
+    for count, email in enumerate(users, start=1):
+        await rebuild_user_rollups(progress_collection, collection, email)
+        if count % 100 == 0:
+            logger.info(f"Backfilled progress rollups for {count}/{len(users)} users")
+
+    return len(users)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Progress rollup maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--user", help="only this user's email")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from api.app.db import progress_collection, progress_rollups_collection
+
+    total = asyncio.run(backfill(progress_collection, progress_rollups_collection, args.user))
+    print(f"Rebuilt progress rollups for {total} users")
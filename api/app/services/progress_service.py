@@ -1,6 +1,6 @@
 from typing import Any
 from datetime import datetime
-from api.app.services.topic_classifier import _extract_topics
+from api.app.services.topic_classifier import attempt_topics
 
 
 def _topic_display_name(topic: str) -> str:
@@ -83,9 +83,13 @@ def _build_progress_payload(
         stats["studyMinutes"] = estimated_minutes
         total_study_minutes += estimated_minutes
 
+        # Stored tags (or classified once, for untagged attempts); the
+        # sections below use the first 2 or 3.
+        topics_by_attempt = {id(a): attempt_topics(a, subject, limit=3) for a in atts}
+
         topic_counts = {}
         for a in atts:
-            for t in _extract_topics(a.get("question", ""), subject, limit=3):
+            for t in topics_by_attempt[id(a)]:
                 topic_counts[t] = topic_counts.get(t, 0) + 1
 
         stats["topicFrequency"] = dict(
@@ -102,7 +106,7 @@ def _build_progress_payload(
 
         seen_recent = []
         for a in sorted_atts:
-            for t in _extract_topics(a.get("question", ""), subject, limit=2):
+            for t in topics_by_attempt[id(a)][:2]:
                 if t not in seen_recent:
                     seen_recent.append(t)
 
@@ -117,7 +121,7 @@ def _build_progress_payload(
         for a in atts:
             c = float(a.get("confidence", 0) or 0)
 
-            for t in _extract_topics(a.get("question", ""), subject, limit=2):
+            for t in topics_by_attempt[id(a)][:2]:
                 display = _topic_display_name(t)
 
                 if c < 0.55 and display not in weak_topics:
@@ -1,111 +1,130 @@
-# api/app/services/topic_classifier.py - FIXED VERSION
-# Removed broken embedding code, kept simple keyword matching that actually works
-
-import numpy as np
-
-TOPIC_TAXONOMY: list[tuple[str, str]] = sorted([
-    # Physics
-    ("projectile motion",       "physics"),
-    ("simple harmonic motion",  "physics"),
-    ("electric field",          "physics"),
-    ("magnetic field",          "physics"),
-    ("electromagnetic induction","physics"),
-    ("gravitational potential", "physics"),
-    ("nuclear fission",         "physics"),
-    ("nuclear fusion",          "physics"),
-    ("radioactive decay",       "physics"),
-    ("wave optics",             "physics"),
-    ("ray optics",              "physics"),
-    ("thermodynamics",          "physics"),
-    ("electromagnetism",        "physics"),
-    ("electrostatics",          "physics"),
-    ("kinematics",              "physics"),
-    ("dynamics",                "physics"),
-    ("gravitation",             "physics"),
-    ("momentum",                "physics"),
-    ("friction",                "physics"),
-    ("oscillation",             "physics"),
-    ("resonance",               "physics"),
-    ("refraction",              "physics"),
-    ("diffraction",             "physics"),
-    ("interference",            "physics"),
-    ("capacitor",               "physics"),
-    ("resistance",              "physics"),
-    ("current",                 "physics"),
-    ("voltage",                 "physics"),
-    ("induction",               "physics"),
-    ("entropy",                 "physics"),
-    ("torque",                  "physics"),
-    ("pressure",                "physics"),
-    ("quantum",                 "physics"),
-    ("relativity",              "physics"),
-    ("photon",                  "physics"),
-    ("electron",                "physics"),
-    ("nucleus",                 "physics"),
-    ("circuits",                "physics"),
-    ("rotation",                "physics"),
-    ("waves",                   "physics"),
-    ("optics",                  "physics"),
-    ("energy",                  "physics"),
-    ("force",                   "physics"),
-    ("work",                    "physics"),
-    ("power",                   "physics"),
-    ("velocity",                "physics"),
-    ("acceleration",            "physics"),
-    ("light",                   "physics"),
-    ("sound",                   "physics"),
-    ("heat",                    "physics"),
-    ("temperature",             "physics"),
-    # Math
-    ("differential equation",   "math"),
-    ("linear algebra",          "math"),
-    ("number theory",           "math"),
-    ("set theory",              "math"),
-    ("complex numbers",         "math"),
-    ("quadratic formula",       "math"),
-    ("binomial theorem",        "math"),
-    ("pythagorean theorem",     "math"),
-    ("trigonometric identities","math"),
-    ("integration by parts",    "math"),
-    ("chain rule",              "math"),
-    ("product rule",            "math"),
-    ("quotient rule",           "math"),
-    ("taylor series",           "math"),
-    ("fourier series",          "math"),
-    ("matrix multiplication",   "math"),
-    ("eigenvalue",              "math"),
-    ("determinant",             "math"),
-    ("probability",             "math"),
-    ("statistics",              "math"),
-    ("combinatorics",           "math"),
-    ("permutation",             "math"),
-    ("trigonometry",            "math"),
-    ("integration",             "math"),
-    ("differentiation",         "math"),
-    ("derivative",              "math"),
-    ("integral",                "math"),
-    ("calculus",                "math"),
-    ("algebra",                 "math"),
-    ("geometry",                "math"),
-    ("polynomial",              "math"),
-    ("quadratic",               "math"),
-    ("logarithm",               "math"),
-    ("exponential",             "math"),
-    ("fraction",                "math"),
-    ("inequality",              "math"),
-    ("sequence",                "math"),
-    ("series",                  "math"),
-    ("vectors",                 "math"),
-    ("matrices",                "math"),
-    ("limits",                  "math"),
-    ("parabola",                "math"),
-    ("hyperbola",               "math"),
-    ("ellipse",                 "math"),
-    ("triangle",                "math"),
-    ("circle",                  "math"),
-    ("equation",                "math"),
-    ("solution",                "math"),
-], key=lambda x: -len(x[0]))
+# api/app/services/topic_classifier.py
+# Keyword topic matching. The taxonomy lives in topic_taxonomy.json (or
+# TOPIC_TAXONOMY_PATH) and is compiled into one Aho-Corasick automaton per
+# subject, so a question is scanned once no matter how many topics there
+# are. Results are memoized per (question, subject).
+#
+# /ask stores the tags on each attempt ("topics"), so reads do not classify
+# again. Tag attempts saved before that, or re-tag after the taxonomy changes:
+#   python -m api.app.services.topic_classifier backfill
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+TOPIC_TAXONOMY_PATH = Path(
+    os.getenv("TOPIC_TAXONOMY_PATH", Path(__file__).with_name("topic_taxonomy.json"))
+)
+TOPIC_CACHE_SIZE = int(os.getenv("TOPIC_CACHE_SIZE", "20000"))
+
+
+def load_taxonomy(path: Path = TOPIC_TAXONOMY_PATH) -> list[tuple[str, str]]:
+    """
+    (topic, subject) pairs from a {"subject": ["topic", ...]} JSON file,
+    longest topic first. Topics are matched case-insensitively.
+    """
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    pairs = [
+        (topic.strip().lower(), subject.strip().lower())
+        for subject, topics in raw.items()
+        for topic in topics
+        if topic.strip()
+    ]
+    return sorted(pairs, key=lambda x: -len(x[0]))
+
+
+TOPIC_TAXONOMY: list[tuple[str, str]] = load_taxonomy()
+# Stored alongside tags, so a backfill can find attempts tagged with an older taxonomy.
+TAXONOMY_VERSION = hashlib.sha1(json.dumps(TOPIC_TAXONOMY).encode("utf-8")).hexdigest()[:12]
+
+
+class TopicMatcher:
+    """
+    Aho-Corasick automaton over one subject's topics. find_all returns
+    every topic occurring anywhere in the text (overlaps included, as with
+    a substring test), in taxonomy order.
+    """
+
+    def __init__(self, topics: list[str]):
+        self._rank = {topic: rank for rank, topic in enumerate(dict.fromkeys(topics))}
+
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[str, ...]] = [()]
+
+        for topic in self._rank:
+            state = 0
+            for char in topic:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            self._out[state] += (topic,)
+
+        # Breadth-first, so each state's failure link is final before its children.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> tuple[str, ...]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = set()
+
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+
+        return tuple(sorted(found, key=self._rank.__getitem__))
+
+
+_MATCHERS: dict[str, TopicMatcher] = {}
+_MATCHERS_LOCK = threading.Lock()
+
+
+def get_topic_matcher(subject: str) -> TopicMatcher:
+    matcher = _MATCHERS.get(subject)
+    if matcher is None:
+        with _MATCHERS_LOCK:
+            matcher = _MATCHERS.get(subject)
+            if matcher is None:
+                matcher = TopicMatcher(
+                    [topic for topic, topic_subject in TOPIC_TAXONOMY if topic_subject == subject]
+                )
+                _MATCHERS[subject] = matcher
+    return matcher
+
+
+@lru_cache(maxsize=TOPIC_CACHE_SIZE)
+def _classify(text: str, subject: str) -> tuple[str, ...]:
+    return get_topic_matcher(subject).find_all(text)
 
 
 def _extract_topics(
@@ -114,7 +133,7 @@ def _extract_topics(
     limit: int = 5
 ) -> list[str]:
     """
-    Extract topics from text using simple keyword matching.
+    Extract topics from text using keyword matching.
     
     Args:
         text: The input text to analyze (e.g., a student's question)
@@ -122,7 +141,8 @@ def _extract_topics(
         limit: Maximum number of topics to return
     
     Returns:
-        List of topic strings found in the text, up to `limit` items
+        List of topic strings found in the text, up to `limit` items,
+        longest topic first
     
     Example:
         >>> _extract_topics("Solve for x in x^2 + 2x + 1 = 0", "math", limit=3)
@@ -130,24 +150,26 @@ def _extract_topics(
     """
     if not text or not text.strip():
         return []
-    
-    haystack = text.lower()
-    found = []
 
-    # TOPIC_TAXONOMY is sorted by length descending, so longer matches come first
-    # This prevents "quadratic" from being matched as "quad" + "ratic"
-    for topic, topic_subject in TOPIC_TAXONOMY:
-        if topic_subject != subject:
-            continue
+    return list(_classify(text, subject)[:limit])
+
 
-        # Simple substring match (case-insensitive)
-        if topic in haystack:
-            found.append(topic)
+def tag_topics(question: str, subject: str) -> list[str]:
+    """All topics in `question`, longest first: the tags stored on an attempt."""
+    if not question or not question.strip():
+        return []
+    return list(_classify(question, (subject or "").lower()))
 
-        if len(found) >= limit:
-            break
 
-    return found[:limit]
+def attempt_topics(attempt: dict, subject: str, limit: int = 5) -> list[str]:
+    """
+    An attempt's stored topic tags, or its question classified on the fly
+    if it was saved before attempts were tagged.
+    """
+    topics = attempt.get("topics")
+    if topics is None:
+        return _extract_topics(attempt.get("question", ""), subject, limit=limit)
+    return list(topics[:limit])
 
 
 def extract_weak_and_strong_topics(
@@ -173,9 +195,8 @@ def extract_weak_and_strong_topics(
     
     for attempt in attempts:
         confidence = float(attempt.get("confidence", 0) or 0)
-        question = attempt.get("question", "")
         
-        topics = _extract_topics(question, subject, limit=2)
+        topics = attempt_topics(attempt, subject, limit=2)
         
         for topic in topics:
             # Format topic for display (title case with proper spacing)
@@ -187,3 +208,48 @@ def extract_weak_and_strong_topics(
                 strong_topics.append(display_topic)
     
     return weak_topics[:5], strong_topics[:5]
+
+
+async def backfill_topics(collection, batch_size: int = 500) -> int:
+    """Tag attempts that are untagged or were tagged with another taxonomy."""
+    query = {"topic_taxonomy": {"$ne": TAXONOMY_VERSION}}
+    cursor = collection.find(query, {"question": 1, "subject": 1})
+
+    tagged = 0
+    batch = []
+    async for attempt in cursor:
+        batch.append(UpdateOne(
+            {"_id": attempt["_id"]},
+            {"$set": {
+                "topics": tag_topics(attempt.get("question", ""), attempt.get("subject", "")),
+                "topic_taxonomy": TAXONOMY_VERSION,
+            }},
+        ))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            tagged += len(batch)
+            batch = []
+            logger.info(f"Tagged {tagged} attempts")
+
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        tagged += len(batch)
+
+    return tagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Topic tags on stored attempts")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from api.app.db import progress_collection
+
+    total = asyncio.run(backfill_topics(progress_collection, args.batch_size))
+    print(f"Tagged {total} attempts with taxonomy {TAXONOMY_VERSION}")
+    if total:
+        # Rollup topic counts were computed with the old tags.
+        print("Rebuild progress rollups: python -m api.app.services.progress_rollups backfill")
@@ -0,0 +1,105 @@
+# api/app/services/warmup.py
+# Background warm-up of the embedder, subject indexes and (if enabled) the
+# reranker, so the first /ask after a cold start does not pay for loading
+# them. Readiness (/health/ready) reflects whether this has finished.
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Dict, Optional
+
+from rag.index_factory import discover_subjects
+from rag.inference_host import get_inference_client
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+READY_PING_TIMEOUT = float(os.getenv("READY_PING_TIMEOUT", "2"))
+
+
+class WarmupState:
+    def __init__(self):
+        self.status = "pending" if WARMUP_ON_STARTUP else "disabled"
+        self.started_at: Optional[datetime] = None
+        self.seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def step(self, name: str, load) -> None:
+        start = perf_counter()
+        load()
+        self.steps[name] = round(perf_counter() - start, 3)
+        logger.info(f"Warm-up: {name} in {self.steps[name]}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "seconds": self.seconds,
+            "steps": dict(self.steps),
+            "error": self.error,
+        }
+
+
+WARMUP = WarmupState()
+
+
+def _warm_up_local() -> None:
+    from rag.reranker import RERANK_ENABLED, _get_model
+    from rag.subject_retriever import encode_query, get_subject_retriever
+
+    # encode_query loads the embedder and runs one forward pass through it.
+    WARMUP.step("embedder", lambda: encode_query("warm up"))
+
+    for subject in discover_subjects():
+        WARMUP.step(f"index:{subject}", lambda: get_subject_retriever(subject))
+
+    if RERANK_ENABLED:
+        WARMUP.step("reranker", _get_model)
+
+
+async def run_warmup() -> None:
+    WARMUP.status = "running"
+    WARMUP.started_at = datetime.utcnow()
+    start = perf_counter()
+
+    try:
+        client = get_inference_client()
+        if client is not None:
+            # The inference host warms itself; just make sure it answers.
+            await client.request("ping")
+        else:
+            await asyncio.to_thread(_warm_up_local)
+    except Exception as error:
+        WARMUP.status = "failed"
+        WARMUP.error = str(error)
+        logger.error(f"Warm-up failed: {error}")
+    else:
+        WARMUP.status = "ready"
+    finally:
+        WARMUP.seconds = round(perf_counter() - start, 3)
+
+
+async def readiness() -> Dict[str, Any]:
+    """
+    Ready once warm-up has finished, or immediately when warm-up is
+    disabled (models then load on the first request). In inference-host
+    mode the host must also answer a ping.
+    """
+    ready = WARMUP.status in ("ready", "disabled")
+
+    payload: Dict[str, Any] = {"warmup": WARMUP.snapshot()}
+
+    client = get_inference_client()
+    if client is not None:
+        try:
+            await asyncio.wait_for(client.request("ping"), READY_PING_TIMEOUT)
+            payload["inference_host"] = "ok"
+        except Exception as error:
+            payload["inference_host"] = f"unavailable: {error}"
+            ready = False
+
+    payload["ready"] = ready
+    return payload
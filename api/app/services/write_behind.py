@@ -0,0 +1,225 @@
+# api/app/services/write_behind.py
+# Write-behind persistence for /ask. The route hands its documents to a
+# bounded queue and returns; a background task drains the queue and writes
+# whole batches with one insert_many per collection, retrying failures.
+#
+# - Documents get their _id when queued, so a retried insert that had in
+#   fact succeeded is recognised as a duplicate key and counted as written.
+# - When the queue is full the request writes its own documents inline:
+#   slower, but nothing is dropped.
+# - On shutdown the queue stops accepting writes and is flushed, for up to
+#   WRITE_BEHIND_FLUSH_TIMEOUT seconds.
+# - Follow-up work that can be batched (e.g. progress rollups) is passed as
+#   (handler, item); each handler is awaited once per batch with the items
+#   of every write in it that succeeded, not once per write.
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "100"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "5"))
+WRITE_BEHIND_RETRY_DELAY = float(os.getenv("WRITE_BEHIND_RETRY_DELAY", "0.2"))
+WRITE_BEHIND_FLUSH_TIMEOUT = float(os.getenv("WRITE_BEHIND_FLUSH_TIMEOUT", "10"))
+
+_DUPLICATE_KEY = 11000
+
+Hook = Optional[Callable[[], Awaitable[Any]]]
+BatchHook = Callable[[list[Any]], Awaitable[Any]]
+
+
+@dataclass
+class PendingWrite:
+    # (collection, document) pairs; a write succeeds once all are stored.
+    inserts: list[tuple[Any, dict[str, Any]]]
+    # Runs after the inserts succeed, e.g. to update derived documents.
+    after: Hook = None
+    # Runs if the inserts are given up on after all retries.
+    on_failure: Hook = None
+    # (handler, item) pairs, run once per batch for all successful writes.
+    batched: Optional[list[tuple[BatchHook, Any]]] = None
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        max_size: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH,
+        max_retries: int = WRITE_BEHIND_RETRIES,
+        retry_delay: float = WRITE_BEHIND_RETRY_DELAY,
+        flush_timeout: float = WRITE_BEHIND_FLUSH_TIMEOUT,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.flush_timeout = flush_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._overflowing = False
+
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.inline = 0
+
+    def start(self) -> None:
+        """Start the background writer; call from within the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+        self._accepting = True
+
+    async def submit(
+        self,
+        inserts: list[tuple[Any, dict[str, Any]]],
+        after: Hook = None,
+        on_failure: Hook = None,
+        batched: Optional[list[tuple[BatchHook, Any]]] = None,
+    ) -> None:
+        """
+        Queue documents for insertion. Returns immediately unless the queue
+        is full, stopped or disabled, in which case they are written inline.
+        """
+        inserts = [(collection, doc) for collection, doc in inserts if collection is not None]
+        for _, document in inserts:
+            document.setdefault("_id", ObjectId())
+
+        write = PendingWrite(inserts, after, on_failure, batched)
+
+        if self._accepting:
+            try:
+                self._queue.put_nowait(write)
+                self.queued += 1
+                self._overflowing = False
+                return
+            except asyncio.QueueFull:
+                if not self._overflowing:
+                    logger.warning("Write-behind queue full; writing inline until it drains")
+                    self._overflowing = True
+
+        self.inline += 1
+        await self._write_batch([write])
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._write_batch(batch)
+            except Exception as error:
+                logger.error(f"Write-behind batch failed: {error}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _insert(self, writes: list[PendingWrite]) -> list[PendingWrite]:
+        """One insert_many per collection; returns the writes that failed."""
+        groups: dict[int, tuple[Any, list[dict[str, Any]], list[PendingWrite]]] = {}
+        for write in writes:
+            for collection, document in write.inserts:
+                _, documents, owners = groups.setdefault(id(collection), (collection, [], []))
+                documents.append(document)
+                owners.append(write)
+
+        failed: list[PendingWrite] = []
+        for collection, documents, owners in groups.values():
+            try:
+                await collection.insert_many(documents, ordered=False)
+            except BulkWriteError as error:
+                for write_error in error.details.get("writeErrors", []):
+                    if write_error.get("code") != _DUPLICATE_KEY:
+                        failed.append(owners[write_error["index"]])
+            except Exception as error:
+                logger.warning(f"Write-behind insert into {collection.name} failed: {error}")
+                failed.extend(owners)
+
+        return list({id(write): write for write in failed}.values())
+
+    async def _write_batch(self, batch: list[PendingWrite]) -> None:
+        self.batches += 1
+        pending = batch
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            pending = await self._insert(pending)
+            if not pending:
+                break
+
+        lost = {id(write) for write in pending}
+        batched: dict[BatchHook, list[Any]] = {}
+        for write in batch:
+            if id(write) in lost:
+                self.failed += 1
+                hook = write.on_failure
+            else:
+                self.written += 1
+                hook = write.after
+                for handler, item in write.batched or []:
+                    batched.setdefault(handler, []).append(item)
+
+            if hook is not None:
+                try:
+                    await hook()
+                except Exception as error:
+                    logger.error(f"Write-behind hook failed: {error}")
+
+        for handler, items in batched.items():
+            try:
+                await handler(items)
+            except Exception as error:
+                logger.error(f"Write-behind batch hook failed: {error}")
+
+        if pending:
+            logger.error(f"Gave up on {len(pending)} writes after {self.max_retries} retries")
+
+    async def close(self) -> None:
+        """Stop accepting writes and flush what is queued."""
+        if self._task is None:
+            return
+
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), self.flush_timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Write-behind flush timed out with {self._queue.qsize()} writes still queued"
+            )
+
+        self._task.cancel()
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": WRITE_BEHIND_ENABLED,
+            "running": self._task is not None,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+            "inline": self.inline,
+        }
+
+
+WRITE_BEHIND = WriteBehindQueue()
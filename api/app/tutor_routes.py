@@ -1,18 +1,38 @@
+import asyncio
+import json
+import logging
 from datetime import datetime
 from time import perf_counter
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from api.app.db import chats_collection, progress_collection
+from api.app.db import chats_collection, progress_collection, progress_rollups_collection
 from api.app.dependencies import get_current_user
-from rag.memory import add_to_history, get_history
+from api.app.services.progress_rollups import record_attempts
+from api.app.services.topic_classifier import TAXONOMY_VERSION, tag_topics
+from api.app.services.write_behind import WRITE_BEHIND
+from rag.answer_cache import ANSWER_CACHE, ANSWER_CACHE_ENABLED
+from rag.index_factory import discover_subjects, subject_signature
+from rag.inference_host import RemoteRetriever, get_inference_client
+from rag.memory import conversation_collection, forget_turn, get_history, remember_turn, turn_stored
+from rag.worker_pool import RETRIEVAL_POOL
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Tutor"])
 
+# "auto" searches every subject shard; other subjects are the built-in
+# ones plus whatever {subject}_index.faiss files exist under embeddings/.
+# A built-in subject whose index is missing gets a 503, not a 400.
+AUTO_SUBJECT = "auto"
 VALID_SUBJECTS = {"physics", "math"}
 RETRIEVERS = {}
 
+_background_tasks = set()
+
 
 class AskRequest(BaseModel):
     user_id: str
@@ -42,25 +62,89 @@ async def _format_conversation_context(user_id: str) -> str:
     return "\n".join(lines)
 
 def _get_subject_retriever(subject: str):
-    from rag.subject_retriever import SubjectRetriever
-
     if subject not in RETRIEVERS:
-        RETRIEVERS[subject] = SubjectRetriever(subject)
+        client = get_inference_client()
+        if client is not None:
+            # Models and indexes live in the inference host process.
+            RETRIEVERS[subject] = RemoteRetriever(client, subject)
+        elif subject == AUTO_SUBJECT:
+            from rag.sharded_retriever import get_sharded_retriever
+
+            RETRIEVERS[subject] = get_sharded_retriever()
+        else:
+            from rag.subject_retriever import get_subject_retriever
+
+            RETRIEVERS[subject] = get_subject_retriever(subject)
 
     return RETRIEVERS[subject]
 
 
-def _generate_answer(**kwargs):
-    from rag.hybrid_generator import generate_answer
+async def _aget_subject_retriever(subject: str):
+    # Loading an index reads it from disk, so keep that off the event loop too.
+    if subject in RETRIEVERS:
+        return RETRIEVERS[subject]
 
-    return generate_answer(**kwargs)
+    return await RETRIEVAL_POOL.run(_get_subject_retriever, subject)
 
 
-@router.post("/ask")
-async def ask_tutor(
-    req: AskRequest,
-    current_user: str = Depends(get_current_user),
+async def _generate_answer(**kwargs):
+    """(answer, model_used, confidence, usage) where usage holds token counts."""
+    from rag.hybrid_generator import agenerate_answer_with_usage
+
+    return await agenerate_answer_with_usage(**kwargs)
+
+
+def _stream_answer(**kwargs):
+    from rag.hybrid_generator import stream_answer
+
+    return stream_answer(**kwargs)
+
+
+def _cache_mode(
+    subject: str,
+    question: str,
+    context: str,
+    conversation_context: str,
+    base_confidence: float,
 ):
+    """
+    Generation mode to key the answer cache on, or None to bypass it.
+
+    Concept answers are prompted with the recent conversation, so those
+    cannot be reused once a conversation is under way. Low-confidence
+    retrievals get a fixed reply and are never cached.
+    """
+    from rag.hybrid_generator import CONFIDENCE_THRESHOLD, select_mode
+
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    if (base_confidence or 0.0) < CONFIDENCE_THRESHOLD:
+        ANSWER_CACHE.record_bypass()
+        return None
+
+    # Answers generated from a previous build of the index are dropped.
+    ANSWER_CACHE.check_index_signature(subject, subject_signature(subject))
+
+    mode, _ = select_mode(question, context)
+
+    if mode == "concept" and conversation_context.strip():
+        ANSWER_CACHE.record_bypass()
+        return None
+
+    return mode
+
+
+def _cached_stream(answer: str, model_used: str, confidence: float):
+    from rag.hybrid_generator import AnswerStream
+
+    async def chunks():
+        yield answer
+
+    return AnswerStream(chunks(), model_used, confidence)
+
+
+def _validate_request(req: AskRequest):
     question = req.question.strip()
     subject = req.subject.strip().lower()
     chat_id = req.user_id.strip()
@@ -71,54 +155,72 @@ async def ask_tutor(
     if not chat_id:
         raise HTTPException(status_code=400, detail="user_id is required")
 
-    if subject not in VALID_SUBJECTS:
+    if subject not in VALID_SUBJECTS | {AUTO_SUBJECT} and subject not in discover_subjects():
         raise HTTPException(status_code=400, detail="Unsupported subject")
 
-    start = perf_counter()
+    return question, subject, chat_id
+
 
+async def _retrieve_context(subject: str, question: str):
+    """
+    Returns (subject, context, pages, sources, base_confidence, query_embedding).
+    For "auto" the subject is the shard the best chunk came from.
+    """
     try:
-        retriever = _get_subject_retriever(subject)
-        context, pages, sources, base_confidence = retriever.retrieve(question)
+        retriever = await _aget_subject_retriever(subject)
+        if subject == AUTO_SUBJECT:
+            result = await retriever.aretrieve_with_subject(question)
+            return (result[0] or subject,) + tuple(result[1:])
+        return (subject,) + tuple(await retriever.aretrieve_with_embedding(question))
     except FileNotFoundError as error:
         raise HTTPException(
             status_code=503,
             detail=f"Subject index for '{subject}' is not available",
         ) from error
     except Exception as error:
-        import traceback
-
-        print(traceback.format_exc())
-
+        logger.exception(f"Retrieval failed for subject {subject}")
         raise HTTPException(
             status_code=500,
             detail=str(error),
         ) from error
 
-    conversation_context = await _format_conversation_context(chat_id)
 
-    try:
-        answer, model_used, confidence = _generate_answer(
-            context=context,
-            question=question,
-            base_confidence=base_confidence,
-            student_level=req.student_level,
-            conversation_context=conversation_context,
-        )
-    except Exception as error:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to generate tutor response",
-        ) from error
+# /progress never reads these; only the chat history keeps them.
+_CHAT_ONLY_FIELDS = ("answer", "model_used", "sources", "pages")
 
-    latency_seconds = round(perf_counter() - start, 3)
 
-    await add_to_history(chat_id, question, answer)
+async def _record_progress(attempts: list) -> None:
+    await record_attempts(progress_rollups_collection, attempts)
+
+
+async def _save_attempt(
+    current_user: str,
+    chat_id: str,
+    subject: str,
+    question: str,
+    answer: str,
+    confidence: float,
+    model_used: str,
+    latency_seconds: float,
+    sources: list,
+    pages: list,
+):
+    """
+    Record the turn in conversation memory right away, then persist the
+    conversation turn, chat and progress documents off the response path.
+    The progress document is the chat document minus the answer and its
+    citations, under the same _id; rollups are updated once per flush.
+    """
+    conversation_entry = await remember_turn(chat_id, question, answer)
 
     attempt_document = {
         "user_email": current_user,
         "chat_id": chat_id,
         "subject": subject,
         "question": question,
+        # Tagged once here so /progress never has to classify it again.
+        "topics": tag_topics(question, subject),
+        "topic_taxonomy": TAXONOMY_VERSION,
         "answer": answer,
         "confidence": confidence,
         "model_used": model_used,
@@ -128,20 +230,202 @@ async def ask_tutor(
         "created_at": datetime.utcnow(),
     }
 
-    await chats_collection.insert_one(dict(attempt_document))
-    await progress_collection.insert_one(dict(attempt_document))
+    attempt_document["_id"] = ObjectId()
+    progress_document = {
+        key: value for key, value in attempt_document.items() if key not in _CHAT_ONLY_FIELDS
+    }
+
+    async def stored():
+        await turn_stored(chat_id, conversation_entry)
+
+    async def failed():
+        await forget_turn(chat_id, conversation_entry)
+
+    await WRITE_BEHIND.submit(
+        [
+            (conversation_collection(), conversation_entry),
+            (chats_collection, attempt_document),
+            (progress_collection, progress_document),
+        ],
+        after=stored,
+        on_failure=failed,
+        batched=[(_record_progress, progress_document)],
+    )
+
+
+@router.post("/ask")
+async def ask_tutor(
+    req: AskRequest,
+    current_user: str = Depends(get_current_user),
+):
+    question, subject, chat_id = _validate_request(req)
+
+    start = perf_counter()
+
+    subject, context, pages, sources, base_confidence, query_embedding = await _retrieve_context(
+        subject, question
+    )
+
+    conversation_context = await _format_conversation_context(chat_id)
+
+    cache_mode = _cache_mode(subject, question, context, conversation_context, base_confidence)
+    cached = None
+    if cache_mode is not None:
+        cached = ANSWER_CACHE.lookup(
+            subject, req.student_level, cache_mode, question, query_embedding
+        )
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "tokens_saved": 0}
+    if cached is not None:
+        answer, model_used, confidence = cached.answer, cached.model_used, base_confidence
+    else:
+        try:
+            answer, model_used, confidence, usage = await _generate_answer(
+                context=context,
+                question=question,
+                base_confidence=base_confidence,
+                student_level=req.student_level,
+                conversation_context=conversation_context,
+            )
+        except Exception as error:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to generate tutor response",
+            ) from error
+
+        if cache_mode is not None and model_used != "none":
+            ANSWER_CACHE.store(
+                subject, req.student_level, cache_mode, question, query_embedding,
+                answer, model_used,
+            )
+
+    latency_seconds = round(perf_counter() - start, 3)
+
+    await _save_attempt(
+        current_user, chat_id, subject, question, answer,
+        confidence, model_used, latency_seconds, sources, pages,
+    )
 
     return {
         "answer": answer,
         "confidence": confidence,
         "model_used": model_used,
         "latency_seconds": latency_seconds,
-        "tokens_used": 0,
+        "tokens_used": usage["prompt_tokens"] + usage["completion_tokens"],
+        "tokens_saved": usage["tokens_saved"],
         "sources": sources,
         "pages": pages,
+        "subject": subject,
+        "cached": cached is not None,
     }
 
 
+def _run_in_background(coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/ask/stream")
+async def ask_tutor_stream(
+    req: AskRequest,
+    current_user: str = Depends(get_current_user),
+):
+    """
+    Streaming variant of /ask using Server-Sent Events.
+
+    Emits one `meta` event (model, confidence, sources, pages), a `delta`
+    event per chunk of answer text, then a `done` event with the latency.
+    The attempt is saved once the full answer has been generated, even if
+    the client disconnects before it has all been streamed.
+    """
+    question, subject, chat_id = _validate_request(req)
+
+    start = perf_counter()
+
+    subject, context, pages, sources, base_confidence, query_embedding = await _retrieve_context(
+        subject, question
+    )
+
+    conversation_context = await _format_conversation_context(chat_id)
+
+    cache_mode = _cache_mode(subject, question, context, conversation_context, base_confidence)
+    cached = None
+    if cache_mode is not None:
+        cached = ANSWER_CACHE.lookup(
+            subject, req.student_level, cache_mode, question, query_embedding
+        )
+
+    if cached is not None:
+        stream = _cached_stream(cached.answer, cached.model_used, base_confidence)
+    else:
+        stream = _stream_answer(
+            context=context,
+            question=question,
+            base_confidence=base_confidence,
+            student_level=req.student_level,
+            conversation_context=conversation_context,
+        )
+
+    async def record_turn():
+        # Generation runs in its own task, so this waits for the full answer
+        # even if the client went away mid-stream.
+        await stream.wait()
+        finished_at = perf_counter()
+
+        if (
+            cached is None
+            and cache_mode is not None
+            and stream.model_used != "none"
+            and stream.completed
+        ):
+            ANSWER_CACHE.store(
+                subject, req.student_level, cache_mode, question, query_embedding,
+                stream.text, stream.model_used,
+            )
+
+        await _save_attempt(
+            current_user, chat_id, subject, question, stream.text,
+            stream.confidence, stream.model_used, round(finished_at - start, 3),
+            sources, pages,
+        )
+
+    stream.start()
+    _run_in_background(record_turn())
+
+    async def event_source():
+        yield _sse("meta", {
+            "model_used": stream.model_used,
+            "confidence": stream.confidence,
+            "sources": sources,
+            "pages": pages,
+            "subject": subject,
+            "cached": cached is not None,
+        })
+
+        # A disconnect cancels this reader only, never the generation task.
+        async for chunk in stream:
+            yield _sse("delta", {"text": chunk})
+
+        usage = stream.usage
+        yield _sse("done", {
+            "model_used": stream.model_used,
+            "latency_seconds": round(perf_counter() - start, 3),
+            "tokens_used": usage["prompt_tokens"] + usage["completion_tokens"],
+            "tokens_saved": usage["tokens_saved"],
+        })
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/tutor/")
 async def tutor_legacy_alias(
     req: AskRequest,
@@ -198,9 +198,9 @@ def log_model_memory_usage():
     
     # Check embedder
     try:
-        from rag.subject_retriever import EMBEDDER
-        if EMBEDDER is not None:
-            logger.info(f"Embedder loaded: {type(EMBEDDER)}")
+        from rag.subject_retriever import get_embedder, is_embedder_loaded
+        if is_embedder_loaded():
+            logger.info(f"Embedder loaded: {type(get_embedder())}")
     except Exception as e:
         logger.debug(f"Could not check embedder: {e}")
     
@@ -0,0 +1,129 @@
+# benchmarks/ann_recall.py
+# Recall@k and query latency of approximate indexes against the flat baseline.
+#
+# Usage:
+#   python -m benchmarks.ann_recall physics --k 8 --queries 500 --output ann_physics.json
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from rag.index_factory import build_index, resolve_params
+
+EMBEDDINGS_DIR = Path("embeddings")
+
+CONFIGS = [
+    ("flat", {}),
+    ("ivf_flat", {"nprobe": 1}),
+    ("ivf_flat", {"nprobe": 4}),
+    ("ivf_flat", {"nprobe": 16}),
+    ("ivf_pq", {"nprobe": 4}),
+    ("ivf_pq", {"nprobe": 16}),
+    ("hnsw", {"ef_search": 16}),
+    ("hnsw", {"ef_search": 64}),
+    ("hnsw", {"ef_search": 128}),
+]
+
+
+def load_vectors(subject: str) -> np.ndarray:
+    """Corpus vectors from the embedding store, or reconstructed from the index."""
+    store_path = EMBEDDINGS_DIR / f"{subject}_embeddings.npz"
+    if store_path.exists():
+        return np.load(store_path)["vectors"].astype(np.float32)
+
+    index = faiss.read_index(str(EMBEDDINGS_DIR / f"{subject}_index.faiss"))
+    if isinstance(index, faiss.IndexIDMap2):
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal).astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, n: int, noise: float, seed: int) -> np.ndarray:
+    """Perturbed corpus vectors, so each query has a known neighbourhood."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)
+    queries = vectors[picks] + noise * rng.standard_normal((len(picks), vectors.shape[1]))
+    queries = queries.astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def _time_search(index, queries: np.ndarray, k: int):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[np.newaxis, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+    return np.array(found), np.array(latencies)
+
+
+def run(subject: str, k: int, n_queries: int, noise: float, seed: int):
+    vectors = load_vectors(subject)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    queries = make_queries(vectors, n_queries, noise, seed)
+
+    report = {"subject": subject, "vectors": int(len(vectors)), "k": k, "results": []}
+    truth = None
+
+    for index_type, overrides in CONFIGS:
+        params = resolve_params(index_type, vectors.shape[1], len(vectors), **overrides)
+        if params["index_type"] != index_type:
+            continue
+
+        build_start = time.perf_counter()
+        index, params = build_index(vectors, ids, index_type=index_type, **overrides)
+        build_seconds = time.perf_counter() - build_start
+
+        found, latencies = _time_search(index, queries, k)
+        if truth is None:
+            truth = found  # flat is first: exact results
+
+        recall = float(np.mean([
+            len(set(row) & set(expected)) / k for row, expected in zip(found, truth)
+        ]))
+
+        report["results"].append({
+            "params": params,
+            "recall_at_k": round(recall, 4),
+            "avg_latency_ms": round(1000 * float(latencies.mean()), 4),
+            "p95_latency_ms": round(1000 * float(np.percentile(latencies, 95)), 4),
+            "build_seconds": round(build_seconds, 3),
+        })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("subject")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.subject, args.k, args.queries, args.noise, args.seed)
+
+    print(f"{report['subject']}: {report['vectors']} vectors, recall@{report['k']}")
+    for row in report["results"]:
+        params = row["params"]
+        knobs = {k: v for k, v in params.items() if k in ("nlist", "nprobe", "m", "nbits", "ef_search")}
+        print(
+            f"  {params['index_type']:<9} {str(knobs):<40} "
+            f"recall={row['recall_at_k']:.3f}  avg={row['avg_latency_ms']:.3f}ms  "
+            f"p95={row['p95_latency_ms']:.3f}ms"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/auth_overhead.py
+# Per-request cost of get_current_user: full HS256 verification on every
+# call vs the verified-token cache.
+#
+# Usage:
+#   python -m benchmarks.auth_overhead --calls 20000 --tokens 50
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from api.app.auth_utils import create_access_token
+from api.app.dependencies import VerifiedTokenCache, get_current_user
+import api.app.dependencies as dependencies
+
+
+async def _per_call_us(credentials, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        await get_current_user(credentials[i % len(credentials)])
+    return 1e6 * (time.perf_counter() - start) / calls
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50, help="distinct users/tokens in rotation")
+    args = parser.parse_args()
+
+    credentials = [
+        HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=create_access_token({"sub": f"user{i}@example.com"})
+        )
+        for i in range(args.tokens)
+    ]
+
+    dependencies.TOKEN_CACHE = VerifiedTokenCache(max_entries=0)
+    uncached = await _per_call_us(credentials, args.calls)
+
+    dependencies.TOKEN_CACHE = VerifiedTokenCache()
+    cached = await _per_call_us(credentials, args.calls)
+
+    print(f"verify every request: {uncached:8.1f}us/call")
+    print(f"verified-token cache: {cached:8.1f}us/call  ({uncached / cached:.1f}x)")
+    print(f"cache: {dependencies.TOKEN_CACHE.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
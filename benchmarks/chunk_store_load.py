@@ -0,0 +1,67 @@
+# benchmarks/chunk_store_load.py
+# Load time and resident memory of pickled chunk lists vs the mmap chunk store.
+#
+# Usage:
+#   python -m rag.chunk_store physics math     # convert first, if needed
+#   python -m benchmarks.chunk_store_load physics
+
+import argparse
+import gc
+import pickle
+import time
+from pathlib import Path
+
+import psutil
+
+from rag.chunk_store import ChunkStore
+
+EMBEDDINGS_DIR = Path("embeddings")
+
+
+def _rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def _measure(label, load, touch_rows):
+    gc.collect()
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    chunks = load()
+    load_ms = 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for row in touch_rows:
+        chunks[row]["text"]
+    lookup_us = 1e6 * (time.perf_counter() - start) / max(len(touch_rows), 1)
+
+    print(
+        f"  {label:<12} load={load_ms:8.2f}ms  lookup={lookup_us:6.2f}us/row  "
+        f"rss +{_rss_mb() - rss_before:6.2f}MB"
+    )
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("subject")
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    pickle_path = EMBEDDINGS_DIR / f"{args.subject}_chunks.pkl"
+    store_path = EMBEDDINGS_DIR / f"{args.subject}_chunks.bin"
+
+    def load_pickle():
+        with open(pickle_path, "rb") as f:
+            return pickle.load(f)
+
+    print(f"{args.subject}:")
+    # Store first, so its RSS is not flattered by memory the pickle freed.
+    store = _measure("chunk store", lambda: ChunkStore(store_path), [])
+    rows = [i % len(store) for i in range(args.lookups)]
+    _measure("chunk store", lambda: ChunkStore(store_path), rows)
+    if pickle_path.exists():
+        _measure("pickle", load_pickle, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/cold_start.py
+# Import time of the API and RAG modules, and first- vs second-query
+# retrieval latency, each measured in a fresh interpreter.
+#
+# Usage:
+#   python -m benchmarks.cold_start --subject physics
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "api.app.main",
+    "rag.subject_retriever",
+    "rag.reranker",
+    "rag.generator_gemini",
+    "rag.build_subject_index",
+]
+
+_IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+_FIRST_QUERY_SNIPPET = """
+import json, time
+start = time.perf_counter()
+from rag.subject_retriever import get_subject_retriever
+imported = time.perf_counter()
+get_subject_retriever({subject!r}).retrieve("What is Newton's second law?")
+first = time.perf_counter()
+get_subject_retriever({subject!r}).retrieve("How is work related to energy?")
+second = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "first_query": first - imported,
+    "second_query": second - first,
+}}))
+"""
+
+
+def _run(snippet: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", snippet], capture_output=True, text=True, timeout=600
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subject", default="physics")
+    args = parser.parse_args()
+
+    print("import time (fresh interpreter each):")
+    for module in MODULES:
+        result = _run(_IMPORT_SNIPPET.format(module=module))
+        if "error" in result:
+            print(f"  {module:<28} error: {result['error']}")
+        else:
+            print(f"  {module:<28} {1000 * result['seconds']:9.1f}ms")
+
+    result = _run(_FIRST_QUERY_SNIPPET.format(subject=args.subject))
+    if "error" in result:
+        print(f"first query: error: {result['error']}")
+        return
+
+    print(f"retrieval ({args.subject}):")
+    print(f"  import                       {1000 * result['import']:9.1f}ms")
+    print(f"  first query (loads models)   {1000 * result['first_query']:9.1f}ms")
+    print(f"  second query                 {1000 * result['second_query']:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/embedder_parity.py
+# Checks that the int8 ONNX query embedder retrieves the same chunks as
+# the fp32 PyTorch model, and compares per-query encode latency.
+#
+# Usage:
+#   python -m rag.onnx_embedder export
+#   python -m benchmarks.embedder_parity --k 8 --min-overlap 0.9
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rag.index_factory import discover_subjects, load_index
+from rag.onnx_embedder import MODEL_PATH, load_embedder
+
+EMBEDDINGS_DIR = Path("embeddings")
+EVALUATION_SET = Path("evaluation/test_questions.json")
+
+
+def _encode(embedder, query: str) -> np.ndarray:
+    embedding = np.asarray(
+        embedder.encode([f"query: {query}"], convert_to_numpy=True, batch_size=1),
+        dtype=np.float32,
+    )
+    return embedding / np.linalg.norm(embedding, axis=1, keepdims=True)
+
+
+def _latency_ms(embedder, queries, repeats: int) -> float:
+    _encode(embedder, queries[0])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            _encode(embedder, query)
+    return 1000 * (time.perf_counter() - start) / (repeats * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--queries", help="extra JSON list of {'question': ...}")
+    args = parser.parse_args()
+
+    items = json.loads(EVALUATION_SET.read_text(encoding="utf-8"))
+    if args.queries:
+        items += json.loads(Path(args.queries).read_text(encoding="utf-8"))
+    queries = [item["question"] for item in items]
+
+    fp32 = load_embedder(MODEL_PATH, backend="torch")
+    int8 = load_embedder(MODEL_PATH, backend="onnx")
+    if type(int8) is type(fp32):
+        sys.exit("ONNX embedder is not available; run `python -m rag.onnx_embedder export`")
+
+    cosines = []
+    overlaps = []
+    for subject in discover_subjects(EMBEDDINGS_DIR):
+        index, _ = load_index(EMBEDDINGS_DIR / f"{subject}_index.faiss")
+        for query in queries:
+            a, b = _encode(fp32, query), _encode(int8, query)
+            cosines.append(float(a[0] @ b[0]))
+            _, ids_a = index.search(a, args.k)
+            _, ids_b = index.search(b, args.k)
+            overlap = len(set(ids_a[0]) & set(ids_b[0])) / args.k
+            overlaps.append(overlap)
+            if overlap < args.min_overlap:
+                print(f"  {subject}: top-{args.k} overlap {overlap:.2f} for {query!r}")
+
+    fp32_ms = _latency_ms(fp32, queries, args.repeats)
+    int8_ms = _latency_ms(int8, queries, args.repeats)
+
+    mean_overlap = float(np.mean(overlaps)) if overlaps else 1.0
+    print(f"queries={len(queries)}  subjects={len(overlaps) // max(len(queries), 1)}")
+    print(f"cosine(fp32, int8): min={min(cosines):.4f} mean={np.mean(cosines):.4f}")
+    print(f"top-{args.k} overlap: min={min(overlaps):.2f} mean={mean_overlap:.3f}")
+    print(f"encode latency: fp32={fp32_ms:.2f}ms  int8={int8_ms:.2f}ms  ({fp32_ms / int8_ms:.1f}x)")
+
+    if mean_overlap < args.min_overlap:
+        sys.exit(f"Parity check failed: mean overlap {mean_overlap:.3f} < {args.min_overlap}")
+
+
+if __name__ == "__main__":
+    main()
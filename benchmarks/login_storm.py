@@ -0,0 +1,125 @@
+# benchmarks/login_storm.py
+# Event-loop responsiveness during a burst of bcrypt logins: verifying
+# inline in the handler (the old behaviour) vs on the password pool.
+#
+# In-process (default): N concurrent password verifications while a probe
+# measures how late a 10ms timer fires, i.e. how long any other request
+# (such as /ask) would be stalled.
+#
+# Against a running server: N concurrent POST /login while timing /ask.
+#   python -m benchmarks.login_storm --logins 50
+#   python -m benchmarks.login_storm --url http://localhost:8000 \
+#       --email a@b.c --password secret --token <jwt> --logins 50
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from api.app.auth_utils import PASSWORD_POOL, averify_password, hash_password, verify_password
+
+PROBE_INTERVAL = 0.01
+
+
+def _summary(samples_ms):
+    if not samples_ms:
+        return "n/a"
+    samples_ms = sorted(samples_ms)
+    p99 = samples_ms[min(len(samples_ms) - 1, int(0.99 * len(samples_ms)))]
+    return (
+        f"p50={statistics.median(samples_ms):7.1f}ms  p99={p99:7.1f}ms  "
+        f"max={samples_ms[-1]:7.1f}ms"
+    )
+
+
+async def _probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(1000 * (time.perf_counter() - start - PROBE_INTERVAL))
+
+
+async def _storm(verify, logins: int, hashed: str):
+    async def inline(plain, stored):
+        return verify(plain, stored)
+
+    call = verify if asyncio.iscoroutinefunction(verify) else inline
+
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop, lags))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call("correct horse", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return elapsed, lags
+
+
+async def in_process(logins: int):
+    hashed = hash_password("correct horse")
+
+    for name, verify in (("inline", verify_password), ("pool", averify_password)):
+        elapsed, lags = await _storm(verify, logins, hashed)
+        print(f"{name:<7} {logins} logins in {elapsed:6.2f}s  loop lag {_summary(lags)}")
+
+    print(f"password pool: {PASSWORD_POOL.stats()}")
+
+
+async def against_server(args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        async def ask():
+            start = time.perf_counter()
+            await client.post(
+                "/ask",
+                json={"user_id": "login-storm", "question": args.question, "subject": args.subject},
+                headers={"Authorization": f"Bearer {args.token}"},
+            )
+            return 1000 * (time.perf_counter() - start)
+
+        baseline = [await ask() for _ in range(args.asks)]
+
+        async def login():
+            return await client.post("/login", json={"email": args.email, "password": args.password})
+
+        storm = asyncio.gather(*(login() for _ in range(args.logins)))
+        during = [await ask() for _ in range(args.asks)]
+        responses = await storm
+
+        statuses = {}
+        for response in responses:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        print(f"/ask baseline      {_summary(baseline)}")
+        print(f"/ask during storm  {_summary(during)}")
+        print(f"/login statuses    {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--url")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--token")
+    parser.add_argument("--subject", default="physics")
+    parser.add_argument("--question", default="What is Newton's second law?")
+    parser.add_argument("--asks", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(against_server(args))
+    else:
+        asyncio.run(in_process(args.logins))
+
+
+if __name__ == "__main__":
+    main()
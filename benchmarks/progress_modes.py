@@ -0,0 +1,144 @@
+# benchmarks/progress_modes.py
+# GET /progress computation on synthetic attempt histories: full scan in
+# Python vs the aggregation pipeline vs rollup documents. Reports latency
+# and the bytes each path pulls from MongoDB, and checks they agree.
+#
+# Writes to a scratch database (dropped afterwards), never to ai-tutor.
+#
+# Usage:
+#   MONGO_URL=mongodb://localhost:27017 python -m benchmarks.progress_modes \
+#       --attempts 1000 10000 --repeats 5
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from api.app.services.progress_aggregation import (
+    _progress_pipeline,
+    _questions_pipeline,
+    build_progress_payload_aggregated,
+)
+from api.app.services.progress_rollups import (
+    backfill,
+    build_progress_payload_from_rollups,
+    load_user_rollups,
+)
+from api.app.services.progress_service import _build_progress_payload
+from api.app.services.topic_classifier import TAXONOMY_VERSION, tag_topics
+
+QUESTIONS = [
+    "What is projectile motion and how do I find the maximum height?",
+    "Explain the chain rule with an example derivative",
+    "How does torque relate to rotation and angular momentum?",
+    "What is the integral of a polynomial?",
+    "How are work, energy and power related?",
+    "What is the electric field inside a capacitor?",
+    "Find the eigenvalue and determinant of this matrix",
+    "Explain simple harmonic motion and resonance",
+]
+
+
+def _synthetic_attempts(user_email: str, count: int, answer_chars: int):
+    now = datetime.utcnow()
+    for i in range(count):
+        subject = random.choice(["physics", "math"])
+        question = f"{random.choice(QUESTIONS)} (#{random.randint(0, count // 4)})"
+        yield {
+            "user_email": user_email,
+            "chat_id": f"chat-{i // 20}",
+            "subject": subject,
+            "question": question,
+            "topics": tag_topics(question, subject),
+            "topic_taxonomy": TAXONOMY_VERSION,
+            "answer": "x" * answer_chars,
+            "confidence": random.random(),
+            "model_used": "gemini",
+            "latency_seconds": random.uniform(1, 40),
+            "sources": ["physics.pdf"],
+            "pages": [random.randint(1, 400)],
+            "created_at": now - timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+        }
+
+
+async def _timed(run, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await run()
+        samples.append(1000 * (time.perf_counter() - start))
+    return statistics.median(samples)
+
+
+async def _bench(db, attempts: int, repeats: int, answer_chars: int):
+    progress = db["progress"]
+    rollups = db["progress_rollups"]
+    user = f"bench-{attempts}@example.com"
+
+    await progress.create_index([("user_email", 1), ("created_at", -1)])
+    await rollups.create_index([("user_email", 1)])
+    await progress.insert_many(list(_synthetic_attempts(user, attempts, answer_chars)))
+    await backfill(progress, rollups, user)
+
+    async def scan():
+        docs = await progress.find({"user_email": user}).to_list(None)
+        return _build_progress_payload(user, docs, None)
+
+    async def aggregate():
+        return await build_progress_payload_aggregated(progress, user, None)
+
+    async def rollup():
+        return build_progress_payload_from_rollups(
+            user, await load_user_rollups(progress, rollups, user), None
+        )
+
+    scan_docs = await progress.find({"user_email": user}).to_list(None)
+    week_start = datetime.combine(datetime.utcnow().date() - timedelta(days=6), datetime.min.time())
+    facets = await progress.aggregate(_progress_pipeline(user, week_start)).to_list(1)
+    facets += await progress.aggregate(_questions_pipeline(user)).to_list(None)
+    rollup_docs = await rollups.find({"user_email": user}).to_list(None)
+
+    transferred = {
+        "scan": sum(len(bson.encode(doc)) for doc in scan_docs),
+        "aggregate": sum(len(bson.encode(doc)) for doc in facets),
+        "rollup": sum(len(bson.encode(doc)) for doc in rollup_docs),
+    }
+
+    expected = await scan()
+    for name, run in (("aggregate", aggregate), ("rollup", rollup)):
+        if await run() != expected:
+            print(f"  warning: {name} payload differs from the full scan")
+
+    print(f"attempts={attempts}")
+    for name, run in (("scan", scan), ("aggregate", aggregate), ("rollup", rollup)):
+        ms = await _timed(run, repeats)
+        print(f"  {name:<10} {ms:9.1f}ms  {transferred[name] / 1024:10.1f}KB")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--answer-chars", type=int, default=1500)
+    parser.add_argument("--database", default="ai-tutor-progress-bench")
+    args = parser.parse_args()
+
+    random.seed(0)
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.database]
+
+    try:
+        for attempts in args.attempts:
+            await _bench(db, attempts, args.repeats, args.answer_chars)
+    finally:
+        await client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
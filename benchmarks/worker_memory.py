@@ -0,0 +1,115 @@
+# benchmarks/worker_memory.py
+# Total RSS and aggregate throughput of N API-worker-like processes, each
+# either loading its own embedder and indexes ("local") or sending
+# retrieval to one shared inference host ("host").
+#
+# Usage:
+#   python -m benchmarks.worker_memory --workers 4 --requests 200
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import psutil
+
+QUERIES = [
+    "What is Newton's second law?",
+    "How do you factor a perfect square trinomial?",
+    "Explain kinetic and potential energy",
+    "Solve a quadratic equation by completing the square",
+    "What is the unit of electric current?",
+    "What is the derivative of x squared?",
+]
+
+
+def _local_worker(subject, n_requests, ready, go, done):
+    from rag.subject_retriever import get_subject_retriever
+
+    retriever = get_subject_retriever(subject)
+    retriever.retrieve("warm up")
+    ready.set()
+    go.wait()
+    for i in range(n_requests):
+        retriever.retrieve_with_embedding(f"{QUERIES[i % len(QUERIES)]} #{i}")
+    done.put(psutil.Process().memory_info().rss)
+
+
+def _host_worker(subject, n_requests, ready, go, done):
+    from rag.inference_host import InferenceClient, RemoteRetriever
+
+    async def run():
+        retriever = RemoteRetriever(InferenceClient(os.environ["INFERENCE_HOST_SOCKET"]), subject)
+        await retriever.aretrieve_with_embedding("warm up")
+        ready.set()
+        go.wait()
+        await asyncio.gather(*[
+            retriever.aretrieve_with_embedding(f"{QUERIES[i % len(QUERIES)]} #{i}")
+            for i in range(n_requests)
+        ])
+
+    asyncio.run(run())
+    done.put(psutil.Process().memory_info().rss)
+
+
+def _run(mode, workers, n_requests, subject):
+    target = _local_worker if mode == "local" else _host_worker
+    ctx = multiprocessing.get_context("spawn")
+    go = ctx.Event()
+    done = ctx.Queue()
+    readies = [ctx.Event() for _ in range(workers)]
+    processes = [
+        ctx.Process(target=target, args=(subject, n_requests, readies[i], go, done))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait()
+
+    start = time.perf_counter()
+    go.set()
+    rss = [done.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    return sum(rss), workers * n_requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="per worker")
+    parser.add_argument("--subject", default="physics")
+    args = parser.parse_args()
+
+    rss, throughput = _run("local", args.workers, args.requests, args.subject)
+    print(f"local: {args.workers} workers  rss={rss / 2**20:8.1f}MB  {throughput:8.1f} req/s")
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    os.environ["INFERENCE_HOST_SOCKET"] = socket_path
+    host = subprocess.Popen([sys.executable, "-m", "rag.inference_host", "--socket", socket_path])
+    try:
+        while not os.path.exists(socket_path):
+            if host.poll() is not None:
+                raise SystemExit("inference host exited")
+            time.sleep(0.2)
+
+        rss, throughput = _run("host", args.workers, args.requests, args.subject)
+        host_rss = psutil.Process(host.pid).memory_info().rss
+        print(
+            f"host:  {args.workers} workers  rss={(rss + host_rss) / 2**20:8.1f}MB  "
+            f"{throughput:8.1f} req/s  (host process {host_rss / 2**20:.1f}MB)"
+        )
+    finally:
+        host.terminate()
+        host.wait()
+
+
+if __name__ == "__main__":
+    main()
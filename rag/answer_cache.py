@@ -0,0 +1,215 @@
+# rag/answer_cache.py
+# Semantic answer cache: near-identical questions in the same subject,
+# student level and generation mode reuse a previously generated answer.
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BucketKey = Tuple[str, str, str]  # (subject, student_level, mode)
+
+# "solve 2x+3=7" and "solve 2x+5=7" embed almost identically but have
+# different answers, so problem-solving modes only reuse an answer to the
+# same question, not merely a similar one.
+EXACT_MATCH_MODES = frozenset({"solver", "followup_answers", "detailed_solver"})
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+@dataclass
+class CachedAnswer:
+    bucket: BucketKey
+    question: str
+    embedding: np.ndarray
+    answer: str
+    model_used: str
+    created_at: float
+    size_bytes: int
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of answers, looked up by cosine similarity.
+
+    Query embeddings are expected to be L2-normalized (as produced by
+    SubjectRetriever), so cosine similarity is a dot product. Entries are
+    evicted least-recently-used first whenever `max_entries` or
+    `max_bytes` is exceeded, and lazily once older than `ttl_seconds`.
+
+    Modes in EXACT_MATCH_MODES additionally require the same normalized
+    question. A subject's answers are dropped when its index changes.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 2000,
+        ttl_seconds: float = 24 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[BucketKey, set] = {}
+        self._signatures: Dict[str, Any] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "SemanticAnswerCache":
+        return cls(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600))),
+            max_bytes=int(float(os.getenv("ANSWER_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        )
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._buckets[entry.bucket].discard(entry_id)
+        if not self._buckets[entry.bucket]:
+            del self._buckets[entry.bucket]
+        self._bytes -= entry.size_bytes
+
+    def _evict_to_limits(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def lookup(
+        self,
+        subject: str,
+        student_level: str,
+        mode: str,
+        question: str,
+        embedding: np.ndarray,
+    ) -> Optional[CachedAnswer]:
+        """Return the most similar cached answer above the threshold, if any."""
+        bucket = (subject, student_level, mode)
+        question = normalize_question(question)
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        now = monotonic()
+
+        with self._lock:
+            ids = list(self._buckets.get(bucket, ()))
+
+            expired = [i for i in ids if now - self._entries[i].created_at > self.ttl_seconds]
+            for entry_id in expired:
+                self._remove(entry_id)
+            ids = [i for i in ids if i in self._entries]
+            if mode in EXACT_MATCH_MODES:
+                ids = [i for i in ids if self._entries[i].question == question]
+
+            if not ids:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([self._entries[i].embedding for i in ids])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(ids[best])
+            return self._entries[ids[best]]
+
+    def store(
+        self,
+        subject: str,
+        student_level: str,
+        mode: str,
+        question: str,
+        embedding: np.ndarray,
+        answer: str,
+        model_used: str,
+    ) -> None:
+        vector = np.array(embedding, dtype=np.float32).reshape(-1)
+        entry = CachedAnswer(
+            bucket=(subject, student_level, mode),
+            question=normalize_question(question),
+            embedding=vector,
+            answer=answer,
+            model_used=model_used,
+            created_at=monotonic(),
+            size_bytes=vector.nbytes + len(answer.encode("utf-8")),
+        )
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(entry.bucket, set()).add(entry_id)
+            self._bytes += entry.size_bytes
+            self._evict_to_limits()
+
+    def record_bypass(self) -> None:
+        self.bypassed += 1
+
+    def invalidate(self, subject: str) -> None:
+        """Drop every cached answer for `subject`, e.g. after it is re-ingested."""
+        with self._lock:
+            for bucket in [b for b in self._buckets if b[0] == subject]:
+                for entry_id in list(self._buckets.get(bucket, ())):
+                    self._remove(entry_id)
+            self.invalidations += 1
+
+    def check_index_signature(self, subject: str, signature: Any) -> None:
+        """Invalidate `subject` if its index files changed since the last call."""
+        with self._lock:
+            previous = self._signatures.get(subject)
+            self._signatures[subject] = signature
+        if previous is not None and previous != signature:
+            logger.info(f"{subject} index changed, dropping its cached answers")
+            self.invalidate(subject)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") != "0"
+ANSWER_CACHE = SemanticAnswerCache.from_env()
@@ -1,6 +1,10 @@
 # rag/build_subject_index.py  — updated to use Gemini embeddings
 
+import hashlib
 import pickle
+import threading
+import time
+import uuid
 from pathlib import Path
 
 import faiss
@@ -16,16 +20,249 @@ if _repo_root not in sys.path:
 
 # Try package-relative import first, then absolute
 try:
+    from .chunk_store import ChunkStore, write_chunk_store
     from .chunker import chunk_text
+    from .lexical_index import BM25Index
+    from .index_factory import (
+        DEFAULT_INDEX_TYPE,
+        build_index,
+        load_index,
+        params_from_env,
+        supports_remove,
+        write_index_meta,
+    )
 except Exception:
+    from rag.chunk_store import ChunkStore, write_chunk_store
     from rag.chunker import chunk_text
-from sentence_transformers import SentenceTransformer
-
+    from rag.lexical_index import BM25Index
+    from rag.index_factory import (
+        DEFAULT_INDEX_TYPE,
+        build_index,
+        load_index,
+        params_from_env,
+        supports_remove,
+        write_index_meta,
+    )
 MODEL_PATH = "sentence-transformers/all-MiniLM-L6-v2"
-EMBEDDER = SentenceTransformer(MODEL_PATH)
 EMBEDDINGS_DIR = Path("embeddings")
 
-def build_subject_index(text_path: str, subject: str):
+# Loaded on the first build, so importing this module stays cheap.
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+
+                _embedder = SentenceTransformer(MODEL_PATH)
+
+    return _embedder
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+# Chunks re-encoded one at a time to check each build's embeddings; 0 skips it.
+EMBED_PARITY_SAMPLE = int(os.getenv("EMBED_PARITY_SAMPLE", "32"))
+
+
+def _normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def encode_passages(texts, batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS):
+    """
+    Embed chunk texts in batches and return normalized float32 vectors.
+
+    With workers > 1 the batches are spread over a multi-process encode
+    pool. Progress and throughput are printed as each group finishes.
+    """
+    embedder = get_embedder()
+    passages = [f"passage: {text}" for text in texts]
+    total = len(passages)
+    if total == 0:
+        return np.zeros((0, embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    pool = None
+    if workers > 1:
+        pool = embedder.start_multi_process_pool(target_devices=["cpu"] * workers)
+        step = batch_size * workers
+    else:
+        step = batch_size
+
+    parts = []
+    start = time.perf_counter()
+    try:
+        for i in range(0, total, step):
+            group = passages[i:i + step]
+            if pool is not None:
+                parts.append(embedder.encode_multi_process(group, pool, batch_size=batch_size))
+            else:
+                parts.append(embedder.encode(group, batch_size=batch_size, convert_to_numpy=True))
+
+            done = min(i + step, total)
+            elapsed = time.perf_counter() - start
+            rate = done / elapsed if elapsed > 0 else 0.0
+            print(f"  Embedded {done}/{total} ({rate:.1f} chunks/sec)")
+    finally:
+        if pool is not None:
+            embedder.stop_multi_process_pool(pool)
+
+    return _normalize(np.concatenate(parts, axis=0))
+
+
+def check_embedding_parity(
+    texts,
+    vectors,
+    sample_size: int = EMBED_PARITY_SAMPLE,
+    atol: float = 1e-5,
+) -> bool:
+    """
+    Compare vectors from encode_passages (batched, maybe multi-process)
+    against encoding the same texts one chunk at a time.
+
+    Padding inside a batch can change the last float bits, so results are
+    compared with a small absolute tolerance.
+    """
+    sample = list(texts)[:sample_size]
+    if not sample:
+        return True
+
+    batched = np.asarray(vectors[:len(sample)], dtype=np.float32)
+    single = _normalize(np.stack([
+        get_embedder().encode([f"passage: {text}"], convert_to_numpy=True)[0]
+        for text in sample
+    ]))
+    max_diff = float(np.max(np.abs(batched - single)))
+    print(f"Parity check on {len(sample)} chunks: max abs diff {max_diff:.2e}")
+    return max_diff <= atol
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _chunk_id(content_hash: str, occurrence: int) -> int:
+    # Stable positive int64 per chunk; repeated identical chunks get distinct ids.
+    digest = hashlib.sha256(f"{content_hash}:{occurrence}".encode("ascii")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def _assign_ids(chunks):
+    seen = {}
+    for chunk in chunks:
+        content_hash = _content_hash(chunk["text"])
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+        chunk["hash"] = content_hash
+        chunk["id"] = _chunk_id(content_hash, occurrence)
+
+
+def _store_path(subject: str) -> Path:
+    return EMBEDDINGS_DIR / f"{subject}_embeddings.npz"
+
+
+def load_embedding_store(subject: str) -> dict:
+    """Map of chunk content hash -> normalized embedding for a subject."""
+    path = _store_path(subject)
+    if not path.exists():
+        return {}
+
+    data = np.load(path, allow_pickle=False)
+    return dict(zip(data["hashes"].tolist(), data["vectors"]))
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _save_embedding_store(subject: str, store: dict) -> None:
+    hashes = sorted(store)
+    vectors = (
+        np.stack([store[h] for h in hashes]).astype(np.float32)
+        if hashes else np.zeros((0, 0), dtype=np.float32)
+    )
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=np.array(hashes, dtype="U64"), vectors=vectors)
+
+    _atomic_write(_store_path(subject), write)
+
+
+def _previous_chunk_ids(subject: str):
+    """Chunk ids of the previous build, or None if it predates chunk ids."""
+    store_path = EMBEDDINGS_DIR / f"{subject}_chunks.bin"
+    pickle_path = EMBEDDINGS_DIR / f"{subject}_chunks.pkl"
+
+    if store_path.exists():
+        store = ChunkStore(store_path)
+        return [int(i) for i in store.ids]
+
+    if pickle_path.exists():
+        with open(pickle_path, "rb") as f:
+            chunks = pickle.load(f)
+        if all("id" in c for c in chunks):
+            return [c["id"] for c in chunks]
+
+    return None
+
+
+def _load_previous(subject: str, index_type: str):
+    """Previous index, params and chunk ids, or Nones if it cannot be updated in place."""
+    index_path = EMBEDDINGS_DIR / f"{subject}_index.faiss"
+    if not index_path.exists():
+        return None, None, None
+
+    old_ids = _previous_chunk_ids(subject)
+    index, params = load_index(index_path)
+
+    id_mapped = isinstance(index, faiss.IndexIDMap2)
+    if not id_mapped or old_ids is None or index.ntotal != len(old_ids):
+        # Legacy positional index: the first incremental build is a full one.
+        return None, None, None
+
+    if params.get("index_type") != index_type:
+        print(f"Index type changed to {index_type}, rebuilding")
+        return None, None, None
+
+    return index, params, set(old_ids)
+
+
+def build_subject_index(
+    text_path: str,
+    subject: str,
+    batch_size: int = EMBED_BATCH_SIZE,
+    workers: int = EMBED_WORKERS,
+    incremental: bool = True,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    index_params: dict | None = None,
+):
+    """
+    Chunk a textbook and (re)build its FAISS index.
+
+    Chunks are keyed by a hash of their text. Embeddings are kept in a
+    persistent per-subject store, so only new or changed chunks are
+    embedded (and a sample of them checked against one-at-a-time encoding
+    before anything is written); with `incremental`, removed chunks are deleted from the
+    existing ID-mapped index and new ones added, rather than rebuilding
+    it. Each file is written to a temporary path and swapped in atomically,
+    tagged with a build id so readers never mix files from two builds.
+
+    `index_type` picks the FAISS index (see rag.index_factory); its
+    parameters default to INDEX_* env vars and are recorded next to the
+    index. HNSW cannot delete vectors, so removals there force a rebuild.
+
+    Returns a dict of counts describing what changed.
+    """
     print(f"Building index for {subject}...")
 
     with open(text_path, "r", encoding="utf-8") as f:
@@ -35,33 +272,87 @@ def build_subject_index(text_path: str, subject: str):
     chunks = chunk_text(text, clean_math=clean_math)
     print(f"Total chunks: {len(chunks)}")
 
-    embeddings = []
-    for i, chunk in enumerate(chunks):
-        emb = EMBEDDER.encode(
-            [f"passage: {chunk['text']}"],
-            convert_to_numpy=True,
-        )[0]
-        embeddings.append(emb)
-        if i % 50 == 0:
-            print(f"  Embedded {i}/{len(chunks)}")
+    _assign_ids(chunks)
 
-    embeddings = np.array(embeddings, dtype=np.float32)
+    store = load_embedding_store(subject)
+    missing = list({c["hash"]: c["text"] for c in chunks if c["hash"] not in store}.items())
+    if missing:
+        texts = [text for _, text in missing]
+        vectors = encode_passages(texts, batch_size=batch_size, workers=workers)
+        if not check_embedding_parity(texts, vectors):
+            raise RuntimeError(
+                f"{subject}: batched embeddings differ from one-at-a-time encoding; "
+                "nothing was written"
+            )
+        store.update({content_hash: vec for (content_hash, _), vec in zip(missing, vectors)})
 
-    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-    norms[norms == 0] = 1.0
-    embeddings = embeddings / norms
+    new_ids = {c["id"] for c in chunks}
+    index, params, old_ids = (
+        _load_previous(subject, index_type) if incremental else (None, None, None)
+    )
+
+    removed = set()
+    if index is not None:
+        removed = old_ids - new_ids
+        added = [c for c in chunks if c["id"] not in old_ids]
+
+        if removed and not supports_remove(params):
+            print(f"{params['index_type']} index cannot delete vectors, rebuilding")
+            index = None
+
+    if index is not None:
+        if removed:
+            index.remove_ids(np.array(sorted(removed), dtype=np.int64))
+        if added:
+            index.add_with_ids(
+                np.stack([store[c["hash"]] for c in added]).astype(np.float32),
+                np.array([c["id"] for c in added], dtype=np.int64),
+            )
+    else:
+        added = chunks
+        dim = get_embedder().get_sentence_embedding_dimension()
+        vectors = (
+            np.stack([store[c["hash"]] for c in chunks]).astype(np.float32)
+            if chunks else np.zeros((0, dim), dtype=np.float32)
+        )
+        index, params = build_index(
+            vectors,
+            np.array([c["id"] for c in chunks], dtype=np.int64),
+            index_type=index_type,
+            **(index_params if index_params is not None else params_from_env()),
+        )
 
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    index.add(embeddings)
+    # Keep only embeddings the current book still uses.
+    live_hashes = {c["hash"] for c in chunks}
+    store = {h: v for h, v in store.items() if h in live_hashes}
 
     EMBEDDINGS_DIR.mkdir(exist_ok=True)
-    faiss.write_index(index, str(EMBEDDINGS_DIR / f"{subject}_index.faiss"))
+    _save_embedding_store(subject, store)
 
-    with open(EMBEDDINGS_DIR / f"{subject}_chunks.pkl", "wb") as f:
-        pickle.dump(chunks, f)
+    # Each file is swapped in on its own, so they all carry this build's id
+    # and the meta file, which names the build being served, goes last.
+    # Until it is written, readers see mismatched ids and keep the previous
+    # build (see SubjectRetriever._load).
+    build_id = uuid.uuid4().hex
+    lexical = BM25Index.build([c["text"] for c in chunks])
+    write_chunk_store(EMBEDDINGS_DIR / f"{subject}_chunks.bin", chunks, build_id=build_id)
+    lexical.save(EMBEDDINGS_DIR / f"{subject}_lexical.npz", build_id=build_id)
+    index_path = EMBEDDINGS_DIR / f"{subject}_index.faiss"
+    _atomic_write(index_path, lambda tmp_path: faiss.write_index(index, str(tmp_path)))
+    write_index_meta(index_path, index, params, build_id=build_id)
 
-    print(f"{subject} index built successfully")
+    stats = {
+        "chunks": len(chunks),
+        "embedded": len(missing),
+        "added": len(added),
+        "removed": len(removed),
+        "reused": len(chunks) - len(added),
+        "index_type": params["index_type"],
+    }
+    print(f"{subject} index built successfully: {stats}")
+    return stats
 
 
-build_subject_index("data/math_book.txt", "math")
-build_subject_index("data/physics.txt", "physics")
+if __name__ == "__main__":
+    build_subject_index("data/math_book.txt", "math")
+    build_subject_index("data/physics.txt", "physics")
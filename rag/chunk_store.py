@@ -0,0 +1,197 @@
+# rag/chunk_store.py
+# Compact, memory-mapped chunk metadata: one file per subject holding a
+# UTF-8 text blob with offsets plus numeric columns for page, source and
+# chunk id. Opening it maps the file read-only, so every worker process
+# shares the same pages through the OS page cache instead of unpickling
+# its own list of dicts.
+#
+# Convert existing pickles with:
+#   python -m rag.chunk_store physics math
+
+import json
+import mmap
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"AITCHNK1"
+_ALIGN = 64
+
+
+def _aligned(position: int) -> int:
+    return (position + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_chunk_store(
+    path: Path,
+    chunks: Sequence[Dict[str, Any]],
+    build_id: Optional[str] = None,
+) -> None:
+    """
+    Write `chunks` (dicts with "text", optional "page", "source", "id")
+    to `path`, atomically replacing any existing file. `build_id` names
+    the index build the file belongs to.
+
+    Chunks without an "id" get their row number, which matches the
+    positional ids of indexes built before chunk ids existed.
+    """
+    path = Path(path)
+    sources: List[str] = []
+    source_index: Dict[str, int] = {}
+
+    encoded = [chunk["text"].encode("utf-8") for chunk in chunks]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+    pages = np.array([int(chunk.get("page", 0) or 0) for chunk in chunks], dtype=np.int32)
+    source_ids = np.empty(len(chunks), dtype=np.int32)
+    for row, chunk in enumerate(chunks):
+        source = chunk.get("source", "unknown")
+        if source not in source_index:
+            source_index[source] = len(sources)
+            sources.append(source)
+        source_ids[row] = source_index[source]
+
+    ids = np.array([int(chunk.get("id", row)) for row, chunk in enumerate(chunks)], dtype=np.int64)
+    id_order = np.argsort(ids, kind="stable").astype(np.int64)
+
+    columns = {
+        "offsets": offsets,
+        "pages": pages,
+        "source_ids": source_ids,
+        "ids": ids,
+        "sorted_ids": ids[id_order],
+        "id_rows": id_order,
+    }
+    text_blob = b"".join(encoded)
+
+    # Lay out sections after a fixed-size prefix + JSON header.
+    sections = {}
+    header = {"count": len(chunks), "sources": sources, "sections": sections}
+    if build_id is not None:
+        header["build_id"] = build_id
+    header_len = 4096
+    while True:
+        position = _aligned(len(MAGIC) + 8 + header_len)
+        for name, array in columns.items():
+            sections[name] = [position, array.dtype.str, int(array.size)]
+            position = _aligned(position + array.nbytes)
+        sections["texts"] = [position, "|u1", len(text_blob)]
+        header_bytes = json.dumps(header).encode("utf-8")
+        if len(header_bytes) <= header_len:
+            break
+        header_len = _aligned(len(header_bytes))
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(header_len).tobytes())
+        f.write(header_bytes.ljust(header_len, b" "))
+        for name, array in columns.items():
+            f.seek(sections[name][0])
+            f.write(array.tobytes())
+        f.seek(sections["texts"][0])
+        f.write(text_blob)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore:
+    """
+    Read-only view over a chunk store file.
+
+    Indexing by row returns the same dict shape the pickled chunk lists
+    used ({"text", "page", "source", "id"}); columns are numpy views
+    directly over the mapped file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a chunk store")
+
+        header_len = int(np.frombuffer(self._mmap, dtype=np.uint64, count=1, offset=len(MAGIC))[0])
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(self._mmap[start:start + header_len]).decode("utf-8"))
+
+        self.sources: List[str] = header["sources"]
+        self.build_id: Optional[str] = header.get("build_id")
+        self._count = header["count"]
+
+        def column(name):
+            offset, dtype, size = header["sections"][name]
+            return np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=size, offset=offset)
+
+        self.offsets = column("offsets")
+        self.pages = column("pages")
+        self.source_ids = column("source_ids")
+        self.ids = column("ids")
+        self._sorted_ids = column("sorted_ids")
+        self._id_rows = column("id_rows")
+        self._texts = column("texts")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def text(self, row: int) -> str:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def page(self, row: int) -> int:
+        return int(self.pages[row])
+
+    def source(self, row: int) -> str:
+        return self.sources[self.source_ids[row]]
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        row = int(row)
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        return {
+            "id": int(self.ids[row]),
+            "page": self.page(row),
+            "source": self.source(row),
+            "text": self.text(row),
+        }
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self[row]
+
+    def rows_for_ids(self, ids: Sequence[int]) -> List[int]:
+        """Rows for FAISS ids, in the same order; unknown ids (e.g. -1) are skipped."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_ids, ids)
+        rows = []
+        for chunk_id, pos in zip(ids, positions):
+            if pos < self._count and self._sorted_ids[pos] == chunk_id:
+                rows.append(int(self._id_rows[pos]))
+        return rows
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def convert_pickle(pickle_path: Path, store_path: Path) -> int:
+    with open(pickle_path, "rb") as f:
+        chunks = pickle.load(f)
+    write_chunk_store(store_path, chunks)
+    return len(chunks)
+
+
+if __name__ == "__main__":
+    embeddings_dir = Path("embeddings")
+    for subject in sys.argv[1:] or ["physics", "math"]:
+        count = convert_pickle(
+            embeddings_dir / f"{subject}_chunks.pkl",
+            embeddings_dir / f"{subject}_chunks.bin",
+        )
+        print(f"{subject}: wrote {count} chunks to {subject}_chunks.bin")
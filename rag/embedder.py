@@ -7,10 +7,11 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 
 from rag.chunker import chunk_text
+from rag.index_factory import DEFAULT_INDEX_TYPE, build_index, params_from_env, write_index_meta
 
 EMBEDDINGS_DIR = Path("embeddings")
 
-def build_faiss_index(text_paths):
+def build_faiss_index(text_paths, index_type: str = DEFAULT_INDEX_TYPE):
     """
     Builds ONE unified FAISS index from multiple textbooks.
     """
@@ -54,13 +55,18 @@ def build_faiss_index(text_paths):
     norms[norms == 0] = 1.0
     embeddings = (embeddings / norms).astype(np.float32)
 
-    index = faiss.IndexFlatIP(int(embeddings.shape[1]))
-    print(type(embeddings))
-    print(embeddings.shape)
-    print(embeddings.dtype)
-    index.add(embeddings)
+    # Ids are row positions in chunks.pkl.
+    index, params = build_index(
+        embeddings,
+        np.arange(len(all_chunks), dtype=np.int64),
+        index_type=index_type,
+        **params_from_env(),
+    )
+    print(f"Index: {params}")
 
-    faiss.write_index(index, str(EMBEDDINGS_DIR / "faiss_index.bin"))
+    index_path = EMBEDDINGS_DIR / "faiss_index.bin"
+    write_index_meta(index_path, index, params)
+    faiss.write_index(index, str(index_path))
 
     with open(EMBEDDINGS_DIR / "chunks.pkl", "wb") as f:
         pickle.dump(all_chunks, f)
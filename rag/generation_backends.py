@@ -0,0 +1,127 @@
+# rag/generation_backends.py
+# Async, streaming text generation backends.
+# GENERATION_BACKEND=fake swaps Gemini for a local stub so the streaming
+# path can run offline (tests, load testing, no API key).
+
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token budgets per mode: generous enough to avoid cutoffs, tight enough to be efficient.
+TOKEN_BUDGET = {
+    "followup_answers": 1200,   # Final answers only; compact
+    "detailed_solver": 8192,    # Full step-by-step; needs room
+    "solver": 4096,             # Single problem solve
+    "concept": 3000,            # Explanation + examples
+}
+
+GENERATION_TEMPERATURE = 0.3
+
+
+class GenerationBackend(ABC):
+    """Base class: subclasses implement `stream`; `generate` joins it."""
+
+    name = "base"
+
+    @abstractmethod
+    def stream(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        """Yield the answer text in chunks as it is generated."""
+
+    async def generate(self, prompt: str, max_tokens: int) -> str:
+        parts = []
+        async for part in self.stream(prompt, max_tokens):
+            parts.append(part)
+        return "".join(parts)
+
+
+class GeminiBackend(GenerationBackend):
+    """Streams from Gemini through the async client, never blocking the loop."""
+
+    name = "gemini"
+
+    def _model(self):
+        from rag.generator_gemini import get_model
+
+        return get_model()
+
+    async def stream(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        response = await self._model().generate_content_async(
+            prompt,
+            generation_config={
+                "temperature": GENERATION_TEMPERATURE,
+                "max_output_tokens": max_tokens,
+            },
+            stream=True,
+        )
+
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) are skipped.
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend(GenerationBackend):
+    """
+    Local stand-in for Gemini.
+
+    Emits `text` (or a short canned answer) a few words at a time, with an
+    optional delay between chunks to mimic token streaming.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        text: Optional[str] = None,
+        chunk_words: int = 4,
+        delay_seconds: float = 0.0,
+    ):
+        self.text = text
+        self.chunk_words = max(1, chunk_words)
+        self.delay_seconds = delay_seconds
+
+    async def stream(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        text = self.text or (
+            "This is an offline tutor response generated without calling Gemini. "
+            f"The prompt contained {len(prompt.split())} words."
+        )
+        words = text.split(" ")
+
+        for i in range(0, len(words), self.chunk_words):
+            if self.delay_seconds:
+                await asyncio.sleep(self.delay_seconds)
+            part = " ".join(words[i:i + self.chunk_words])
+            yield part if i == 0 else " " + part
+
+
+_backend: Optional[GenerationBackend] = None
+
+
+def get_generation_backend() -> GenerationBackend:
+    global _backend
+
+    if _backend is None:
+        choice = os.getenv("GENERATION_BACKEND", "gemini").strip().lower()
+        if choice == "fake":
+            _backend = FakeBackend(
+                delay_seconds=float(os.getenv("FAKE_GENERATION_DELAY", "0")),
+            )
+        else:
+            _backend = GeminiBackend()
+        logger.info(f"Generation backend: {_backend.name}")
+
+    return _backend
+
+
+def set_generation_backend(backend: Optional[GenerationBackend]) -> None:
+    """Override the backend (pass None to fall back to GENERATION_BACKEND)."""
+    global _backend
+    _backend = backend
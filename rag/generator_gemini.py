@@ -1,36 +1,44 @@
 import os
+import threading
 from typing import Any
 
 import google.generativeai as _genai
 from dotenv import load_dotenv
 
-from rag.prompt_templates import build_tutor_prompt
+from rag.generation_backends import GENERATION_TEMPERATURE, TOKEN_BUDGET
+from rag.prompt_budget import assemble_prompt
 
 # google-generativeai exposes these dynamically; treat as Any to satisfy static checkers.
 genai: Any = _genai
 
 load_dotenv(override=True)
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not set in environment variables.")
+GEMINI_MODEL = "models/gemini-2.5-flash"
 
-genai.configure(api_key=GOOGLE_API_KEY)
+# Configured on first use, so importing this module needs no key or network.
+_model = None
+_model_lock = threading.Lock()
 
-model = genai.GenerativeModel("models/gemini-2.5-flash")
 
-# Token budgets per mode: generous enough to avoid cutoffs, tight enough to be efficient.
-TOKEN_BUDGET = {
-    "followup_answers": 1200,   # Final answers only; compact
-    "detailed_solver": 8192,    # Full step-by-step; needs room
-    "solver": 4096,             # Single problem solve
-    "concept": 3000,            # Explanation + examples
-}
+def get_model():
+    global _model
+
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not set in environment variables.")
+
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel(GEMINI_MODEL)
+
+    return _model
 
 
 def generate_with_gemini(context, question, student_level,
                          conversation_context="", mode="concept"):
-    prompt = build_tutor_prompt(
+    prompt, _ = assemble_prompt(
         context,
         question,
         student_level,
@@ -40,10 +48,10 @@ def generate_with_gemini(context, question, student_level,
 
     max_tokens = TOKEN_BUDGET.get(mode, 3000)
 
-    response = model.generate_content(
+    response = get_model().generate_content(
         prompt,
         generation_config={
-            "temperature": 0.3,
+            "temperature": GENERATION_TEMPERATURE,
             "max_output_tokens": max_tokens,
         },
     )
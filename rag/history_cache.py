@@ -0,0 +1,485 @@
+# rag/history_cache.py
+# Cache backends for conversation memory (rag/memory.py).
+#
+#   memory  per-process HistoryCache (default). Single-worker only: other
+#           workers never see this worker's turns or invalidations, so with
+#           several workers a chat can read stale history for the idle TTL.
+#   redis   shared by every worker on REDIS_URL; the supported multi-worker
+#           setup. A turn added or a history cleared on any worker is seen
+#           by all of them.
+#
+# Either way MongoDB stays the source of truth: a miss reloads from it. A
+# reloaded snapshot never replaces cached history holding a newer turn, so
+# a slow reload cannot drop a turn another request added meanwhile.
+#
+# Each backend also holds the turns queued for MongoDB but not yet written
+# ("pending"), which reloads merge in; with redis they are shared too, so a
+# chat's next request sees its previous turn on whichever worker it lands.
+
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_BACKEND = os.getenv("HISTORY_CACHE_BACKEND", "memory").strip().lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+HISTORY_CACHE_PREFIX = os.getenv("HISTORY_CACHE_PREFIX", "ai-tutor:history:")
+
+
+def _newest(entries) -> Optional[datetime]:
+    times = [entry.get("created_at") for entry in entries]
+    return max((t for t in times if isinstance(t, datetime)), default=None)
+
+
+def _has_newer(cached, entries) -> bool:
+    """True if `cached` holds a turn newer than every turn in `entries`."""
+    cached_newest = _newest(cached)
+    if cached_newest is None:
+        return False
+    newest = _newest(entries)
+    return newest is None or cached_newest > newest
+
+
+class HistoryCache:
+    """
+    Bounded in-memory cache of each user's recent turns.
+
+    Users are evicted least-recently-used first once `max_users` or
+    `max_bytes` is exceeded, and lazily after `idle_ttl_seconds` without
+    access. A miss is not an error: get_history reloads from MongoDB.
+    Entries are kept oldest first.
+    """
+
+    _ENTRY_OVERHEAD = 200  # dict + datetime + ObjectId, roughly
+
+    def __init__(self, max_users: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 idle_ttl_seconds: float = 1800, maxlen: int = 6):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.maxlen = maxlen
+
+        # user_id -> (entries deque, size in bytes, last access)
+        self._users: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, maxlen: int = 6) -> "HistoryCache":
+        return cls(
+            max_users=int(os.getenv("MEMORY_CACHE_MAX_USERS", "10000")),
+            max_bytes=int(float(os.getenv("MEMORY_CACHE_MAX_MB", "32")) * 1024 * 1024),
+            idle_ttl_seconds=float(os.getenv("MEMORY_CACHE_IDLE_TTL_SECONDS", "1800")),
+            maxlen=maxlen,
+        )
+
+    def _entry_size(self, entry: Dict[str, Any]) -> int:
+        return (
+            len(entry.get("question", "").encode("utf-8"))
+            + len(entry.get("answer", "").encode("utf-8"))
+            + self._ENTRY_OVERHEAD
+        )
+
+    def _drop(self, user_id: str) -> None:
+        _, size, _ = self._users.pop(user_id)
+        self._bytes -= size
+
+    def _evict_to_limits(self) -> None:
+        while self._users and (
+            len(self._users) > self.max_users or self._bytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._users)))
+            self.evictions += 1
+
+    def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached turns (possibly empty), or None on a miss."""
+        now = monotonic()
+        with self._lock:
+            record = self._users.get(user_id)
+            if record is not None and now - record[2] > self.idle_ttl_seconds:
+                self._drop(user_id)
+                self.expirations += 1
+                record = None
+
+            if record is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            record[2] = now
+            self._users.move_to_end(user_id)
+            return list(record[0])
+
+    def put(self, user_id: str, entries: List[Dict[str, Any]]) -> bool:
+        """
+        Replace the cached turns for `user_id` (oldest first), unless the
+        cache already holds a newer turn than any of them. Returns whether
+        the entries were stored.
+        """
+        entries = deque(entries, maxlen=self.maxlen)
+        size = sum(self._entry_size(entry) for entry in entries)
+        with self._lock:
+            if user_id in self._users:
+                if _has_newer(self._users[user_id][0], entries):
+                    return False
+                self._drop(user_id)
+            self._users[user_id] = [entries, size, monotonic()]
+            self._bytes += size
+            self._evict_to_limits()
+            return True
+
+    def append(self, user_id: str, entry: Dict[str, Any], create: bool = False) -> bool:
+        """
+        Add a turn to a cached user and return True. Users not in the cache
+        are left out (unless `create`) and False is returned, so the caller
+        can load the full history instead of caching a partial one.
+        """
+        with self._lock:
+            record = self._users.get(user_id)
+            if record is None:
+                if not create:
+                    return False
+                record = [deque(maxlen=self.maxlen), 0, monotonic()]
+                self._users[user_id] = record
+
+            entries = record[0]
+            if len(entries) == entries.maxlen:
+                removed = self._entry_size(entries[0])
+                record[1] -= removed
+                self._bytes -= removed
+            entries.append(entry)
+
+            added = self._entry_size(entry)
+            record[1] += added
+            self._bytes += added
+            record[2] = monotonic()
+            self._users.move_to_end(user_id)
+            self._evict_to_limits()
+            return True
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            if user_id in self._users:
+                self._drop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "bytes": self._bytes,
+            "max_users": self.max_users,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class HistoryCacheBackend(ABC):
+    """Async interface used by rag/memory.py; see HistoryCache for the semantics."""
+
+    name = "base"
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    async def put(self, user_id: str, entries: List[Dict[str, Any]]) -> bool:
+        ...
+
+    @abstractmethod
+    async def append(self, user_id: str, entry: Dict[str, Any], create: bool = False) -> bool:
+        ...
+
+    @abstractmethod
+    async def invalidate(self, user_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def add_pending(self, user_id: str, entry: Dict[str, Any]) -> None:
+        """Record a turn (with an _id) that is queued for MongoDB."""
+
+    @abstractmethod
+    async def drop_pending(self, user_id: str, entry: Dict[str, Any]) -> None:
+        """The turn was written, or given up on."""
+
+    @abstractmethod
+    async def pending(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's pending turns, each with its _id as a string."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class InProcessHistoryBackend(HistoryCacheBackend):
+    name = "memory"
+
+    def __init__(self, cache: HistoryCache):
+        self.cache = cache
+        # user_id -> {turn _id: turn}
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    async def get(self, user_id):
+        return self.cache.get(user_id)
+
+    async def put(self, user_id, entries):
+        return self.cache.put(user_id, entries)
+
+    async def append(self, user_id, entry, create=False):
+        return self.cache.append(user_id, entry, create=create)
+
+    async def invalidate(self, user_id):
+        self.cache.invalidate(user_id)
+
+    async def add_pending(self, user_id, entry):
+        self._pending.setdefault(user_id, {})[str(entry["_id"])] = {
+            **entry, "_id": str(entry["_id"]),
+        }
+
+    async def drop_pending(self, user_id, entry):
+        pending = self._pending.get(user_id)
+        if pending is None:
+            return
+        pending.pop(str(entry["_id"]), None)
+        if not pending:
+            del self._pending[user_id]
+
+    async def pending(self, user_id):
+        return list(self._pending.get(user_id, {}).values())
+
+    def stats(self):
+        return {"backend": self.name, "pending_users": len(self._pending), **self.cache.stats()}
+
+
+# Appends only to users that are already cached (the marker key exists),
+# trims to the newest `maxlen` turns and refreshes the idle TTL, atomically.
+_APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if ARGV[4] ~= '1' then
+        return 0
+    end
+    redis.call('SET', KEYS[2], '1')
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Replaces the list unless it is cached and its last (newest) turn is newer
+# than ARGV[1], the newest turn of the snapshot; timestamps are ISO strings
+# in one fixed format, so they compare as strings.
+_PUT_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    local last = redis.call('LINDEX', KEYS[1], -1)
+    if last then
+        local newest = cjson.decode(last)['created_at']
+        if type(newest) == 'string' and newest > ARGV[1] then
+            return 0
+        end
+    end
+end
+redis.call('DEL', KEYS[1])
+if #ARGV > 2 then
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[2])
+return 1
+"""
+
+
+def _timestamp(value) -> Optional[str]:
+    return value.isoformat(timespec="microseconds") if isinstance(value, datetime) else value
+
+
+def _dump_entry(entry: Dict[str, Any]) -> str:
+    return json.dumps({
+        "question": entry.get("question", ""),
+        "answer": entry.get("answer", ""),
+        "created_at": _timestamp(entry.get("created_at")),
+    })
+
+
+def _dump_pending(entry: Dict[str, Any]) -> str:
+    return json.dumps({**json.loads(_dump_entry(entry)), "_id": str(entry["_id"])})
+
+
+def _load_entry(raw: str) -> Dict[str, Any]:
+    entry = json.loads(raw)
+    if entry.get("created_at"):
+        entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+    return entry
+
+
+class RedisHistoryBackend(HistoryCacheBackend):
+    """
+    Per-user Redis list of JSON turns (oldest first) plus a marker key,
+    and a hash of the user's pending turns by _id.
+
+    The marker records "this user's history is cached", which lets an
+    empty history be a hit and stops appends from creating a partial list
+    for a user whose history was never loaded. Both keys expire after
+    `idle_ttl_seconds` without access; size limits are left to the Redis
+    server's maxmemory / allkeys-lru policy. Redis errors degrade to cache
+    misses, never to failed requests.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = HISTORY_CACHE_PREFIX,
+                 idle_ttl_seconds: float = 1800, maxlen: int = 6):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.idle_ttl_seconds = int(idle_ttl_seconds)
+        self.maxlen = maxlen
+        self._append = self.client.register_script(_APPEND_SCRIPT)
+        self._put = self.client.register_script(_PUT_SCRIPT)
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _keys(self, user_id: str):
+        return f"{self.prefix}{user_id}", f"{self.prefix}{user_id}:cached"
+
+    def _pending_key(self, user_id: str) -> str:
+        return f"{self.prefix}{user_id}:pending"
+
+    async def get(self, user_id):
+        list_key, marker_key = self._keys(user_id)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.exists(marker_key)
+                pipe.lrange(list_key, 0, -1)
+                pipe.expire(list_key, self.idle_ttl_seconds)
+                pipe.expire(marker_key, self.idle_ttl_seconds)
+                cached, raw_entries, _, _ = await pipe.execute()
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"History cache read failed for {user_id}: {error}")
+            return None
+
+        if not cached:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return [_load_entry(raw) for raw in raw_entries]
+
+    async def put(self, user_id, entries):
+        entries = list(entries)[-self.maxlen:]
+        try:
+            stored = await self._put(
+                keys=list(self._keys(user_id)),
+                args=[
+                    _timestamp(_newest(entries)) or "",
+                    self.idle_ttl_seconds,
+                    *[_dump_entry(entry) for entry in entries],
+                ],
+            )
+            return bool(stored)
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"History cache write failed for {user_id}: {error}")
+            return False
+
+    async def append(self, user_id, entry, create=False):
+        try:
+            appended = await self._append(
+                keys=list(self._keys(user_id)),
+                args=[_dump_entry(entry), self.maxlen, self.idle_ttl_seconds, "1" if create else "0"],
+            )
+            return bool(appended)
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"History cache append failed for {user_id}: {error}")
+            # Do not leave a cached history that is missing this turn.
+            await self.invalidate(user_id)
+            return False
+
+    async def invalidate(self, user_id):
+        try:
+            await self.client.delete(*self._keys(user_id))
+        except Exception as error:
+            self.errors += 1
+            logger.error(f"History cache invalidation failed for {user_id}: {error}")
+
+    async def add_pending(self, user_id, entry):
+        key = self._pending_key(user_id)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, str(entry["_id"]), _dump_pending(entry))
+                # Outlives any write-behind retry; a lost worker's turns expire.
+                pipe.expire(key, self.idle_ttl_seconds)
+                await pipe.execute()
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"Pending turn write failed for {user_id}: {error}")
+
+    async def drop_pending(self, user_id, entry):
+        try:
+            await self.client.hdel(self._pending_key(user_id), str(entry["_id"]))
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"Pending turn removal failed for {user_id}: {error}")
+
+    async def pending(self, user_id):
+        try:
+            raw_entries = await self.client.hvals(self._pending_key(user_id))
+        except Exception as error:
+            self.errors += 1
+            logger.warning(f"Pending turn read failed for {user_id}: {error}")
+            return []
+        return [_load_entry(raw) for raw in raw_entries]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+def get_history_backend(maxlen: int = 6) -> HistoryCacheBackend:
+    """The backend named by HISTORY_CACHE_BACKEND; falls back to in-process."""
+    if HISTORY_CACHE_BACKEND == "redis":
+        try:
+            return RedisHistoryBackend(
+                idle_ttl_seconds=float(os.getenv("MEMORY_CACHE_IDLE_TTL_SECONDS", "1800")),
+                maxlen=maxlen,
+            )
+        except ImportError as error:
+            logger.warning(f"Redis history cache unavailable, using in-process cache: {error}")
+    elif HISTORY_CACHE_BACKEND != "memory":
+        logger.warning(f"Unknown HISTORY_CACHE_BACKEND '{HISTORY_CACHE_BACKEND}', using in-process cache")
+
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning(
+            "In-process history cache with several workers: chats can see stale "
+            "history; set HISTORY_CACHE_BACKEND=redis"
+        )
+
+    return InProcessHistoryBackend(HistoryCache.from_env(maxlen))
@@ -1,11 +1,29 @@
 # rag/hybrid_generator.py - RENDER OPTIMIZED
 # Prioritizes Gemini (API-based, no local models), minimal FLAN fallback
 
+import asyncio
 import logging
-from typing import Tuple
+from typing import AsyncIterator, List, Optional, Tuple
+
+from rag.generation_backends import TOKEN_BUDGET, get_generation_backend
+from rag.prompt_budget import assemble_prompt, count_tokens
 
 logger = logging.getLogger(__name__)
 
+LOW_CONFIDENCE_ANSWER = (
+    "I don't have enough information in the provided material. "
+    "Please ask a more specific question or check the course materials."
+)
+
+# Below this retrieval confidence the answer is LOW_CONFIDENCE_ANSWER.
+CONFIDENCE_THRESHOLD = 0.3
+
+UNAVAILABLE_ANSWER = (
+    "Unable to generate response using available models. "
+    "The LLM service may be temporarily unavailable. "
+    "Please try again in a moment."
+)
+
 
 def is_computational_math(question: str) -> bool:
     """Check if question requires computation"""
@@ -13,13 +31,24 @@ def is_computational_math(question: str) -> bool:
     return any(keyword in question.lower() for keyword in keywords)
 
 
+def select_mode(question: str, context: str, followup_mode=None) -> Tuple[str, str]:
+    """Pick the prompt mode and the context it should see."""
+    if followup_mode == "answers":
+        return "followup_answers", context
+    if followup_mode == "detailed":
+        return "detailed_solver", context
+    if is_computational_math(question):
+        return "solver", ""  # Self-contained problem
+    return "concept", context
+
+
 def generate_answer(
     context: str,
     question: str,
     base_confidence: float,
     student_level: str = "intermediate",
     conversation_context: str = "",
-    confidence_threshold: float = 0.3,
+    confidence_threshold: float = CONFIDENCE_THRESHOLD,
     followup_mode=None,
     use_flan_fallback: bool = False  # NEW: Control fallback
 ) -> Tuple[str, str, float]:
@@ -45,26 +74,9 @@ def generate_answer(
     # Check if we have enough information
     if confidence < confidence_threshold:
         logger.warning(f"Low confidence ({confidence:.2f}), returning generic response")
-        return (
-            "I don't have enough information in the provided material. "
-            "Please ask a more specific question or check the course materials.",
-            "none",
-            confidence,
-        )
+        return LOW_CONFIDENCE_ANSWER, "none", confidence
 
-    # Determine generation mode
-    if followup_mode == "answers":
-        mode = "followup_answers"
-        context_to_use = context
-    elif followup_mode == "detailed":
-        mode = "detailed_solver"
-        context_to_use = context
-    elif is_computational_math(question):
-        mode = "solver"
-        context_to_use = ""  # Self-contained problem
-    else:
-        mode = "concept"
-        context_to_use = context
+    mode, context_to_use = select_mode(question, context, followup_mode)
 
     # ====================================================================
     # PRIMARY: Gemini API (always try this first)
@@ -124,15 +136,239 @@ def generate_answer(
         else:
             # No fallback enabled - return error
             logger.warning("FLAN-T5 fallback disabled, returning error")
+            return UNAVAILABLE_ANSWER, "none", confidence
+
+
+# ============================================================================
+# ASYNC & STREAMING
+# ============================================================================
+
+def _build_prompt(context, question, student_level, conversation_context, mode):
+    """Budgeted prompt (see rag.prompt_budget), output token cap and usage."""
+    prompt, usage = assemble_prompt(
+        context,
+        question,
+        student_level,
+        conversation_context,
+        mode=mode,
+    )
+    if usage.tokens_saved:
+        logger.info(f"Prompt trimmed to {usage.prompt_tokens} tokens ({usage.tokens_saved} saved)")
+    return prompt, TOKEN_BUDGET.get(mode, 3000), usage
+
+
+def _usage(prompt_usage, answer: str) -> dict:
+    if prompt_usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "tokens_saved": 0}
+    return {
+        "prompt_tokens": prompt_usage.prompt_tokens,
+        "completion_tokens": count_tokens(answer),
+        "tokens_saved": prompt_usage.tokens_saved,
+    }
+
+
+async def agenerate_answer(
+    context: str,
+    question: str,
+    base_confidence: float,
+    student_level: str = "intermediate",
+    conversation_context: str = "",
+    confidence_threshold: float = CONFIDENCE_THRESHOLD,
+    followup_mode=None,
+    use_flan_fallback: bool = False,
+) -> Tuple[str, str, float]:
+    """
+    Async counterpart of generate_answer.
+
+    Generation goes through the configured backend (see
+    rag.generation_backends), so the event loop is never blocked; the
+    FLAN-T5 fallback runs in a worker thread.
+    """
+    answer, model_used, confidence, _ = await agenerate_answer_with_usage(
+        context,
+        question,
+        base_confidence,
+        student_level,
+        conversation_context,
+        confidence_threshold,
+        followup_mode,
+        use_flan_fallback,
+    )
+    return answer, model_used, confidence
+
+
+async def agenerate_answer_with_usage(
+    context: str,
+    question: str,
+    base_confidence: float,
+    student_level: str = "intermediate",
+    conversation_context: str = "",
+    confidence_threshold: float = CONFIDENCE_THRESHOLD,
+    followup_mode=None,
+    use_flan_fallback: bool = False,
+) -> Tuple[str, str, float, dict]:
+    """Like agenerate_answer, plus prompt/completion token counts and tokens saved."""
+    confidence = base_confidence if base_confidence else 0.0
+
+    if confidence < confidence_threshold:
+        logger.warning(f"Low confidence ({confidence:.2f}), returning generic response")
+        return LOW_CONFIDENCE_ANSWER, "none", confidence, _usage(None, "")
+
+    mode, context_to_use = select_mode(question, context, followup_mode)
+    prompt, max_tokens, prompt_usage = _build_prompt(
+        context_to_use, question, student_level, conversation_context, mode
+    )
+    backend = get_generation_backend()
+
+    try:
+        logger.info(f"Generating with {backend.name} ({mode})...")
+        answer = await backend.generate(prompt, max_tokens)
+
+        if answer and answer.strip():
+            return answer, backend.name, confidence, _usage(prompt_usage, answer)
+
+        raise ValueError("Empty response")
+
+    except Exception as error:
+        logger.error(f"{backend.name} generation failed ({mode}): {error}")
+
+        if not use_flan_fallback:
+            return UNAVAILABLE_ANSWER, "none", confidence, _usage(prompt_usage, "")
+
+        try:
+            from rag.generator_flan import generate_with_flan
+
+            fallback_answer = await asyncio.to_thread(
+                generate_with_flan,
+                context,
+                question,
+                student_level,
+                conversation_context,
+            )
+            if fallback_answer and fallback_answer.strip():
+                return fallback_answer, "flan-t5", confidence, _usage(prompt_usage, fallback_answer)
+            raise ValueError("Empty response from FLAN")
+
+        except Exception as fallback_error:
+            logger.error(f"FLAN-T5 also failed: {fallback_error}")
             return (
-                f"Unable to generate response using available models. "
-                f"The LLM service may be temporarily unavailable. "
-                f"Please try again in a moment.",
+                "I encountered an error generating a response. "
+                f"Error: {str(error)[:100]}. Please try again later.",
                 "none",
-                confidence
+                confidence,
+                _usage(prompt_usage, ""),
             )
 
 
+class AnswerStream:
+    """
+    Async iterator over answer text chunks.
+
+    Generation runs in a task of its own (started by `start`, or by the
+    first iteration) that feeds a queue, so cancelling a reader, e.g. on a
+    client disconnect, never cancels the backend. `model_used` and
+    `confidence` are known up front; `text` holds everything generated so
+    far, and `wait` returns once generation has ended. `completed` is only
+    set when the backend finished the answer; `failed` means it did not.
+    """
+
+    _END = object()
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[str],
+        model_used: str,
+        confidence: float,
+        prompt_usage=None,
+    ):
+        self._chunks = chunks
+        self.model_used = model_used
+        self.confidence = confidence
+        self.prompt_usage = prompt_usage
+        self.parts: List[str] = []
+        self.completed = False
+        self.failed = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def usage(self) -> dict:
+        """Token counts for the prompt and what has been streamed so far."""
+        return _usage(self.prompt_usage, self.text)
+
+    def start(self) -> asyncio.Task:
+        """Start generating, if not already; call from within the running event loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._produce())
+        return self._task
+
+    async def wait(self) -> None:
+        """Until generation has ended, whether or not anyone is reading."""
+        await asyncio.shield(self.start())
+
+    async def _produce(self) -> None:
+        try:
+            async for chunk in self._chunks:
+                self._emit(chunk)
+            self.completed = True
+        except Exception as error:
+            logger.error(f"Streaming generation failed: {error}")
+            self.model_used = "none" if not self.parts else self.model_used
+            self._emit(UNAVAILABLE_ANSWER if not self.parts else "\n\n[Response interrupted.]")
+        finally:
+            self.failed = not self.completed
+            self._queue.put_nowait(self._END)
+
+    def _emit(self, chunk: str) -> None:
+        self.parts.append(chunk)
+        self._queue.put_nowait(chunk)
+
+    async def __aiter__(self):
+        self.start()
+        while True:
+            chunk = await self._queue.get()
+            if chunk is self._END:
+                return
+            yield chunk
+
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+def stream_answer(
+    context: str,
+    question: str,
+    base_confidence: float,
+    student_level: str = "intermediate",
+    conversation_context: str = "",
+    confidence_threshold: float = CONFIDENCE_THRESHOLD,
+    followup_mode: Optional[str] = None,
+) -> AnswerStream:
+    """Like agenerate_answer, but yields the answer as it is generated."""
+    confidence = base_confidence if base_confidence else 0.0
+
+    if confidence < confidence_threshold:
+        logger.warning(f"Low confidence ({confidence:.2f}), returning generic response")
+        return AnswerStream(_single_chunk(LOW_CONFIDENCE_ANSWER), "none", confidence)
+
+    mode, context_to_use = select_mode(question, context, followup_mode)
+    prompt, max_tokens, prompt_usage = _build_prompt(
+        context_to_use, question, student_level, conversation_context, mode
+    )
+    backend = get_generation_backend()
+
+    logger.info(f"Streaming with {backend.name} ({mode})...")
+    return AnswerStream(
+        backend.stream(prompt, max_tokens), backend.name, confidence, prompt_usage
+    )
+
+
 # ============================================================================
 # CONFIGURATION & HELPERS
 # ============================================================================
@@ -177,7 +413,7 @@ def generate_answer_v2(
     base_confidence: float,
     student_level: str = "intermediate",
     conversation_context: str = "",
-    confidence_threshold: float = 0.3,
+    confidence_threshold: float = CONFIDENCE_THRESHOLD,
     followup_mode=None,
 ) -> Tuple[str, str, float]:
     """
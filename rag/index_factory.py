@@ -0,0 +1,245 @@
+# rag/index_factory.py
+# Builds, describes and loads the FAISS indexes behind each subject.
+#
+# Supported types (INDEX_TYPE env var or the index_type argument):
+#   flat      exact inner-product search (the original behaviour)
+#   ivf_flat  inverted lists over full vectors; tune with nlist / nprobe
+#   ivf_pq    inverted lists over product-quantized vectors; much smaller
+#   hnsw      graph search; tune with hnsw_m / ef_construction / ef_search
+#
+# Every index is wrapped in IndexIDMap2 so chunks keep stable ids, and its
+# parameters are recorded next to it in {name}.json.
+
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+DEFAULT_INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").strip().lower()
+
+# k-means wants roughly this many training points per centroid.
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def params_from_env() -> Dict[str, Any]:
+    """Parameter overrides from INDEX_NLIST, INDEX_NPROBE, INDEX_PQ_M, etc."""
+    names = {
+        "nlist": "INDEX_NLIST",
+        "nprobe": "INDEX_NPROBE",
+        "m": "INDEX_PQ_M",
+        "nbits": "INDEX_PQ_NBITS",
+        "hnsw_m": "INDEX_HNSW_M",
+        "ef_construction": "INDEX_EF_CONSTRUCTION",
+        "ef_search": "INDEX_EF_SEARCH",
+    }
+    return {key: int(os.environ[env]) for key, env in names.items() if os.getenv(env)}
+
+
+def _default_nlist(n_vectors: int) -> int:
+    nlist = int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, n_vectors // _MIN_POINTS_PER_CENTROID or 1))
+
+
+def _default_pq_m(dim: int) -> int:
+    # Sub-quantizers must divide the dimension; aim for 8 dims each.
+    for m in (dim // 8, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m and dim % m == 0:
+            return m
+    return 1
+
+
+def resolve_params(
+    index_type: str,
+    dim: int,
+    n_vectors: int,
+    **overrides: Any,
+) -> Dict[str, Any]:
+    """
+    Fill in parameters for `index_type` given the corpus size.
+
+    Falls back to a simpler type when there are too few vectors to train
+    the requested one; the returned "index_type" is what will be built.
+    """
+    index_type = (index_type or "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    params: Dict[str, Any] = {"index_type": index_type, "dim": int(dim)}
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = int(overrides.get("nlist") or _default_nlist(n_vectors))
+        if n_vectors < nlist:
+            logger.warning(f"{n_vectors} vectors cannot train {nlist} lists; using flat")
+            return {"index_type": "flat", "dim": int(dim)}
+        params["nlist"] = nlist
+        params["nprobe"] = int(overrides.get("nprobe") or min(nlist, max(1, nlist // 8)))
+
+    if index_type == "ivf_pq":
+        params["m"] = int(overrides.get("m") or _default_pq_m(dim))
+        nbits = int(overrides.get("nbits") or 8)
+        while nbits > 4 and n_vectors < (2 ** nbits) * _MIN_POINTS_PER_CENTROID:
+            nbits -= 1
+        if n_vectors < 2 ** nbits:
+            logger.warning(f"{n_vectors} vectors cannot train PQ codebooks; using ivf_flat")
+            params["index_type"] = "ivf_flat"
+            params.pop("m")
+        else:
+            params["nbits"] = nbits
+
+    if index_type == "hnsw":
+        params["hnsw_m"] = int(overrides.get("hnsw_m") or 32)
+        params["ef_construction"] = int(overrides.get("ef_construction") or 200)
+        params["ef_search"] = int(overrides.get("ef_search") or 64)
+
+    return params
+
+
+def make_index(params: Dict[str, Any]) -> faiss.Index:
+    """Create an empty (untrained) ID-mapped index from resolved params."""
+    dim = params["dim"]
+    index_type = params["index_type"]
+
+    if index_type == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif index_type == "ivf_flat":
+        base = faiss.IndexIVFFlat(
+            faiss.IndexFlatIP(dim), dim, params["nlist"], faiss.METRIC_INNER_PRODUCT
+        )
+    elif index_type == "ivf_pq":
+        base = faiss.IndexIVFPQ(
+            faiss.IndexFlatIP(dim),
+            dim,
+            params["nlist"],
+            params["m"],
+            params["nbits"],
+            faiss.METRIC_INNER_PRODUCT,
+        )
+    else:
+        base = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = params["ef_construction"]
+
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, params)
+    return index
+
+
+def build_index(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    **overrides: Any,
+) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """Create, train and fill an index; returns it with its params."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    params = resolve_params(index_type, vectors.shape[1], len(vectors), **overrides)
+    index = make_index(params)
+
+    if not index.is_trained:
+        index.train(vectors)
+        params["trained_on"] = int(len(vectors))
+
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+
+    return index, params
+
+
+def supports_remove(params: Dict[str, Any]) -> bool:
+    return params.get("index_type", "flat") != "hnsw"
+
+
+def apply_search_params(index: faiss.Index, params: Dict[str, Any]) -> None:
+    space = faiss.ParameterSpace()
+    if "nprobe" in params:
+        space.set_index_parameter(index, "nprobe", params["nprobe"])
+    if "ef_search" in params:
+        space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+
+def _meta_path(index_path: Path) -> Path:
+    return index_path.with_suffix(".json")
+
+
+def write_index_meta(
+    index_path: Path,
+    index: faiss.Index,
+    params: Dict[str, Any],
+    build_id: Optional[str] = None,
+) -> None:
+    meta = dict(params)
+    meta["ntotal"] = int(index.ntotal)
+    meta["built_at"] = datetime.utcnow().isoformat()
+    if build_id is not None:
+        meta["build_id"] = build_id
+
+    meta_path = _meta_path(Path(index_path))
+    tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def read_index_meta(index_path: Path) -> Optional[Dict[str, Any]]:
+    meta_path = _meta_path(Path(index_path))
+    if not meta_path.exists():
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(index_path: Path, mmap: bool = False) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Read whichever index type is on disk and apply its recorded search
+    parameters. Indexes written before metadata existed are treated as flat.
+
+    With `mmap`, the vectors are mapped read-only instead of copied into
+    the process, so several API workers share one copy through the page
+    cache. Such an index must not be modified.
+    """
+    if not Path(index_path).exists():
+        raise FileNotFoundError(f"No index at {index_path}")
+
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as error:
+            logger.warning(f"Cannot memory-map {index_path}, reading it instead: {error}")
+    if index is None:
+        index = faiss.read_index(str(index_path))
+    params = read_index_meta(Path(index_path)) or {"index_type": "flat", "dim": index.d}
+    apply_search_params(index, params)
+    return index, params
+
+
+def discover_subjects(embeddings_dir: Path = Path("embeddings")) -> List[str]:
+    """Subjects with a built index, i.e. every {subject}_index.faiss shard on disk."""
+    suffix = "_index.faiss"
+    return sorted(path.name[: -len(suffix)] for path in Path(embeddings_dir).glob(f"*{suffix}"))
+
+
+# Every file a subject's retrieval reads; rebuilding the subject rewrites them.
+SUBJECT_FILES = (
+    "{}_index.faiss", "{}_index.json", "{}_chunks.bin", "{}_chunks.pkl", "{}_lexical.npz",
+)
+
+
+def subject_signature(subject: str, embeddings_dir: Path = Path("embeddings")) -> Tuple:
+    """(mtime_ns, size) of each of the subject's files, None for a missing one."""
+    signature = []
+    for name in SUBJECT_FILES:
+        try:
+            stat = (Path(embeddings_dir) / name.format(subject)).stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
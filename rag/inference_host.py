@@ -0,0 +1,315 @@
+# rag/inference_host.py
+# One process that owns the embedder, reranker and subject indexes, serving
+# retrieval to API workers over a Unix socket. Each uvicorn worker then
+# stays small instead of loading its own copy of every model and index.
+#
+# Run the host next to the API:
+#   python -m rag.inference_host --socket /tmp/ai-tutor-inference.sock
+#   INFERENCE_HOST_SOCKET=/tmp/ai-tutor-inference.sock uvicorn api.app.main:app --workers 4
+#
+# Messages are a 4-byte big-endian length followed by UTF-8 JSON. Concurrent
+# requests from all workers reach the host's query encoder together, so
+# they share forward passes through its micro-batcher.
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import struct
+import threading
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_HOST_SOCKET = os.getenv("INFERENCE_HOST_SOCKET", "").strip()
+INFERENCE_HOST_TIMEOUT = float(os.getenv("INFERENCE_HOST_TIMEOUT", "30"))
+INFERENCE_HOST_POOL_SIZE = int(os.getenv("INFERENCE_HOST_POOL_SIZE", "16"))
+
+AUTO_SUBJECT = "auto"
+_MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+def _encode_message(payload: Dict[str, Any]) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > _MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {length} bytes exceeds the limit")
+    return json.loads(await reader.readexactly(length))
+
+
+def _pack_array(array: np.ndarray) -> Dict[str, Any]:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def _unpack_array(packed: Dict[str, Any]) -> np.ndarray:
+    data = base64.b64decode(packed["data"])
+    return np.frombuffer(data, dtype=np.float32).reshape(packed["shape"])
+
+
+# ----------------------------
+# Host
+# ----------------------------
+class InferenceHost:
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+
+    def _retrieve(self, subject: str, query: str, top_k: int, final_k: int):
+        if subject == AUTO_SUBJECT:
+            from rag.sharded_retriever import get_sharded_retriever
+
+            return get_sharded_retriever().retrieve_with_subject(query, top_k, final_k)
+
+        from rag.subject_retriever import get_subject_retriever
+
+        return (subject,) + tuple(
+            get_subject_retriever(subject).retrieve_with_embedding(query, top_k, final_k)
+        )
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from rag.worker_pool import RETRIEVAL_POOL
+
+        op = request.get("op")
+
+        if op == "ping":
+            return {}
+
+        if op == "retrieve":
+            subject, context, pages, sources, base_conf, embedding = await RETRIEVAL_POOL.run(
+                self._retrieve,
+                request["subject"],
+                request["query"],
+                int(request.get("top_k", 8)),
+                int(request.get("final_k", 3)),
+            )
+            return {
+                "subject": subject,
+                "context": context,
+                "pages": pages,
+                "sources": sources,
+                "base_conf": base_conf,
+                "embedding": _pack_array(embedding),
+            }
+
+        if op == "encode":
+            from rag.subject_retriever import encode_query
+
+            return {"embedding": _pack_array(await RETRIEVAL_POOL.run(encode_query, request["query"]))}
+
+        if op == "stats":
+            return {"stats": self.stats()}
+
+        raise ValueError(f"Unknown op '{op}'")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await _read_message(reader)
+                except asyncio.IncompleteReadError:
+                    return
+
+                self.requests += 1
+                try:
+                    response = {"ok": True, **await self._dispatch(request)}
+                except Exception as error:
+                    self.errors += 1
+                    logger.error(f"Inference request failed: {error}")
+                    response = {"ok": False, "error": str(error), "error_type": type(error).__name__}
+
+                writer.write(_encode_message(response))
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def warm_up(self) -> None:
+        """Load the embedder and every subject shard before accepting requests."""
+        from rag.sharded_retriever import get_sharded_retriever
+
+        start = perf_counter()
+        get_sharded_retriever().retrieve_with_subject("warm up")
+        logger.info(f"Inference host warmed up in {perf_counter() - start:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        import sys
+
+        from rag.worker_pool import RETRIEVAL_POOL
+
+        payload = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": self.connections,
+            "retrieval_pool": RETRIEVAL_POOL.stats(),
+        }
+        retriever_module = sys.modules.get("rag.subject_retriever")
+        if retriever_module is not None:
+            payload["query_encoder"] = retriever_module.QUERY_ENCODER.stats()
+            payload["retrieval_cache"] = retriever_module.RETRIEVAL_CACHE.stats()
+        return payload
+
+    async def serve(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Inference host listening on {self.socket_path}")
+
+        async with server:
+            await server.serve_forever()
+
+
+# ----------------------------
+# Client (used by API workers)
+# ----------------------------
+class InferenceHostError(RuntimeError):
+    pass
+
+
+class InferenceClient:
+    """
+    Async client with a small pool of persistent connections; one request
+    is in flight per connection at a time, and at most `pool_size`
+    requests are in flight per worker.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        pool_size: int = INFERENCE_HOST_POOL_SIZE,
+        timeout: float = INFERENCE_HOST_TIMEOUT,
+    ):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: List[tuple] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+        self.requests = 0
+        self.errors = 0
+        self.reconnects = 0
+        self._total_seconds = 0.0
+
+    async def _connect(self):
+        return await asyncio.open_unix_connection(self.socket_path)
+
+    async def _roundtrip(self, connection, payload: Dict[str, Any]) -> Dict[str, Any]:
+        reader, writer = connection
+        writer.write(_encode_message(payload))
+        await writer.drain()
+        return await _read_message(reader)
+
+    async def request(self, op: str, **payload: Any) -> Dict[str, Any]:
+        async with self._slots:
+            return await self._request({"op": op, **payload})
+
+    async def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        start = perf_counter()
+        self.requests += 1
+
+        connection = self._idle.pop() if self._idle else await self._connect()
+        try:
+            try:
+                response = await asyncio.wait_for(self._roundtrip(connection, message), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Stale pooled connection (e.g. the host restarted): retry once.
+                connection[1].close()
+                self.reconnects += 1
+                connection = await self._connect()
+                response = await asyncio.wait_for(self._roundtrip(connection, message), self.timeout)
+        except BaseException:
+            self.errors += 1
+            connection[1].close()
+            raise
+
+        self._idle.append(connection)
+        self._total_seconds += perf_counter() - start
+
+        if not response.get("ok"):
+            self.errors += 1
+            if response.get("error_type") == "FileNotFoundError":
+                raise FileNotFoundError(response.get("error"))
+            raise InferenceHostError(response.get("error", "Inference host error"))
+
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.socket_path,
+            "requests": self.requests,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "idle_connections": len(self._idle),
+            "avg_ms": round(self._total_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+        }
+
+
+class RemoteRetriever:
+    """Same async retrieval interface as SubjectRetriever / ShardedRetriever, served by the host."""
+
+    def __init__(self, client: InferenceClient, subject: str):
+        self.client = client
+        self.subject = subject
+
+    async def aretrieve_with_subject(self, query: str, top_k: int = 8, final_k: int = 3):
+        response = await self.client.request(
+            "retrieve", subject=self.subject, query=query, top_k=top_k, final_k=final_k
+        )
+        return (
+            response["subject"],
+            response["context"],
+            response["pages"],
+            response["sources"],
+            response["base_conf"],
+            _unpack_array(response["embedding"]),
+        )
+
+    async def aretrieve_with_embedding(self, query: str, top_k: int = 8, final_k: int = 3):
+        return (await self.aretrieve_with_subject(query, top_k, final_k))[1:]
+
+
+_CLIENT: Optional[InferenceClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_inference_client() -> Optional[InferenceClient]:
+    """The shared client when INFERENCE_HOST_SOCKET is set, otherwise None."""
+    global _CLIENT
+
+    if not INFERENCE_HOST_SOCKET:
+        return None
+
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = InferenceClient(INFERENCE_HOST_SOCKET)
+
+    return _CLIENT
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve embeddings and retrieval over a Unix socket")
+    parser.add_argument("--socket", default=INFERENCE_HOST_SOCKET or "/tmp/ai-tutor-inference.sock")
+    parser.add_argument("--no-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    host = InferenceHost(args.socket)
+    if not args.no_warm_up:
+        host.warm_up()
+    asyncio.run(host.serve())
@@ -0,0 +1,168 @@
+# rag/lexical_index.py
+# BM25 inverted index over a subject's chunks, used alongside the dense
+# FAISS search so exact terms ("perfect square trinomial", symbol names)
+# are not lost. Stored as CSR postings in one uncompressed .npz file.
+#
+# Build for existing chunk stores with:
+#   python -m rag.lexical_index physics math
+
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(
+        self,
+        terms: Sequence[str],
+        term_offsets: np.ndarray,
+        postings_rows: np.ndarray,
+        postings_tf: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.term_offsets = term_offsets
+        self.postings_rows = postings_rows
+        self.postings_tf = postings_tf.astype(np.float32)
+        self.doc_lengths = doc_lengths.astype(np.float32)
+        self.k1 = k1
+        self.b = b
+        # The index build this belongs to, when saved by one.
+        self.build_id: Optional[str] = None
+
+        self.n_docs = len(doc_lengths)
+        self.avg_length = float(self.doc_lengths.mean()) if self.n_docs else 0.0
+        self._term_ids: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+
+        doc_freq = np.diff(term_offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        # Per-document length normalization, folded in once at load time.
+        self._length_norm = self.k1 * (
+            1.0 - self.b + self.b * self.doc_lengths / max(self.avg_length, 1e-9)
+        )
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        counts = [Counter(tokenize(text)) for text in texts]
+        terms = sorted({term for count in counts for term in count})
+        term_ids = {term: i for i, term in enumerate(terms)}
+
+        postings: List[List[Tuple[int, int]]] = [[] for _ in terms]
+        for row, count in enumerate(counts):
+            for term, tf in count.items():
+                postings[term_ids[term]].append((row, tf))
+
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=term_offsets[1:])
+
+        postings_rows = np.fromiter(
+            (row for plist in postings for row, _ in plist), dtype=np.int32,
+            count=int(term_offsets[-1]),
+        )
+        postings_tf = np.fromiter(
+            (min(tf, 65535) for plist in postings for _, tf in plist), dtype=np.uint16,
+            count=int(term_offsets[-1]),
+        )
+        doc_lengths = np.array([sum(count.values()) for count in counts], dtype=np.int32)
+
+        return cls(terms, term_offsets, postings_rows, postings_tf, doc_lengths)
+
+    def save(self, path: Path, build_id: Optional[str] = None) -> None:
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        # Terms as one UTF-8 blob plus offsets: fixed-width string arrays
+        # balloon when a few extraction artifacts produce very long tokens.
+        encoded = [t.encode("utf-8") for t in sorted(self._term_ids, key=self._term_ids.get)]
+        term_text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in encoded], out=term_text_offsets[1:])
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                term_text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                term_text_offsets=term_text_offsets,
+                term_offsets=self.term_offsets,
+                postings_rows=self.postings_rows,
+                postings_tf=self.postings_tf.astype(np.uint16),
+                doc_lengths=self.doc_lengths.astype(np.int32),
+                build_id=np.array(build_id or ""),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        data = np.load(path, allow_pickle=False)
+        blob = data["term_text"].tobytes()
+        offsets = data["term_text_offsets"].tolist()
+        terms = [
+            blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)
+        ]
+        index = cls(
+            terms,
+            data["term_offsets"],
+            data["postings_rows"],
+            data["postings_tf"],
+            data["doc_lengths"],
+        )
+        if "build_id" in data.files:
+            index.build_id = str(data["build_id"]) or None
+        return index
+
+    def search(self, query: str, k: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k chunk rows and BM25 scores for `query`, best first."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched = False
+
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            matched = True
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            rows = self.postings_rows[start:end]
+            tf = self.postings_tf[start:end]
+            scores[rows] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[rows])
+
+        if not matched or self.n_docs == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Hashable]:
+    """
+    Merge ranked lists of rows (or any hashable keys, e.g. (subject, row));
+    each list contributes 1 / (k + rank).
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+if __name__ == "__main__":
+    from rag.chunk_store import ChunkStore
+
+    embeddings_dir = Path("embeddings")
+    for subject in sys.argv[1:] or ["physics", "math"]:
+        store = ChunkStore(embeddings_dir / f"{subject}_chunks.bin")
+        index = BM25Index.build([store.text(row) for row in range(len(store))])
+        index.save(embeddings_dir / f"{subject}_lexical.npz", build_id=store.build_id)
+        print(f"{subject}: {len(index._term_ids)} terms over {index.n_docs} chunks")
@@ -1,22 +1,35 @@
 # rag/memory.py - FIXED VERSION
 # Adds MongoDB persistence while keeping in-memory cache for performance
 
-from collections import deque
 from datetime import datetime
 import logging
 from typing import List, Dict, Any
 
+from bson import ObjectId
+
+from rag.history_cache import InProcessHistoryBackend, get_history_backend
+
 logger = logging.getLogger(__name__)
 
-# In-memory cache for quick access
 MAX_HISTORY = 6  # 3 turns (Q/A pairs)
-_memory_cache: Dict[str, deque] = {}
 
 # MongoDB collections will be injected at startup
 _db = None
 _conversation_collection = None
 
 
+# In-process by default; HISTORY_CACHE_BACKEND=redis shares it across workers,
+# along with the turns from remember_turn still queued for MongoDB.
+HISTORY_CACHE = get_history_backend(MAX_HISTORY)
+
+
+def _local_cache():
+    """The in-process HistoryCache for the sync helpers, or None with a shared backend."""
+    if isinstance(HISTORY_CACHE, InProcessHistoryBackend):
+        return HISTORY_CACHE.cache
+    return None
+
+
 def initialize_db(db):
     """
     Initialize MongoDB connection.
@@ -39,10 +52,8 @@ def get_history_sync(user_id: str) -> List[Dict[str, Any]]:
     Returns:
         List of conversation entries
     """
-    if user_id not in _memory_cache:
-        _memory_cache[user_id] = deque(maxlen=MAX_HISTORY)
-    
-    return list(_memory_cache[user_id])
+    cache = _local_cache()
+    return (cache.get(user_id) if cache is not None else None) or []
 
 
 async def get_history(user_id: str) -> List[Dict[str, Any]]:
@@ -56,31 +67,52 @@ async def get_history(user_id: str) -> List[Dict[str, Any]]:
     Returns:
         List of dicts with "question", "answer", "created_at" keys
     """
-    # Return from memory cache if available
-    if user_id in _memory_cache and len(_memory_cache[user_id]) > 0:
-        return list(_memory_cache[user_id])
+    # Return from memory cache if available (an empty list is a valid hit)
+    cached = await HISTORY_CACHE.get(user_id)
+    if cached is not None:
+        return cached
     
-    # Fetch from MongoDB if no memory cache
+    # Fetch from MongoDB on a miss
     if _conversation_collection is None:
         logger.warning("MongoDB not initialized, returning empty history")
         return []
     
     try:
-        docs = await _conversation_collection.find(
-            {"user_id": user_id}
-        ).sort("created_at", -1).limit(MAX_HISTORY).to_list(MAX_HISTORY)
-        
-        # Store in memory cache
-        _memory_cache[user_id] = deque(docs, maxlen=MAX_HISTORY)
+        docs = await _load_history(user_id)
+
+        # Not stored if a newer turn was cached while this read was in flight.
+        await HISTORY_CACHE.put(user_id, docs)
         
-        # Reverse to get chronological order (oldest first)
-        return list(reversed(docs))
+        return docs
         
     except Exception as e:
         logger.error(f"Failed to fetch history from MongoDB for {user_id}: {e}")
         return []
 
 
+async def _load_history(user_id: str) -> List[Dict[str, Any]]:
+    """
+    The newest MAX_HISTORY turns from MongoDB plus any still queued for it,
+    in chronological order (oldest first), which is also how the cache
+    stores them so later appends land at the end.
+    """
+    docs = await _conversation_collection.find(
+        {"user_id": user_id},
+        {"_id": 1, "question": 1, "answer": 1, "created_at": 1},
+    ).sort("created_at", -1).limit(MAX_HISTORY).to_list(MAX_HISTORY)
+
+    # A pending turn may have been written since; keep one copy of it.
+    stored = {str(doc.pop("_id")) for doc in docs}
+    docs.extend(
+        {key: turn.get(key) for key in ("question", "answer", "created_at")}
+        for turn in await HISTORY_CACHE.pending(user_id)
+        if turn["_id"] not in stored
+    )
+
+    docs.sort(key=lambda doc: doc.get("created_at") or datetime.min)
+    return docs[-MAX_HISTORY:]
+
+
 async def add_to_history(
     user_id: str,
     question: str,
@@ -113,15 +145,67 @@ async def add_to_history(
             logger.error(f"Failed to save conversation to MongoDB: {e}")
             return False
     
-    # Update memory cache
-    if user_id not in _memory_cache:
-        _memory_cache[user_id] = deque(maxlen=MAX_HISTORY)
-    
-    _memory_cache[user_id].append(entry)
+    # Update memory cache; without MongoDB the cache is the only copy
+    if not await HISTORY_CACHE.append(user_id, entry, create=_conversation_collection is None):
+        # Not cached: load it now, turn included, so that a reload that
+        # started before the insert cannot cache history without it.
+        await get_history(user_id)
     
     return True
 
 
+def conversation_collection():
+    """The MongoDB collection turns are persisted to, or None before initialize_db."""
+    return _conversation_collection
+
+
+async def remember_turn(user_id: str, question: str, answer: str) -> Dict[str, Any]:
+    """
+    Add a turn to the history cache now and return its conversations
+    document, for the caller to persist (e.g. through a write-behind queue).
+
+    Until the caller reports it with turn_stored or forget_turn, the turn
+    is pending: history reloaded from MongoDB in the meantime, by any
+    worker sharing the cache backend, includes it.
+    """
+    entry = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "question": question.strip(),
+        "answer": answer.strip(),
+        "created_at": datetime.utcnow()
+    }
+
+    if _conversation_collection is None:
+        # Without MongoDB the cache is the only copy.
+        await HISTORY_CACHE.append(user_id, entry, create=True)
+        return entry
+
+    await HISTORY_CACHE.add_pending(user_id, entry)
+
+    if not await HISTORY_CACHE.append(user_id, entry):
+        # Not cached: cache the stored turns plus the pending ones, this
+        # one included, so the next question in the chat sees it.
+        try:
+            await HISTORY_CACHE.put(user_id, await _load_history(user_id))
+        except Exception as e:
+            logger.error(f"Failed to fetch history from MongoDB for {user_id}: {e}")
+
+    return entry
+
+
+async def turn_stored(user_id: str, entry: Dict[str, Any]) -> None:
+    """A turn from remember_turn is now in MongoDB."""
+    await HISTORY_CACHE.drop_pending(user_id, entry)
+
+
+async def forget_turn(user_id: str, entry: Dict[str, Any]) -> None:
+    """A turn from remember_turn could not be stored; drop it from memory."""
+    await HISTORY_CACHE.drop_pending(user_id, entry)
+    # The cached turn would otherwise outlive the one that was not stored.
+    await HISTORY_CACHE.invalidate(user_id)
+
+
 async def clear_history(user_id: str) -> bool:
     """
     Clear all conversation history for a user.
@@ -133,14 +217,15 @@ async def clear_history(user_id: str) -> bool:
         True if successful
     """
     # Clear memory
-    if user_id in _memory_cache:
-        _memory_cache[user_id].clear()
+    await HISTORY_CACHE.invalidate(user_id)
     
     # Clear MongoDB
     if _conversation_collection is not None:
         try:
             result = await _conversation_collection.delete_many({"user_id": user_id})
             logger.info(f"Cleared {result.deleted_count} conversation entries for {user_id}")
+            # Another worker may have reloaded the old turns in between.
+            await HISTORY_CACHE.invalidate(user_id)
             return True
         except Exception as e:
             logger.error(f"Failed to clear history from MongoDB: {e}")
@@ -209,11 +294,13 @@ def add_to_history_legacy(user_id: str, question: str, answer: str):
     """
     logger.warning("add_to_history_legacy() is deprecated, use async add_to_history()")
     
-    if user_id not in _memory_cache:
-        _memory_cache[user_id] = deque(maxlen=MAX_HISTORY)
-    
-    _memory_cache[user_id].append({
+    cache = _local_cache()
+    if cache is None:
+        logger.warning("add_to_history_legacy() needs the in-process history cache")
+        return
+
+    cache.append(user_id, {
         "question": question,
         "answer": answer,
         "created_at": datetime.utcnow()
-    })
+    }, create=True)
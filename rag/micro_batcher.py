@@ -0,0 +1,125 @@
+# rag/micro_batcher.py
+# Collects single-item requests from many threads into one batched call.
+
+import logging
+import threading
+from concurrent.futures import Future
+from time import monotonic
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Groups items submitted within `window_ms` (up to `max_batch_size`) and
+    passes them to `batch_fn` in one call.
+
+    `batch_fn` takes a list of items and returns a sequence of results in
+    the same order; each caller's future resolves with its own result.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        name: str = "micro-batcher",
+    ):
+        self.batch_fn = batch_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.name = name
+
+        self._pending: List[Tuple[Any, Future]] = []
+        self._cond = threading.Condition()
+        self._worker: threading.Thread | None = None
+
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._cancelled = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run,
+                name=self.name,
+                daemon=True,
+            )
+            self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a future for its result."""
+        future: Future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item: Any, timeout: float | None = None) -> Any:
+        """Submit one item and block until its result is ready."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _next_batch(self) -> List[Tuple[Any, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # The first item opens the window; wait for more until it closes
+            # or the batch is full.
+            deadline = monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+
+        # Callers that gave up cancel their futures; skip those items.
+        # Marking the rest running means they can no longer be cancelled.
+        live = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        self._cancelled += len(batch) - len(live)
+        return live
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results "
+                        f"for {len(batch)} items"
+                    )
+            except Exception as error:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {error}")
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            self._batches += 1
+            self._items += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000, 2),
+            "max_batch_size": self.max_batch_size,
+            "pending": len(self._pending),
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "cancelled": self._cancelled,
+        }
@@ -0,0 +1,186 @@
+# rag/onnx_embedder.py
+# Optional ONNX Runtime path for the MiniLM embedder, with dynamic int8
+# quantization. Drop-in for the SentenceTransformer.encode calls made on
+# the query path; enable with EMBEDDER_BACKEND=onnx.
+#
+# Export (needs torch, transformers, onnx and onnxruntime):
+#   python -m rag.onnx_embedder export
+# Then check retrieval parity against the fp32 model:
+#   python -m benchmarks.embedder_parity
+
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", "embeddings/onnx-minilm"))
+ONNX_MODEL_FILE = "model.int8.onnx"
+# all-MiniLM-L6-v2 was trained with 256-token inputs.
+MAX_SEQ_LENGTH = 256
+
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch").strip().lower()
+
+
+def _default_threads() -> int:
+    # Few threads per process: uvicorn workers and the retrieval pool
+    # already run several encodes side by side.
+    return min(4, os.cpu_count() or 1)
+
+
+EMBEDDER_THREADS = int(os.getenv("EMBEDDER_THREADS", _default_threads()))
+
+
+def export_onnx(model_name: str = MODEL_PATH, output_dir: Path = ONNX_MODEL_DIR) -> Path:
+    """Export the transformer to ONNX and write a dynamically int8-quantized copy."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["query: example"], return_tensors="pt")
+    fp32_path = output_dir / "model.onnx"
+    dynamic = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "last_hidden_state": dynamic,
+            },
+            opset_version=14,
+        )
+
+    int8_path = output_dir / ONNX_MODEL_FILE
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+    logger.info(
+        f"Exported {model_name}: fp32 {fp32_path.stat().st_size / 2**20:.1f}MB, "
+        f"int8 {int8_path.stat().st_size / 2**20:.1f}MB"
+    )
+    return int8_path
+
+
+class OnnxEmbedder:
+    """
+    Mean-pooled, L2-normalized sentence embeddings from an ONNX Runtime
+    session, matching SentenceTransformer's output for this model.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path = ONNX_MODEL_DIR,
+        model_file: str = ONNX_MODEL_FILE,
+        threads: int = EMBEDDER_THREADS,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = Path(model_dir) / model_file
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"No ONNX model at {model_path}; run `python -m rag.onnx_embedder export`"
+            )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = int(self.session.get_outputs()[0].shape[-1])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        feeds = {
+            name: tokens[name].astype(np.int64) for name in self._input_names if name in tokens
+        }
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = tokens["attention_mask"][..., np.newaxis].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (pooled / norms).astype(np.float32)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Same call shape as SentenceTransformer.encode; always returns numpy."""
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+
+        if not texts:
+            return np.zeros((0, self._dim), dtype=np.float32)
+
+        parts = [
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+        embeddings = np.concatenate(parts)
+        return embeddings[0] if single else embeddings
+
+
+def load_embedder(model_name: str = MODEL_PATH, backend: str = EMBEDDER_BACKEND):
+    """
+    The query embedder for `backend` ("torch" or "onnx"). Falls back to the
+    PyTorch model when the ONNX export or runtime is not available.
+    """
+    if backend == "onnx":
+        try:
+            embedder = OnnxEmbedder()
+            logger.info(f"Using ONNX int8 embedder ({EMBEDDER_THREADS} threads)")
+            return embedder
+        except (ImportError, FileNotFoundError) as error:
+            logger.warning(f"ONNX embedder unavailable, using PyTorch: {error}")
+
+    from sentence_transformers import SentenceTransformer
+
+    if os.getenv("EMBEDDER_THREADS"):
+        import torch
+
+        torch.set_num_threads(EMBEDDER_THREADS)
+
+    return SentenceTransformer(model_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX int8 export of the MiniLM embedder")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output-dir", default=str(ONNX_MODEL_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(export_onnx(args.model, Path(args.output_dir)))
@@ -0,0 +1,266 @@
+# rag/prompt_budget.py
+# Token-budgeted prompt assembly. Conversation history and retrieved
+# context each get a share of the prompt budget; the question and the
+# template itself are never cut.
+#
+# - Conversation: the newest turns are kept whole; older turns are
+#   compressed to the question plus the opening of the tutor's answer,
+#   and the oldest are dropped once even that does not fit.
+# - Context: retrieved chunks arrive one per line in rank order; the
+#   lowest-ranked whole chunks are dropped, never part of one. Follow-up
+#   modes get their practice set untouched, since they must cover every
+#   problem in it.
+#
+# Tokens are counted with tiktoken (cl100k_base), which is close to, but not
+# exactly, Gemini's tokenizer. If the encoding cannot be loaded (e.g. offline
+# with no cached BPE file), a 4-characters-per-token estimate is used instead.
+
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag.prompt_templates import build_tutor_prompt
+
+logger = logging.getLogger(__name__)
+
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "800"))
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1800"))
+# Older turns keep this much of the tutor's answer.
+PROMPT_OLD_ANSWER_TOKENS = int(os.getenv("PROMPT_OLD_ANSWER_TOKENS", "60"))
+# Turns (newest first) that are never compressed if they fit.
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "1"))
+
+# Prompts that must see their whole context ("List EVERY problem ...").
+FULL_CONTEXT_MODES = frozenset({"followup_answers", "detailed_solver"})
+
+_CHARS_PER_TOKEN = 4
+_TRUNCATION_MARK = " …"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as error:
+                    logger.warning(f"tiktoken unavailable, estimating tokens from length: {error}")
+                    _encoding_failed = True
+
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The first `max_tokens` tokens of `text`, cut back to a line or word break."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _get_encoding()
+    if encoding is None:
+        head = text[: max_tokens * _CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    # Prefer ending on a line, then a word, if that keeps most of the text.
+    for separator in ("\n", " "):
+        cut = head.rfind(separator)
+        if cut > len(head) * 0.6:
+            return head[:cut].rstrip()
+    return head
+
+
+# ----------------------------
+# Conversation history
+# ----------------------------
+_TURN_START = re.compile(r"^Student: ", re.MULTILINE)
+
+
+def _split_turns(conversation_context: str) -> List[Tuple[str, str]]:
+    """"Student: ...\nTutor: ..." text (oldest first) as (question, answer) pairs."""
+    starts = [m.start() for m in _TURN_START.finditer(conversation_context)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+
+    turns = []
+    for start, end in zip(starts, starts[1:] + [len(conversation_context)]):
+        block = conversation_context[start:end].strip()
+        question, _, answer = block.partition("\nTutor: ")
+        if question.startswith("Student: "):
+            question = question[len("Student: "):]
+        turns.append((question.strip(), answer.strip()))
+    return turns
+
+
+def _format_turn(question: str, answer: str) -> str:
+    lines = []
+    if question:
+        lines.append(f"Student: {question}")
+    if answer:
+        lines.append(f"Tutor: {answer}")
+    return "\n".join(lines)
+
+
+def fit_conversation(conversation_context: str, max_tokens: int) -> str:
+    """Newest turns whole, older turns compressed, oldest dropped, within `max_tokens`."""
+    if count_tokens(conversation_context) <= max_tokens:
+        return conversation_context
+
+    kept: List[str] = []
+    used = 0
+    for age, (question, answer) in enumerate(reversed(_split_turns(conversation_context))):
+        turn = _format_turn(question, answer)
+        tokens = count_tokens(turn) + 1
+
+        if age >= PROMPT_RECENT_TURNS or used + tokens > max_tokens:
+            # Recent turns that are too long keep up to half the budget,
+            # leaving room for compressed older turns.
+            answer_budget = (
+                PROMPT_OLD_ANSWER_TOKENS if age >= PROMPT_RECENT_TURNS
+                else max(PROMPT_OLD_ANSWER_TOKENS, (max_tokens - used) // 2)
+            )
+            short_answer = truncate_tokens(answer, answer_budget)
+            if short_answer != answer:
+                short_answer += _TRUNCATION_MARK
+            turn = _format_turn(question, short_answer)
+            tokens = count_tokens(turn) + 1
+
+        if used + tokens > max_tokens:
+            if not kept:
+                # Even the latest turn is too long on its own: keep its head.
+                kept.append(truncate_tokens(turn, max_tokens))
+            break
+
+        kept.append(turn)
+        used += tokens
+
+    return "\n".join(reversed(kept))
+
+
+def fit_context(context: str, max_tokens: int) -> str:
+    """
+    Whole chunks, best-ranked first, while they fit in `max_tokens`.
+
+    The chunker collapses whitespace, so each retrieved chunk is one line
+    of the context. The top chunk is kept even if it alone is over budget.
+    """
+    if count_tokens(context) <= max_tokens:
+        return context
+
+    kept: List[str] = []
+    used = 0
+    for chunk in context.split("\n"):
+        tokens = count_tokens(chunk) + 1
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(chunk)
+        used += tokens
+
+    return "\n".join(kept)
+
+
+# ----------------------------
+# Assembly + reporting
+# ----------------------------
+@dataclass
+class PromptUsage:
+    prompt_tokens: int
+    tokens_saved: int
+    history_tokens: int
+    context_tokens: int
+
+
+class PromptBudgetStats:
+    def __init__(self):
+        self.prompts = 0
+        self.trimmed = 0
+        self.prompt_tokens = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage: PromptUsage) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.tokens_saved += usage.tokens_saved
+            if usage.tokens_saved:
+                self.trimmed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompts": self.prompts,
+            "trimmed": self.trimmed,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.tokens_saved,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.prompts, 1) if self.prompts else 0.0,
+            "history_budget": PROMPT_HISTORY_TOKENS,
+            "context_budget": PROMPT_CONTEXT_TOKENS,
+            "tokenizer": "estimate" if _encoding_failed else "cl100k_base",
+        }
+
+
+PROMPT_STATS = PromptBudgetStats()
+
+
+def assemble_prompt(
+    context: str,
+    question: str,
+    student_level: str = "intermediate",
+    conversation_context: str = "",
+    mode: str = "concept",
+    history_tokens: Optional[int] = None,
+    context_tokens: Optional[int] = None,
+) -> Tuple[str, PromptUsage]:
+    """
+    build_tutor_prompt with conversation and context fitted to their
+    budgets. Returns the prompt and how many tokens trimming saved.
+    """
+    history_budget = PROMPT_HISTORY_TOKENS if history_tokens is None else history_tokens
+    context_budget = PROMPT_CONTEXT_TOKENS if context_tokens is None else context_tokens
+
+    fitted_conversation = fit_conversation(conversation_context, history_budget)
+    if mode in FULL_CONTEXT_MODES:
+        fitted_context = context
+    else:
+        fitted_context = fit_context(context, context_budget)
+
+    prompt = build_tutor_prompt(
+        fitted_context, question, student_level, fitted_conversation, mode=mode
+    )
+
+    saved = 0
+    if fitted_conversation != conversation_context or fitted_context != context:
+        untrimmed = build_tutor_prompt(
+            context, question, student_level, conversation_context, mode=mode
+        )
+        saved = max(0, count_tokens(untrimmed) - count_tokens(prompt))
+
+    usage = PromptUsage(
+        prompt_tokens=count_tokens(prompt),
+        tokens_saved=saved,
+        history_tokens=count_tokens(fitted_conversation),
+        context_tokens=count_tokens(fitted_context),
+    )
+    PROMPT_STATS.record(usage)
+    return prompt, usage
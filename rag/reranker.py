@@ -1,14 +1,169 @@
-from sentence_transformers import CrossEncoder
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import wait
+from time import perf_counter
+from typing import List, Optional, Sequence, Tuple
 
-# Load once at startup
-reranker_model = CrossEncoder(
-    "cross-encoder/ms-marco-MiniLM-L-6-v2"
+import numpy as np
+
+from rag.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_BATCH_WINDOW_MS = float(os.getenv("RERANK_BATCH_WINDOW_MS", "5"))
+RERANK_BATCH_MAX_SIZE = int(os.getenv("RERANK_BATCH_MAX_SIZE", "64"))
+
+# Loaded on first use rather than at import.
+_reranker_model = None
+_model_lock = threading.Lock()
+
+
+def _get_model():
+    global _reranker_model
+
+    if _reranker_model is None:
+        with _model_lock:
+            if _reranker_model is None:
+                from sentence_transformers import CrossEncoder
+
+                logger.info(f"Loading reranker {RERANKER_MODEL}...")
+                _reranker_model = CrossEncoder(RERANKER_MODEL)
+
+    return _reranker_model
+
+
+def _score_batch(pairs: List[Tuple[str, str]]) -> Sequence[float]:
+    scores = _get_model().predict(pairs, batch_size=len(pairs))
+    return [float(score) for score in scores]
+
+
+# (query, passage) pairs from concurrent requests share one forward pass.
+PAIR_SCORER = MicroBatcher(
+    _score_batch,
+    window_ms=RERANK_BATCH_WINDOW_MS,
+    max_batch_size=RERANK_BATCH_MAX_SIZE,
+    name="reranker",
 )
 
+
+class RerankStats:
+    """Rolling latency and score distribution for the rerank stage."""
+
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.reranked = 0
+        self.fallbacks = {"disabled": 0, "over_budget": 0, "error": 0}
+        self._latencies = deque(maxlen=window)
+        self._scores = deque(maxlen=window * 8)
+        self._lock = threading.Lock()
+
+    def call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def record(self, latency: float, scores: Sequence[float]) -> None:
+        with self._lock:
+            self.reranked += 1
+            self._latencies.append(latency)
+            self._scores.extend(scores)
+
+    def fallback(self, reason: str) -> None:
+        with self._lock:
+            self.fallbacks[reason] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            scores = np.array(self._scores)
+            counts = {
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "fallbacks": dict(self.fallbacks),
+            }
+
+        payload = {
+            "enabled": RERANK_ENABLED,
+            "budget_ms": RERANK_BUDGET_MS,
+            "model_loaded": _reranker_model is not None,
+            **counts,
+            "batching": PAIR_SCORER.stats(),
+        }
+        if len(latencies):
+            payload["latency_ms"] = {
+                "avg": round(float(latencies.mean()), 2),
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+            }
+        if len(scores):
+            counts, edges = np.histogram(scores, bins=10)
+            payload["scores"] = {
+                "min": round(float(scores.min()), 3),
+                "mean": round(float(scores.mean()), 3),
+                "max": round(float(scores.max()), 3),
+                "histogram": {
+                    f"{edges[i]:.2f}..{edges[i + 1]:.2f}": int(counts[i])
+                    for i in range(len(counts))
+                },
+            }
+        return payload
+
+
+RERANK_STATS = RerankStats()
+
+
+def rerank_order(
+    query: str,
+    candidate_texts: Sequence[str],
+    budget_ms: float = RERANK_BUDGET_MS,
+) -> Optional[List[int]]:
+    """
+    Candidate positions sorted by cross-encoder score, best first.
+
+    Returns None, meaning "keep the FAISS order", when reranking is
+    disabled, fails, or does not finish within `budget_ms` (including the
+    first call, which triggers the lazy model load in the background).
+    """
+    RERANK_STATS.call()
+
+    if not RERANK_ENABLED:
+        RERANK_STATS.fallback("disabled")
+        return None
+    if not candidate_texts:
+        return []
+
+    start = perf_counter()
+    futures = [PAIR_SCORER.submit((query, text)) for text in candidate_texts]
+    _, pending = wait(futures, timeout=budget_ms / 1000.0)
+
+    if pending:
+        # Drop the pairs nobody is waiting for, or they pile up in the
+        # batcher and push later calls over budget too.
+        for future in pending:
+            future.cancel()
+        RERANK_STATS.fallback("over_budget")
+        return None
+
+    try:
+        scores = [future.result() for future in futures]
+    except Exception as error:
+        logger.error(f"Rerank failed, keeping FAISS order: {error}")
+        RERANK_STATS.fallback("error")
+        return None
+
+    RERANK_STATS.record(perf_counter() - start, scores)
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+
 def rerank(query, candidate_chunks, top_n=3):
     pairs = [(query, chunk) for chunk in candidate_chunks]
 
-    scores = reranker_model.predict(pairs)
+    scores = _get_model().predict(pairs)
 
     # Sort by score descending
     ranked = sorted(
@@ -0,0 +1,166 @@
+# rag/sharded_retriever.py
+# Cross-subject retrieval: every {subject}_index.faiss in embeddings/ is a
+# shard. The query is encoded once, the embedding fans out to all shards
+# concurrently, and the per-shard hits are merged by score. Adding a book
+# means building its subject index; no code changes are needed.
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from rag.index_factory import discover_subjects
+from rag.lexical_index import reciprocal_rank_fusion
+from rag.subject_retriever import (
+    EMBEDDINGS_DIR,
+    RETRIEVAL_CACHE,
+    IndexSnapshot,
+    SubjectRetriever,
+    encode_query,
+    get_subject_retriever,
+    normalize_query,
+    pack_result,
+    rank_chunks,
+)
+from rag.worker_pool import RETRIEVAL_POOL
+
+logger = logging.getLogger(__name__)
+
+AUTO_SUBJECT = "auto"
+
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))
+
+# Separate from RETRIEVAL_POOL: fan-out happens from inside a pool thread.
+_SHARD_EXECUTOR = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard")
+
+
+class ShardedRetriever:
+    """
+    Searches all subject shards for one query.
+
+    Dense hits are merged globally by inner-product score (all shards use
+    the same normalized embedder, so scores are comparable). BM25 hits are
+    only taken from shards that placed a hit in that dense top-k, then
+    fused in with reciprocal rank fusion, as SubjectRetriever does.
+    """
+
+    def __init__(self, subjects: List[str] = None):
+        self._fixed_subjects = subjects
+        self._dir_signature = None
+        self._lock = threading.Lock()
+        self.shards: Dict[str, SubjectRetriever] = {}
+        self.refresh()
+
+    def _current_dir_signature(self):
+        try:
+            return EMBEDDINGS_DIR.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> bool:
+        """Pick up shards added or removed since the last call; True if the set changed."""
+        if self._fixed_subjects is None and self._current_dir_signature() == self._dir_signature:
+            return False
+
+        with self._lock:
+            self._dir_signature = self._current_dir_signature()
+            subjects = self._fixed_subjects or discover_subjects(EMBEDDINGS_DIR)
+
+            shards = {}
+            for subject in subjects:
+                try:
+                    shards[subject] = get_subject_retriever(subject)
+                except FileNotFoundError:
+                    logger.warning(f"Shard '{subject}' is incomplete, skipping")
+
+            changed = set(shards) != set(self.shards)
+            if changed:
+                logger.info(f"Retrieval shards: {sorted(shards)}")
+            self.shards = shards
+            return changed
+
+    def retrieve_with_embedding(self, query: str, top_k: int = 8, final_k: int = 3):
+        return self.retrieve_with_subject(query, top_k, final_k)[1:]
+
+    def retrieve_with_subject(self, query: str, top_k: int = 8, final_k: int = 3):
+        """
+        Returns (subject, context, pages, sources, base_conf, query_embedding),
+        where subject is the shard of the best final chunk (None if nothing matched).
+        """
+        changed = self.refresh()
+        shards = self.shards
+        for shard in shards.values():
+            changed = shard._reload_if_changed() or changed
+
+        # One consistent build per shard for the whole search.
+        snapshots = {subject: shard.snapshot for subject, shard in shards.items()}
+        signature = tuple((subject, snapshots[subject].signature) for subject in sorted(snapshots))
+        if changed:
+            RETRIEVAL_CACHE.invalidate_subject(AUTO_SUBJECT, signature)
+
+        key = (AUTO_SUBJECT, normalize_query(query), top_k, final_k)
+        cached = RETRIEVAL_CACHE.get(key, signature)
+        if cached is not None:
+            return cached
+
+        result = self._search(snapshots, query, top_k, final_k)
+        RETRIEVAL_CACHE.put(key, signature, result)
+        return result
+
+    def _search(self, snapshots: Dict[str, IndexSnapshot], query: str, top_k: int, final_k: int):
+        query_embedding = encode_query(query)
+
+        dense_futures = {
+            subject: _SHARD_EXECUTOR.submit(snapshot.dense_candidates, query_embedding, top_k)
+            for subject, snapshot in snapshots.items()
+        }
+
+        hits: List[Tuple[float, str, int]] = []
+        for subject, future in dense_futures.items():
+            try:
+                hits.extend((score, subject, row) for row, score in future.result())
+            except Exception as error:
+                logger.error(f"Shard '{subject}' search failed: {error}")
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        hits = hits[:top_k]
+        keys = [(subject, row) for _, subject, row in hits]
+
+        lexical_futures = {
+            subject: _SHARD_EXECUTOR.submit(snapshots[subject].lexical_rows, query, top_k)
+            for subject in {subject for subject, _ in keys}
+            if snapshots[subject].lexical is not None
+        }
+        if lexical_futures:
+            lexical = reciprocal_rank_fusion([
+                [(subject, row) for row in future.result()]
+                for subject, future in lexical_futures.items()
+            ])
+            keys = reciprocal_rank_fusion([keys, lexical])[:top_k]
+
+        candidates = [dict(snapshots[subject].chunks[row], subject=subject) for subject, row in keys]
+        final_chunks = rank_chunks(query, candidates, final_k)
+
+        subject = final_chunks[0]["subject"] if final_chunks else None
+        base_conf = hits[0][0] if hits else 0.0
+
+        return (subject,) + pack_result(final_chunks, base_conf, query_embedding)
+
+    async def aretrieve_with_subject(self, query: str, top_k: int = 8, final_k: int = 3):
+        return await RETRIEVAL_POOL.run(self.retrieve_with_subject, query, top_k, final_k)
+
+
+_SHARDED = None
+_SHARDED_LOCK = threading.Lock()
+
+
+def get_sharded_retriever() -> ShardedRetriever:
+    global _SHARDED
+
+    if _SHARDED is None:
+        with _SHARDED_LOCK:
+            if _SHARDED is None:
+                _SHARDED = ShardedRetriever()
+
+    return _SHARDED
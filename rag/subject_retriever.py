@@ -1,50 +1,368 @@
+import logging
+import os
 import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from rag.chunk_store import ChunkStore
+from rag.index_factory import load_index, subject_signature
+from rag.lexical_index import BM25Index, reciprocal_rank_fusion
+from rag.micro_batcher import MicroBatcher
+from rag.onnx_embedder import load_embedder
+from rag.reranker import rerank_order
+from rag.worker_pool import RETRIEVAL_POOL
+
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDINGS_DIR = Path("embeddings")
-EMBEDDER = SentenceTransformer(MODEL_PATH)
+# Loaded on first use (or by the startup warm-up), not at import.
+# PyTorch by default; EMBEDDER_BACKEND=onnx serves the int8 ONNX export.
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                logger.info(f"Loading embedder {MODEL_PATH}...")
+                _embedder = load_embedder(MODEL_PATH)
+
+    return _embedder
+
+
+def is_embedder_loaded() -> bool:
+    return _embedder is not None
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") == "1"
+
+# Map indexes read-only so uvicorn workers on one host share their pages.
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0") == "1"
+
+# A build swaps its files in one at a time; how long to wait for a
+# consistent set before giving up on a load.
+INDEX_LOAD_ATTEMPTS = int(os.getenv("INDEX_LOAD_ATTEMPTS", "20"))
+INDEX_LOAD_RETRY_SECONDS = float(os.getenv("INDEX_LOAD_RETRY_SECONDS", "0.05"))
+
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+
+
+def _encode_query_batch(queries):
+    embeddings = get_embedder().encode(
+        [f"query: {query}" for query in queries],
+        convert_to_numpy=True,
+        batch_size=len(queries),
+    )
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+# Concurrent /ask requests share one forward pass instead of one each.
+QUERY_ENCODER = MicroBatcher(
+    _encode_query_batch,
+    window_ms=QUERY_BATCH_WINDOW_MS,
+    max_batch_size=QUERY_BATCH_MAX_SIZE,
+    name="query-encoder",
+)
+
+
+def encode_query(query: str) -> np.ndarray:
+    """Return the normalized (1, dim) embedding for a single query."""
+    return QUERY_ENCODER(query)[np.newaxis, :]
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class RetrievalCache:
+    """
+    Size-bounded LRU of retrieval results.
+
+    Keys are (subject, normalized_query, top_k, final_k); values are the
+    full retrieve_with_embedding result, so a hit skips both the query
+    encode and the index search. Each result is stored with the signature
+    of the index build it came from, and only served for that build.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key, signature):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, signature, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            # A search that started before a reload finished after it.
+            current = self._signatures.get(key[0])
+            if current is not None and current != signature:
+                self.stale_puts += 1
+                return
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_subject(self, subject: str, signature=None) -> None:
+        """Drop the subject's results; `signature` is the build now being served."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == subject]:
+                del self._entries[key]
+            self._signatures[subject] = signature
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
+
+
+RETRIEVAL_CACHE = RetrievalCache(int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")))
+
+
+def rank_chunks(query: str, candidates, final_k: int):
+    """Optional cross-encoder pass over the candidates; None keeps their order."""
+    order = rerank_order(query, [chunk["text"] for chunk in candidates])
+    if order is not None:
+        candidates = [candidates[i] for i in order]
+    return candidates[:final_k]
+
+
+def pack_result(final_chunks, base_conf: float, query_embedding: np.ndarray):
+    """The (context, pages, sources, base_conf, query_embedding) tuple callers expect."""
+    if not final_chunks:
+        return "", [], [], 0.0, query_embedding
+
+    context = "\n".join(chunk["text"] for chunk in final_chunks)
+    pages = list({chunk.get("page", 0) for chunk in final_chunks})
+    sources = list({chunk.get("source", "unknown") for chunk in final_chunks})
+
+    return context, pages, sources, float(base_conf), query_embedding
+
+
+# BM25 runs here while the calling thread does the dense search.
+_LEXICAL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lexical")
+
+
+class IndexBuildInProgress(RuntimeError):
+    """A subject's files on disk belong to more than one index build."""
+
+
+class IndexSnapshot:
+    """
+    One loaded build of a subject: FAISS index, BM25 index and chunks.
+
+    Never modified once built. A reload loads a new snapshot and swaps it
+    in with a single assignment, so a search holding a snapshot always
+    pairs an index with the chunks it was built from.
+    """
+
+    def __init__(self, signature, index, index_params, lexical, chunks, row_by_id):
+        self.signature = signature
+        self.index = index
+        self.index_params = index_params
+        self.lexical = lexical
+        self.chunks = chunks
+        self._row_by_id = row_by_id
+
+    @property
+    def consistent(self) -> bool:
+        """True if the index, chunks and BM25 index all come from one build."""
+        build_ids = {self.index_params.get("build_id")}
+        if isinstance(self.chunks, ChunkStore):
+            build_ids.add(self.chunks.build_id)
+        if self.lexical is not None:
+            build_ids.add(self.lexical.build_id)
+        return len(build_ids) == 1
+
+    def rows(self, ids):
+        if isinstance(self.chunks, ChunkStore):
+            return self.chunks.rows_for_ids(ids)
+        if self._row_by_id is None:
+            return [int(i) for i in ids if 0 <= i < len(self.chunks)]
+        return [self._row_by_id[i] for i in ids if i in self._row_by_id]
+
+    def dense_candidates(self, query_embedding: np.ndarray, top_k: int):
+        """(row, score) pairs for the nearest chunks to an encoded query, best first."""
+        scores, ids = self.index.search(query_embedding, top_k)
+        candidates = []
+        for chunk_id, score in zip(ids[0], scores[0]):
+            rows = self.rows([chunk_id])
+            if rows:
+                candidates.append((rows[0], float(score)))
+        return candidates
+
+    def lexical_rows(self, query: str, top_k: int):
+        if self.lexical is None:
+            return []
+        rows, _ = self.lexical.search(query, top_k)
+        return [int(row) for row in rows]
 
 
 class SubjectRetriever:
     def __init__(self, subject: str):
         self.subject = subject
-        index_path = EMBEDDINGS_DIR / f"{subject}_index.faiss"
-        chunks_path = EMBEDDINGS_DIR / f"{subject}_chunks.pkl"
+        self.index_path = EMBEDDINGS_DIR / f"{subject}_index.faiss"
+        self.store_path = EMBEDDINGS_DIR / f"{subject}_chunks.bin"
+        self.pickle_path = EMBEDDINGS_DIR / f"{subject}_chunks.pkl"
+        self.lexical_path = EMBEDDINGS_DIR / f"{subject}_lexical.npz"
+        self._reload_lock = threading.Lock()
+        self.snapshot = self._load()
+
+    def _current_signature(self):
+        return subject_signature(self.subject, EMBEDDINGS_DIR)
+
+    def _load(self) -> IndexSnapshot:
+        """
+        Load the build on disk, waiting out a build that is still swapping
+        its files in. Raises IndexBuildInProgress if it never settles.
+        """
+        for attempt in range(INDEX_LOAD_ATTEMPTS):
+            if attempt:
+                time.sleep(INDEX_LOAD_RETRY_SECONDS)
+            snapshot = self._read(self._current_signature())
+            if snapshot.consistent and snapshot.signature == self._current_signature():
+                return snapshot
+
+        raise IndexBuildInProgress(f"{self.subject} index files are from different builds")
 
-        self.index = faiss.read_index(str(index_path))
+    def _read(self, signature) -> IndexSnapshot:
+        index, index_params = load_index(self.index_path, mmap=FAISS_MMAP)
 
-        with open(chunks_path, "rb") as f:
-            self.chunks = pickle.load(f)
+        # Lexical rows are chunk-store rows, so only use it alongside the store.
+        lexical = None
+        if HYBRID_RETRIEVAL and self.lexical_path.exists() and self.store_path.exists():
+            lexical = BM25Index.load(self.lexical_path)
+
+        if self.store_path.exists():
+            # Memory-mapped: shared between workers through the page cache.
+            chunks = ChunkStore(self.store_path)
+            return IndexSnapshot(signature, index, index_params, lexical, chunks, None)
+
+        # Legacy pickled chunk list.
+        with open(self.pickle_path, "rb") as f:
+            chunks = pickle.load(f)
+
+        # Incrementally built indexes return chunk ids rather than row numbers.
+        row_by_id = None
+        if chunks and "id" in chunks[0]:
+            row_by_id = {chunk["id"]: row for row, chunk in enumerate(chunks)}
+
+        return IndexSnapshot(signature, index, index_params, lexical, chunks, row_by_id)
+
+    def _reload_if_changed(self) -> bool:
+        """
+        Reload the index and drop cached results when the files change on
+        disk. Returns True if a reload happened.
+        """
+        if self._current_signature() == self.snapshot.signature:
+            return False
+
+        with self._reload_lock:
+            if self._current_signature() == self.snapshot.signature:
+                return False
+            logger.info(f"{self.subject} index changed on disk, reloading")
+            try:
+                self.snapshot = self._load()
+            except IndexBuildInProgress as error:
+                # Keep serving the previous build; the next request retries.
+                logger.warning(f"{error}; keeping the loaded build")
+                return False
+            RETRIEVAL_CACHE.invalidate_subject(self.subject, self.snapshot.signature)
+            return True
 
     def retrieve(self, query: str, top_k: int = 8, final_k: int = 3):
-        query_embedding = EMBEDDER.encode(
-            [f"query: {query}"],
-            convert_to_numpy=True,
-        )
+        return self.retrieve_with_embedding(query, top_k, final_k)[:4]
+
+    def retrieve_with_embedding(self, query: str, top_k: int = 8, final_k: int = 3):
+        """Like `retrieve`, but also returns the normalized query embedding."""
+        self._reload_if_changed()
+        snapshot = self.snapshot
+
+        key = (self.subject, normalize_query(query), top_k, final_k)
+        cached = RETRIEVAL_CACHE.get(key, snapshot.signature)
+        if cached is not None:
+            return cached
 
-        norms = np.linalg.norm(query_embedding, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        query_embedding = query_embedding / norms
+        result = self._search(snapshot, query, top_k, final_k)
+        RETRIEVAL_CACHE.put(key, snapshot.signature, result)
+        return result
 
-        scores, indices = self.index.search(query_embedding, top_k)
+    def _search(self, snapshot: IndexSnapshot, query: str, top_k: int, final_k: int):
+        lexical_future = None
+        if snapshot.lexical is not None:
+            lexical_future = _LEXICAL_EXECUTOR.submit(snapshot.lexical_rows, query, top_k)
+
+        query_embedding = encode_query(query)
+
+        dense = snapshot.dense_candidates(query_embedding, top_k)
+        rows = [row for row, _ in dense]
+
+        if lexical_future is not None:
+            rows = reciprocal_rank_fusion([rows, lexical_future.result()])[:top_k]
+
+        final_chunks = rank_chunks(query, [snapshot.chunks[row] for row in rows], final_k)
+        base_conf = max((score for _, score in dense), default=0.0)
+
+        return pack_result(final_chunks, base_conf, query_embedding)
+
+    async def aretrieve(self, query: str, top_k: int = 8, final_k: int = 3):
+        """Run `retrieve` on the bounded retrieval pool, off the event loop."""
+        return await RETRIEVAL_POOL.run(self.retrieve, query, top_k, final_k)
+
+    async def aretrieve_with_embedding(self, query: str, top_k: int = 8, final_k: int = 3):
+        return await RETRIEVAL_POOL.run(
+            self.retrieve_with_embedding, query, top_k, final_k
+        )
 
-        final_chunks = [
-            self.chunks[idx]
-            for idx in indices[0][:final_k]
-            if 0 <= idx < len(self.chunks)
-        ]
 
-        if not final_chunks:
-            return "", [], [], 0.0
+# One retriever per subject, shared by the routes and the sharded retriever.
+_RETRIEVERS = {}
+_RETRIEVERS_LOCK = threading.Lock()
 
-        context = "\n".join(chunk["text"] for chunk in final_chunks)
-        pages = list({chunk.get("page", 0) for chunk in final_chunks})
-        sources = list({chunk.get("source", "unknown") for chunk in final_chunks})
-        base_conf = float(max(scores[0])) if len(scores[0]) > 0 else 0.0
 
-        return context, pages, sources, base_conf
+def get_subject_retriever(subject: str) -> SubjectRetriever:
+    retriever = _RETRIEVERS.get(subject)
+    if retriever is None:
+        with _RETRIEVERS_LOCK:
+            retriever = _RETRIEVERS.get(subject)
+            if retriever is None:
+                retriever = SubjectRetriever(subject)
+                _RETRIEVERS[subject] = retriever
+    return retriever
@@ -0,0 +1,155 @@
+# rag/worker_pool.py
+# Bounded thread pool for running blocking work (embedding, FAISS search)
+# from async handlers without stalling the event loop.
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(RuntimeError):
+    """A job waited longer than its queue timeout for a free worker."""
+
+
+class BoundedWorkerPool:
+    """
+    Thread pool with its own concurrency limit and queue metrics.
+
+    At most `max_workers` jobs run at once; further callers wait on a
+    semaphore, so the number of queued jobs and how long they waited are
+    both observable through `stats()`.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=self.name,
+                    )
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        queue_timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result. With a
+        `queue_timeout`, raises PoolBusyError instead of waiting longer than
+        that for a worker.
+        """
+        semaphore = self._get_semaphore()
+        enqueued_at = perf_counter()
+
+        self._queued += 1
+        try:
+            if queue_timeout is None:
+                await semaphore.acquire()
+            else:
+                await asyncio.wait_for(semaphore.acquire(), queue_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise PoolBusyError(
+                f"{self.name} pool busy: no worker free within {queue_timeout}s"
+            ) from None
+        finally:
+            self._queued -= 1
+
+        wait = perf_counter() - enqueued_at
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._running += 1
+
+        loop = asyncio.get_running_loop()
+        started_at = perf_counter()
+
+        def finished() -> None:
+            self._total_run += perf_counter() - started_at
+            self._running -= 1
+            semaphore.release()
+
+        def on_done(_) -> None:
+            # The permit is held until the thread is done with the job, even
+            # if the caller was cancelled while it ran.
+            try:
+                loop.call_soon_threadsafe(finished)
+            except RuntimeError:
+                pass  # Loop already closed.
+
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            finished()
+            raise
+        future.add_done_callback(on_done)
+
+        try:
+            result = await asyncio.wrap_future(future)
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self._completed + self._failed
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": self._queued,
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timed_out": self._timed_out,
+            "avg_wait_ms": round(1000 * self._total_wait / finished, 2) if finished else 0.0,
+            "max_wait_ms": round(1000 * self._max_wait, 2),
+            "avg_run_ms": round(1000 * self._total_run / finished, 2) if finished else 0.0,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def _default_workers() -> int:
+    # Matches ThreadPoolExecutor's default; most retrieval threads spend their
+    # time waiting on the query encoder batch rather than on the CPU.
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+RETRIEVAL_POOL = BoundedWorkerPool(
+    "retrieval",
+    int(os.getenv("RETRIEVAL_WORKERS", _default_workers())),
+)
@@ -0,0 +1,8 @@
+# tests/conftest.py
+# api.app reads these at import; no test talks to MongoDB or Gemini.
+
+import os
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("GENERATION_BACKEND", "fake")
@@ -0,0 +1,84 @@
+# tests/test_answer_cache.py
+
+import numpy as np
+import pytest
+
+import rag.answer_cache as answer_cache
+from rag.answer_cache import SemanticAnswerCache
+
+
+def _vector(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[: len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache, "monotonic", lambda: now[0])
+    return now
+
+
+def _store(cache, question, vector, answer, subject="physics", mode="concept"):
+    cache.store(subject, "intermediate", mode, question, vector, answer, "gemini")
+
+
+def _lookup(cache, question, vector, subject="physics", mode="concept"):
+    return cache.lookup(subject, "intermediate", mode, question, vector)
+
+
+def test_similar_question_hits_and_dissimilar_misses(clock):
+    cache = SemanticAnswerCache(threshold=0.9)
+    _store(cache, "What is force?", _vector(1, 0), "A push or a pull.")
+
+    hit = _lookup(cache, "what is a force", _vector(1, 0.1))
+    assert hit is not None and hit.answer == "A push or a pull."
+    assert _lookup(cache, "What is energy?", _vector(0, 1)) is None
+
+
+def test_solver_modes_need_the_same_question(clock):
+    cache = SemanticAnswerCache(threshold=0.9)
+    _store(cache, "Solve 2x+3=7", _vector(1, 0), "x = 2", mode="solver")
+
+    assert _lookup(cache, "Solve 2x+5=7", _vector(1, 0), mode="solver") is None
+    assert _lookup(cache, "solve  2x+3=7", _vector(1, 0), mode="solver").answer == "x = 2"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    _store(cache, "What is force?", _vector(1, 0), "A push or a pull.")
+
+    clock[0] += 59
+    assert _lookup(cache, "What is force?", _vector(1, 0)) is not None
+
+    clock[0] += 2
+    assert _lookup(cache, "What is force?", _vector(1, 0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = SemanticAnswerCache(max_entries=2)
+    _store(cache, "one", _vector(1, 0), "first")
+    _store(cache, "two", _vector(0, 1), "second")
+
+    # Touch "one" so "two" becomes the least recently used.
+    assert _lookup(cache, "one", _vector(1, 0)) is not None
+    _store(cache, "three", _vector(0, 0, 1), "third")
+
+    assert _lookup(cache, "one", _vector(1, 0)) is not None
+    assert _lookup(cache, "two", _vector(0, 1)) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_change_invalidates_only_that_subject(clock):
+    cache = SemanticAnswerCache()
+    _store(cache, "What is force?", _vector(1, 0), "physics answer")
+    _store(cache, "What is a matrix?", _vector(1, 0), "math answer", subject="math")
+
+    cache.check_index_signature("physics", ("build", 1))
+    assert _lookup(cache, "What is force?", _vector(1, 0)) is not None
+
+    cache.check_index_signature("physics", ("build", 2))
+    assert _lookup(cache, "What is force?", _vector(1, 0)) is None
+    assert _lookup(cache, "What is a matrix?", _vector(1, 0), subject="math") is not None
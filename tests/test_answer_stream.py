@@ -0,0 +1,120 @@
+# tests/test_answer_stream.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import api.app.tutor_routes as tutor_routes
+from rag.generation_backends import FakeBackend, GenerationBackend, set_generation_backend
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+class FailingBackend(GenerationBackend):
+    name = "failing"
+
+    async def stream(self, prompt, max_tokens):
+        yield "partial"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model went away")
+
+
+@pytest.fixture
+def route(monkeypatch):
+    saved, cached = [], []
+    embedding = np.ones((1, 384), dtype="float32")
+
+    async def retrieve(subject, question):
+        return subject, "Force is mass times acceleration.", [1], ["physics.pdf"], 0.9, embedding
+
+    async def no_history(chat_id):
+        return ""
+
+    async def save(*args):
+        saved.append(args)
+
+    monkeypatch.setattr(tutor_routes, "_retrieve_context", retrieve)
+    monkeypatch.setattr(tutor_routes, "_format_conversation_context", no_history)
+    monkeypatch.setattr(tutor_routes, "_save_attempt", save)
+    monkeypatch.setattr(tutor_routes, "_cache_mode", lambda *args: "concept")
+    monkeypatch.setattr(tutor_routes.ANSWER_CACHE, "lookup", lambda *args: None)
+    monkeypatch.setattr(tutor_routes.ANSWER_CACHE, "store", lambda *args: cached.append(args))
+
+    yield saved, cached
+    set_generation_backend(None)
+
+
+async def _ask_and_disconnect(deltas: int):
+    request = tutor_routes.AskRequest(user_id="chat-1", question="What is force?", subject="physics")
+    response = await tutor_routes.ask_tutor_stream(request, "student@example.com")
+
+    received = []
+
+    async def client():
+        async for event in response.body_iterator:
+            if event.startswith("event: delta"):
+                received.append(event)
+
+    reader = asyncio.create_task(client())
+    while len(received) < deltas:
+        await asyncio.sleep(0.005)
+
+    # What Starlette does when the client disconnects.
+    reader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await reader
+
+    await asyncio.gather(*list(tutor_routes._background_tasks))
+    return received
+
+
+def test_disconnect_mid_stream_saves_full_answer(route):
+    saved, cached = route
+    set_generation_backend(FakeBackend(text=" ".join(WORDS), chunk_words=1, delay_seconds=0.005))
+
+    received = asyncio.run(_ask_and_disconnect(deltas=5))
+
+    assert len(received) < len(WORDS)
+    assert len(saved) == 1
+    answer, model_used = saved[0][4], saved[0][6]
+    assert answer.split() == WORDS
+    assert model_used == "fake"
+    assert len(cached) == 1
+
+
+def test_failed_stream_is_saved_but_not_cached(route):
+    saved, cached = route
+    set_generation_backend(FailingBackend())
+
+    asyncio.run(_ask_and_disconnect(deltas=1))
+
+    assert len(saved) == 1
+    assert saved[0][4].endswith("[Response interrupted.]")
+    assert cached == []
+
+
+def test_cancelled_reader_does_not_stop_generation():
+    from rag.hybrid_generator import AnswerStream
+
+    async def run():
+        stream = AnswerStream(
+            FakeBackend(text=" ".join(WORDS), chunk_words=2, delay_seconds=0.002).stream("", 0),
+            "fake",
+            0.9,
+        )
+
+        async def read_some():
+            async for _ in stream:
+                await asyncio.sleep(1)
+
+        reader = asyncio.create_task(read_some())
+        await asyncio.sleep(0.01)
+        reader.cancel()
+
+        await stream.wait()
+        return stream
+
+    stream = asyncio.run(run())
+    assert stream.completed and not stream.failed
+    assert stream.text.split() == WORDS
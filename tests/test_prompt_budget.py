@@ -0,0 +1,68 @@
+# tests/test_prompt_budget.py
+
+from rag.prompt_budget import (
+    _TRUNCATION_MARK,
+    assemble_prompt,
+    count_tokens,
+    fit_context,
+    fit_conversation,
+)
+
+CHUNKS = [f"{name} " * 60 for name in ("alpha", "beta", "gamma", "delta")]
+CHUNKS = [chunk.strip() for chunk in CHUNKS]
+CONTEXT = "\n".join(CHUNKS)
+
+
+def _conversation(turns):
+    return "\n".join(f"Student: {q}\nTutor: {a}" for q, a in turns)
+
+
+def test_fit_context_leaves_short_context_alone():
+    assert fit_context(CONTEXT, count_tokens(CONTEXT)) == CONTEXT
+
+
+def test_fit_context_drops_whole_lowest_ranked_chunks():
+    budget = count_tokens(CHUNKS[0]) + count_tokens(CHUNKS[1]) + 2
+    assert fit_context(CONTEXT, budget) == "\n".join(CHUNKS[:2])
+
+
+def test_fit_context_keeps_the_top_chunk_when_over_budget():
+    assert fit_context(CONTEXT, 5) == CHUNKS[0]
+
+
+def test_follow_up_modes_get_the_whole_context():
+    _, trimmed = assemble_prompt(CONTEXT, "q", mode="concept", context_tokens=50)
+    _, full = assemble_prompt(CONTEXT, "q", mode="followup_answers", context_tokens=50)
+
+    assert trimmed.context_tokens < count_tokens(CONTEXT)
+    assert full.context_tokens == count_tokens(CONTEXT)
+
+
+def test_fit_conversation_leaves_short_history_alone():
+    history = _conversation([("What is force?", "A push or a pull.")])
+    assert fit_conversation(history, 1000) == history
+
+
+def test_fit_conversation_keeps_newest_turn_and_shortens_older_ones():
+    long_answer = "Newton's laws describe motion in detail. " * 40
+    history = _conversation([
+        ("First question?", long_answer),
+        ("Second question?", long_answer),
+        ("Latest question?", "Short latest answer."),
+    ])
+
+    fitted = fit_conversation(history, 200)
+
+    assert count_tokens(fitted) <= 200
+    assert fitted.endswith("Student: Latest question?\nTutor: Short latest answer.")
+    assert _TRUNCATION_MARK in fitted
+
+
+def test_fit_conversation_drops_oldest_turns_first():
+    answer = "word " * 30
+    turns = [(f"Question {i}?", answer.strip()) for i in range(10)]
+
+    fitted = fit_conversation(_conversation(turns), 120)
+
+    assert "Question 9?" in fitted
+    assert "Question 0?" not in fitted
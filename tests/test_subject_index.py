@@ -0,0 +1,64 @@
+# tests/test_subject_index.py
+
+import faiss
+import numpy as np
+import pytest
+
+import rag.subject_retriever as subject_retriever
+from rag.chunk_store import write_chunk_store
+from rag.index_factory import build_index, write_index_meta
+from rag.lexical_index import BM25Index
+
+TEXTS = ["newton second law", "kinetic energy", "projectile motion", "ohm law"]
+
+
+def _write_build(embeddings_dir, build_id, files=("chunks", "lexical", "faiss", "meta")):
+    chunks = [{"text": text, "page": row, "id": row} for row, text in enumerate(TEXTS)]
+    vectors = np.eye(len(TEXTS), 8, dtype=np.float32)
+    index, params = build_index(vectors, np.arange(len(TEXTS), dtype=np.int64), index_type="flat")
+    index_path = embeddings_dir / "physics_index.faiss"
+
+    if "chunks" in files:
+        write_chunk_store(embeddings_dir / "physics_chunks.bin", chunks, build_id=build_id)
+    if "lexical" in files:
+        BM25Index.build(TEXTS).save(embeddings_dir / "physics_lexical.npz", build_id=build_id)
+    if "faiss" in files:
+        faiss.write_index(index, str(index_path))
+    if "meta" in files:
+        write_index_meta(index_path, index, params, build_id=build_id)
+
+
+@pytest.fixture
+def embeddings_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(subject_retriever, "EMBEDDINGS_DIR", tmp_path)
+    monkeypatch.setattr(subject_retriever, "INDEX_LOAD_ATTEMPTS", 2)
+    monkeypatch.setattr(subject_retriever, "INDEX_LOAD_RETRY_SECONDS", 0)
+    return tmp_path
+
+
+def test_complete_build_loads(embeddings_dir):
+    _write_build(embeddings_dir, "one")
+    retriever = subject_retriever.SubjectRetriever("physics")
+    assert retriever.snapshot.consistent
+    assert retriever.snapshot.chunks.build_id == "one"
+
+
+def test_half_swapped_build_is_not_loaded(embeddings_dir):
+    _write_build(embeddings_dir, "one")
+    _write_build(embeddings_dir, "two", files=("chunks", "lexical"))
+
+    with pytest.raises(subject_retriever.IndexBuildInProgress):
+        subject_retriever.SubjectRetriever("physics")
+
+
+def test_reload_keeps_previous_build_until_swap_finishes(embeddings_dir):
+    _write_build(embeddings_dir, "one")
+    retriever = subject_retriever.SubjectRetriever("physics")
+
+    _write_build(embeddings_dir, "two", files=("chunks", "lexical", "faiss"))
+    assert not retriever._reload_if_changed()
+    assert retriever.snapshot.chunks.build_id == "one"
+
+    _write_build(embeddings_dir, "two", files=("meta",))
+    assert retriever._reload_if_changed()
+    assert retriever.snapshot.chunks.build_id == "two"
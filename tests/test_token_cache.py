@@ -0,0 +1,54 @@
+# tests/test_token_cache.py
+
+import pytest
+
+import api.app.dependencies as dependencies
+from api.app.dependencies import VerifiedTokenCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(dependencies, "time", lambda: now[0])
+    return now
+
+
+def test_token_is_cached_until_ttl(clock):
+    cache = VerifiedTokenCache(ttl_seconds=300)
+    cache.put("token", "student@example.com")
+
+    clock[0] += 299
+    assert cache.get("token") == "student@example.com"
+
+    clock[0] += 2
+    assert cache.get("token") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_token_exp_shortens_the_ttl(clock):
+    cache = VerifiedTokenCache(ttl_seconds=300)
+    cache.put("token", "student@example.com", exp=clock[0] + 10)
+
+    clock[0] += 9
+    assert cache.get("token") == "student@example.com"
+
+    clock[0] += 2
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_token_is_evicted(clock):
+    cache = VerifiedTokenCache(max_entries=2)
+    cache.put("a", "a@example.com")
+    cache.put("b", "b@example.com")
+    cache.get("a")
+    cache.put("c", "c@example.com")
+
+    assert cache.get("a") == "a@example.com"
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_raw_tokens_are_not_stored(clock):
+    cache = VerifiedTokenCache()
+    cache.put("secret-token", "student@example.com")
+    assert all(b"secret-token" not in key for key in cache._entries)
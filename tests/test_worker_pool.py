@@ -0,0 +1,71 @@
+# tests/test_worker_pool.py
+
+import asyncio
+import threading
+import time
+
+from rag.worker_pool import BoundedWorkerPool
+
+
+def test_cancelled_callers_keep_their_permit_until_the_job_ends():
+    pool = BoundedWorkerPool("test", 2)
+    release = threading.Event()
+    started = []
+
+    def job(name):
+        started.append(name)
+        release.wait(5)
+
+    async def run():
+        first = [asyncio.create_task(pool.run(job, i)) for i in range(2)]
+        while len(started) < 2:
+            await asyncio.sleep(0.001)
+
+        for task in first:
+            task.cancel()
+        await asyncio.gather(*first, return_exceptions=True)
+
+        # Both threads are still busy, so a new job must not start yet.
+        late = asyncio.create_task(pool.run(job, "late"))
+        await asyncio.sleep(0.05)
+        busy = (pool.stats()["running"], list(started))
+
+        release.set()
+        await late
+        return busy
+
+    running, seen = asyncio.run(run())
+    pool.shutdown()
+
+    assert running == 2
+    assert "late" not in seen
+
+
+def test_jobs_never_exceed_max_workers():
+    pool = BoundedWorkerPool("test", 3)
+    lock = threading.Lock()
+    active = peak = 0
+
+    def job():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+
+    async def run():
+        tasks = [asyncio.create_task(pool.run(job)) for _ in range(12)]
+        await asyncio.sleep(0.005)
+        for task in tasks[::2]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        return pool.stats()
+
+    stats = asyncio.run(run())
+    pool.shutdown()
+
+    assert peak <= 3
+    assert stats["running"] == 0
@@ -0,0 +1,143 @@
+# tests/test_write_behind.py
+
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from api.app.services.write_behind import WriteBehindQueue
+
+
+class FlakyCollection:
+    """insert_many that fails the first `failures` calls, and reports
+    documents whose _id it already holds as duplicate keys."""
+
+    name = "flaky"
+
+    def __init__(self, failures: int = 0, error=None):
+        self.failures = failures
+        self.error = error or ConnectionError("primary stepped down")
+        self.documents = {}
+        self.calls = 0
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+
+        write_errors = []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.documents:
+                write_errors.append({"index": index, "code": 11000})
+            else:
+                self.documents[document["_id"]] = document
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors})
+
+
+def _queue(**kwargs):
+    return WriteBehindQueue(retry_delay=0, flush_timeout=1, **kwargs)
+
+
+def _track():
+    events = []
+
+    def hook(name):
+        async def run():
+            events.append(name)
+        return run
+
+    return events, hook
+
+
+def test_failed_batch_is_retried():
+    collection = FlakyCollection(failures=2)
+    queue = _queue(max_retries=3)
+    events, hook = _track()
+
+    asyncio.run(queue.submit([(collection, {"n": 1})], after=hook("after"), on_failure=hook("failed")))
+
+    assert len(collection.documents) == 1
+    assert collection.calls == 3
+    assert events == ["after"]
+    assert queue.stats()["retries"] == 2
+
+
+def test_write_is_given_up_after_max_retries():
+    collection = FlakyCollection(failures=10)
+    queue = _queue(max_retries=2)
+    events, hook = _track()
+
+    asyncio.run(queue.submit([(collection, {"n": 1})], after=hook("after"), on_failure=hook("failed")))
+
+    assert collection.documents == {}
+    assert collection.calls == 3
+    assert events == ["failed"]
+    assert queue.stats()["failed"] == 1
+
+
+def test_duplicate_key_counts_as_written():
+    collection = FlakyCollection()
+    queue = _queue(max_retries=0)
+    events, hook = _track()
+    document = {"n": 1}
+
+    async def run():
+        await queue.submit([(collection, document)])
+        # A retry of an insert that had in fact succeeded.
+        await queue.submit([(collection, dict(document))], after=hook("after"), on_failure=hook("failed"))
+
+    asyncio.run(run())
+
+    assert len(collection.documents) == 1
+    assert events == ["after"]
+    assert queue.stats()["failed"] == 0
+
+
+def test_other_bulk_errors_fail_only_their_write():
+    class RejectingCollection(FlakyCollection):
+        async def insert_many(self, documents, ordered=True):
+            self.calls += 1
+            errors = [
+                {"index": i, "code": 121}
+                for i, document in enumerate(documents) if document.get("invalid")
+            ]
+            for i, document in enumerate(documents):
+                if not document.get("invalid"):
+                    self.documents[document["_id"]] = document
+            if errors:
+                raise BulkWriteError({"writeErrors": errors})
+
+    collection = RejectingCollection()
+    queue = _queue(max_retries=1)
+    events, hook = _track()
+
+    async def run():
+        queue.start()
+        await queue.submit([(collection, {"n": 1})], after=hook("good"), on_failure=hook("good failed"))
+        await queue.submit([(collection, {"invalid": True})], after=hook("bad"), on_failure=hook("bad failed"))
+        await queue.close()
+
+    asyncio.run(run())
+
+    assert sorted(events) == ["bad failed", "good"]
+
+
+def test_batched_hooks_run_once_per_flush():
+    collection = FlakyCollection()
+    queue = _queue()
+    calls = []
+
+    async def record(items):
+        calls.append(sorted(items))
+
+    async def run():
+        queue.start()
+        for n in range(5):
+            await queue.submit([(collection, {"n": n})], batched=[(record, n)])
+        await queue.close()
+
+    asyncio.run(run())
+
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert len(collection.documents) == 5